@@ -0,0 +1,190 @@
+"""
+Scaling benchmarks for the regression models in `pines.gpr`.
+
+Each model is fit, predicted (with and without the standard deviation where
+supported) and cross validated on synthetic data, over a grid of problem
+sizes.  The wall clock time and the peak memory traced by `tracemalloc` for
+each stage are written to a JSON results file, along with the versions of
+pines and its main dependencies, so that results from different versions
+can be compared.
+
+Example::
+
+	python benchmarks/gpr_scaling.py --n-samples 250 500 1000 --output results.json
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy, pandas
+
+import pines
+from pines.gpr import LinearAndGaussianProcessRegression
+from pines.gpr.multitarget import (
+	SingleTargetRegression,
+	ChainedTargetRegression,
+	StackedSingleTargetRegression,
+	EnsembleRegressorChains,
+)
+
+N_CORE = 2
+
+
+def synthetic_data(n_samples, n_features, n_targets, seed=0):
+	"""
+	Random inputs and smooth nonlinear targets that depend on a few of them.
+	"""
+	rng = numpy.random.RandomState(seed)
+	X = pandas.DataFrame(
+		rng.uniform(size=[n_samples, n_features]),
+		columns=[f'x{i}' for i in range(n_features)],
+	)
+	Y = pandas.DataFrame(index=X.index)
+	for t in range(n_targets):
+		a, b = X.iloc[:, t % n_features], X.iloc[:, (t + 1) % n_features]
+		Y[f'y{t}'] = numpy.sin(3 * a + t) + b ** 2 + 0.5 * a * b + 0.05 * rng.standard_normal(n_samples)
+	return X, Y
+
+
+def _single(cls):
+	def make(case):
+		return cls(
+			core_features=[f'x{i}' for i in range(min(N_CORE, case['n_features']))],
+			keep_other_features=case['keep_other_features'],
+		)
+	return make
+
+
+MODELS = {
+	'LinearAndGaussianProcessRegression': (_single(LinearAndGaussianProcessRegression), False),
+	'SingleTargetRegression': (_single(SingleTargetRegression), False),
+	'ChainedTargetRegression': (lambda case: ChainedTargetRegression(keep_other_features=case['keep_other_features'], randomize_chain=0), True),
+	'StackedSingleTargetRegression': (lambda case: StackedSingleTargetRegression(keep_other_features=case['keep_other_features']), True),
+	'EnsembleRegressorChains': (lambda case: EnsembleRegressorChains(keep_other_features=case['keep_other_features'], replication=3), True),
+}
+
+SUPPORTS_STD = {'LinearAndGaussianProcessRegression', 'SingleTargetRegression', 'ChainedTargetRegression'}
+
+
+def measure(func, trace_memory=True):
+	"""
+	Run func, returning its result, the elapsed seconds, and the peak traced memory in bytes.
+	"""
+	if trace_memory:
+		tracemalloc.start()
+	start = time.perf_counter()
+	try:
+		result = func()
+	finally:
+		elapsed = time.perf_counter() - start
+		peak = None
+		if trace_memory:
+			peak = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+	return result, elapsed, peak
+
+
+def run_case(model_name, case, n_predict=1000, trace_memory=True):
+	"""
+	Benchmark the stages of one model on one problem size.
+
+	Returns
+	-------
+	list of dict
+		One record per stage.  A stage that raises is recorded with its error,
+		and the stages that depend on it are skipped.
+	"""
+	make, multi_target = MODELS[model_name]
+	X, Y = synthetic_data(case['n_samples'], case['n_features'], case['n_targets'] if multi_target else 1)
+	X_new, _ = synthetic_data(n_predict, case['n_features'], 1, seed=1)
+	y = Y if multi_target else Y.iloc[:, 0]
+	model = make(case)
+
+	stages = [('fit', lambda: model.fit(X, y))]
+	stages.append(('predict', lambda: model.predict(X_new)))
+	if model_name in SUPPORTS_STD:
+		stages.append(('predict_std', lambda: model.predict(X_new, return_std=True)))
+	def cv():
+		fresh = make(case)
+		return getattr(fresh, 'cross_val_predicts', fresh.cross_val_predict)(X, y, cv=case['cv'])
+	stages.append(('cv', cv))
+
+	records = []
+	fitted = True
+	for stage, func in stages:
+		record = dict(model=model_name, stage=stage, **case)
+		if not multi_target:
+			record['n_targets'] = 1
+		if not fitted and stage != 'cv':
+			record['error'] = 'skipped, fit failed'
+			records.append(record)
+			continue
+		try:
+			_, record['seconds'], record['peak_bytes'] = measure(func, trace_memory)
+		except Exception as err:
+			record['error'] = f'{type(err).__name__}: {err}'
+			if stage == 'fit':
+				fitted = False
+		records.append(record)
+	return records
+
+
+def environment():
+	import scipy, sklearn
+	return dict(
+		pines=pines.__version__,
+		python=sys.version.split()[0],
+		numpy=numpy.__version__,
+		scipy=scipy.__version__,
+		sklearn=sklearn.__version__,
+		pandas=pandas.__version__,
+		platform=platform.platform(),
+		processor=platform.processor(),
+		timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+	)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+	parser.add_argument('--models', nargs='+', default=list(MODELS), choices=list(MODELS))
+	parser.add_argument('--n-samples', nargs='+', type=int, default=[250, 500, 1000])
+	parser.add_argument('--n-features', nargs='+', type=int, default=[8])
+	parser.add_argument('--n-targets', nargs='+', type=int, default=[3])
+	parser.add_argument('--keep-other-features', nargs='+', type=int, default=[3])
+	parser.add_argument('--cv', nargs='+', type=int, default=[3])
+	parser.add_argument('--n-predict', type=int, default=1000, help='number of rows to predict')
+	parser.add_argument('--no-memory', action='store_true', help='skip tracing peak memory, which adds some overhead')
+	parser.add_argument('--output', default='gpr_scaling.json', help='results file')
+	args = parser.parse_args(argv)
+
+	grid = [
+		dict(n_samples=n, n_features=p, n_targets=t, keep_other_features=k, cv=cv)
+		for n, p, t, k, cv in itertools.product(
+			args.n_samples, args.n_features, args.n_targets, args.keep_other_features, args.cv,
+		)
+	]
+	results = []
+	with warnings.catch_warnings():
+		warnings.simplefilter('ignore')
+		for model_name in args.models:
+			for case in grid:
+				records = run_case(model_name, case, n_predict=args.n_predict, trace_memory=not args.no_memory)
+				for r in records:
+					summary = r.get('error') or f"{r['seconds']:.3f}s"
+					print(f"{model_name} n={case['n_samples']} p={case['n_features']} t={r['n_targets']} "
+						  f"k={case['keep_other_features']} cv={case['cv']} {r['stage']}: {summary}", flush=True)
+				results.extend(records)
+
+	with open(args.output, 'w') as f:
+		json.dump(dict(environment=environment(), results=results), f, indent=1)
+	print(f'wrote {len(results)} results to {args.output}')
+
+
+if __name__ == '__main__':
+	main()
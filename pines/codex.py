@@ -15,3 +15,31 @@ def inflate(squeezed):
 def phash(x):
     return hashlib.sha256(pickle.dumps(x)).hexdigest()
 
+
+
+def fingerprint(*args):
+    """
+    A fast content hash of arrays and other picklable things.
+
+    Numpy arrays are hashed from their raw bytes (plus dtype and shape)
+    instead of being pickled first, and pandas objects are hashed from their
+    values and labels.  This is intended for keying caches of results
+    computed from large data.
+
+    Returns
+    -------
+    str
+    """
+    import numpy
+    h = hashlib.blake2b(digest_size=20)
+    for a in args:
+        if hasattr(a, 'index') and hasattr(a, 'values'):
+            h.update(pickle.dumps((type(a).__name__, list(getattr(a, 'columns', [getattr(a, 'name', None)])))))
+            a = a.values
+        if isinstance(a, numpy.ndarray) and a.dtype != object:
+            a = numpy.ascontiguousarray(a)
+            h.update(f'{a.dtype.str}{a.shape}'.encode())
+            h.update(memoryview(a).cast('B'))
+        else:
+            h.update(pickle.dumps(a))
+    return h.hexdigest()
@@ -0,0 +1,279 @@
+"""
+Lightweight predictors frozen from fitted gaussian process regression models.
+
+A `FrozenPredictor` holds only the arrays needed to make predictions, and
+depends on numpy alone, so it loads quickly in scoring processes and on dask
+workers that have no need for sklearn or pandas.  Create one from a fitted
+model with its `export_predictor` method.
+"""
+
+import json
+import numpy
+
+
+def _sq_dist(X, Y, length_scale):
+	X = X / length_scale
+	Y = Y / length_scale
+	d = (X * X).sum(axis=1)[:, None] + (Y * Y).sum(axis=1)[None, :] - 2 * (X @ Y.T)
+	numpy.maximum(d, 0, out=d)
+	return d
+
+
+def kernel_cross(spec, X, Y):
+	"""
+	Evaluate a frozen kernel between two distinct sets of points.
+
+	Parameters
+	----------
+	spec : dict
+		A kernel description, as made by `pines.gpr.export.kernel_spec`.
+	X, Y : ndarray
+		Points, shape (n, n_features) and (m, n_features).
+
+	Returns
+	-------
+	ndarray of shape (n, m)
+	"""
+	kind = spec['kind']
+	if kind == 'sum':
+		return kernel_cross(spec['k1'], X, Y) + kernel_cross(spec['k2'], X, Y)
+	if kind == 'product':
+		return kernel_cross(spec['k1'], X, Y) * kernel_cross(spec['k2'], X, Y)
+	if kind == 'constant':
+		return numpy.full([X.shape[0], Y.shape[0]], spec['constant_value'])
+	if kind == 'white':
+		return numpy.zeros([X.shape[0], Y.shape[0]])
+	d = _sq_dist(X, Y, numpy.asarray(spec['length_scale'], dtype=numpy.float64))
+	if kind == 'rbf':
+		return numpy.exp(-0.5 * d)
+	if kind == 'rational_quadratic':
+		alpha = spec['alpha']
+		return (1 + d / (2 * alpha)) ** -alpha
+	if kind == 'matern':
+		nu = spec['nu']
+		if nu == numpy.inf:
+			return numpy.exp(-0.5 * d)
+		r = numpy.sqrt(d)
+		if nu == 0.5:
+			return numpy.exp(-r)
+		if nu == 1.5:
+			r = r * numpy.sqrt(3)
+			return (1 + r) * numpy.exp(-r)
+		if nu == 2.5:
+			r = r * numpy.sqrt(5)
+			return (1 + r + r ** 2 / 3) * numpy.exp(-r)
+	raise ValueError(f'unknown kernel {spec!r}')
+
+
+def kernel_diag(spec, X):
+	"""
+	Evaluate the diagonal of a frozen kernel at each of a set of points.
+	"""
+	kind = spec['kind']
+	if kind == 'sum':
+		return kernel_diag(spec['k1'], X) + kernel_diag(spec['k2'], X)
+	if kind == 'product':
+		return kernel_diag(spec['k1'], X) * kernel_diag(spec['k2'], X)
+	if kind == 'constant':
+		return numpy.full(X.shape[0], spec['constant_value'])
+	if kind == 'white':
+		return numpy.full(X.shape[0], spec['noise_level'])
+	if kind in ('rbf', 'rational_quadratic', 'matern'):
+		return numpy.ones(X.shape[0])
+	raise ValueError(f'unknown kernel {spec!r}')
+
+
+# Rows of a triangular system solved at once by `_solve_lower`.
+_SOLVE_BLOCK = 256
+
+
+def _solve_lower(L, B):
+	"""
+	Solve ``L @ V = B`` for V, where L is lower triangular.
+
+	numpy has no triangular solver, so this is a blocked forward substitution,
+	solving each small diagonal block with `numpy.linalg.solve`.  Unlike
+	multiplying by an explicit inverse of L, this keeps its accuracy when L is
+	ill-conditioned.
+	"""
+	V = numpy.empty(B.shape, dtype=numpy.float64)
+	for start in range(0, L.shape[0], _SOLVE_BLOCK):
+		b = slice(start, min(start + _SOLVE_BLOCK, L.shape[0]))
+		V[b] = numpy.linalg.solve(L[b, b], B[b] - L[b, :start] @ V[:start])
+	return V
+
+
+class FrozenPredictor:
+	"""
+	A linear model plus a gaussian process on its residuals, frozen for prediction.
+
+	The predictive mean is ``X @ coef.T + intercept + y_mean + y_std * (K @ alpha)``,
+	where K is the kernel between the query points and the basis points (the
+	training inputs of an exact GPR, or the inducing points of a sparse one).
+
+	The predictive variance is ``y_std**2 * (diag - |chol⁻¹ K.T|² + noise * |noise_chol⁻¹ K.T|²)``,
+	where `chol` is the lower Cholesky factor of the kernel on the basis
+	points, and the `noise_chol` term is only used by sparse models.  The
+	factors are applied by triangular solves, not as explicit inverses.
+	"""
+
+	_arrays = ('coef', 'intercept', 'basis', 'alpha', 'chol', 'noise_chol', 'proj', 'noise_proj', 'y_mean', 'y_std')
+
+	def __init__(
+			self,
+			features,
+			coef,
+			intercept,
+			kernel,
+			basis,
+			alpha,
+			chol=None,
+			noise_chol=None,
+			noise=0.0,
+			y_mean=0.0,
+			y_std=1.0,
+			targets=None,
+			y_1d=True,
+			proj=None,
+			noise_proj=None,
+	):
+		"""
+
+		Parameters
+		----------
+		features : list
+			Names of the input feature columns, in the order used by the model.
+		coef : array-like, shape (n_targets, n_features)
+		intercept : array-like, shape (n_targets,)
+		kernel : dict
+			Kernel description, see `pines.gpr.export.kernel_spec`.
+		basis : array-like, shape (n_basis, n_features)
+		alpha : array-like, shape (n_basis, n_targets)
+		chol : array-like, shape (n_basis, n_basis)
+			Lower Cholesky factor of the kernel on the basis points.
+		noise_chol : array-like, shape (n_basis, n_basis), optional
+		noise : float
+		y_mean, y_std : array-like, shape (n_targets,)
+			The gaussian process targets were normalized with these.
+		targets : list, optional
+			Names of the targets.
+		y_1d : bool
+			Whether the model was fit on a one dimensional target, in which case
+			predictions are one dimensional too.
+		proj, noise_proj : array-like, optional
+			The inverses of `chol` and `noise_chol`, as stored by earlier
+			versions, used only when the factors themselves are not given.
+		"""
+		self.features = list(features)
+		self.coef = numpy.atleast_2d(numpy.asarray(coef, dtype=numpy.float64))
+		self.intercept = numpy.atleast_1d(numpy.asarray(intercept, dtype=numpy.float64))
+		self.kernel = kernel
+		self.basis = numpy.asarray(basis, dtype=numpy.float64)
+		alpha = numpy.asarray(alpha, dtype=numpy.float64)
+		self.alpha = alpha.reshape(alpha.shape[0], -1)
+		as_array = lambda a: None if a is None else numpy.asarray(a, dtype=numpy.float64)
+		self.chol = as_array(chol)
+		self.noise_chol = as_array(noise_chol)
+		self.proj = as_array(proj)
+		self.noise_proj = as_array(noise_proj)
+		if self.chol is None and self.proj is None:
+			raise ValueError('chol is required')
+		self.noise = float(noise)
+		self.y_mean = numpy.atleast_1d(numpy.asarray(y_mean, dtype=numpy.float64))
+		self.y_std = numpy.atleast_1d(numpy.asarray(y_std, dtype=numpy.float64))
+		self.targets = None if targets is None else list(targets)
+		self.y_1d = bool(y_1d)
+
+	def __repr__(self):
+		return f'<FrozenPredictor with {len(self.features)} features and {self.basis.shape[0]} basis points>'
+
+	def _as_array(self, X):
+		"""
+		Get the model's feature columns from X.
+
+		A DataFrame, a dict of arrays, or anything else indexed by column name
+		is read by feature name.  A plain array must already hold exactly the
+		model's features, in order.
+		"""
+		if hasattr(X, 'columns') or isinstance(X, dict):
+			return numpy.column_stack([numpy.asarray(X[f], dtype=numpy.float64) for f in self.features])
+		X = numpy.asarray(X, dtype=numpy.float64)
+		if X.ndim == 1:
+			X = X.reshape(1, -1)
+		if X.shape[1] != len(self.features):
+			raise ValueError(f'expected {len(self.features)} feature columns, got {X.shape[1]}')
+		return X
+
+	def _shape(self, y):
+		if self.y_1d:
+			return y[:, 0]
+		return y
+
+	def predict(self, X, return_std=False):
+		"""
+		Predict using the frozen model.
+
+		Parameters
+		----------
+		X : array-like, DataFrame or dict of arrays
+			Query points, see `_as_array`.
+		return_std : bool, default False
+			Also return the standard deviation of the predictive distribution.
+
+		Returns
+		-------
+		y_mean : ndarray, shape (n_samples,) or (n_samples, n_targets)
+		y_std : ndarray, optional
+		"""
+		X = self._as_array(X)
+		K = kernel_cross(self.kernel, X, self.basis)
+		y = X @ self.coef.T + self.intercept + self.y_mean + (K @ self.alpha) * self.y_std
+		if return_std:
+			return self._shape(y), self._std(X, K)
+		return self._shape(y)
+
+	def predict_std(self, X):
+		"""
+		The standard deviation of the predictive distribution at X.
+		"""
+		X = self._as_array(X)
+		return self._std(X, kernel_cross(self.kernel, X, self.basis))
+
+	@staticmethod
+	def _apply(chol, proj, K):
+		if chol is not None:
+			return _solve_lower(chol, K.T)
+		return proj @ K.T
+
+	def _std(self, X, K):
+		v = self._apply(self.chol, self.proj, K)
+		var = kernel_diag(self.kernel, X) - numpy.einsum('ij,ij->j', v, v)
+		if self.noise_chol is not None or self.noise_proj is not None:
+			v = self._apply(self.noise_chol, self.noise_proj, K)
+			var += self.noise * numpy.einsum('ij,ij->j', v, v)
+		numpy.maximum(var, 0, out=var)
+		return self._shape(numpy.sqrt(var)[:, None] * self.y_std)
+
+	def save(self, filename):
+		"""
+		Save to a numpy .npz file, readable without pickle.
+		"""
+		arrays = {k: getattr(self, k) for k in self._arrays if getattr(self, k) is not None}
+		meta = dict(
+			features=self.features,
+			targets=self.targets,
+			kernel=self.kernel,
+			noise=self.noise,
+			y_1d=self.y_1d,
+		)
+		numpy.savez(filename, meta=numpy.array(json.dumps(meta)), **arrays)
+
+	@classmethod
+	def load(cls, filename):
+		"""
+		Load a predictor saved with `save`.
+		"""
+		with numpy.load(filename, allow_pickle=False) as f:
+			meta = json.loads(str(f['meta']))
+			arrays = {k: f[k] for k in cls._arrays if k in f.files}
+		return cls(**meta, **arrays)
@@ -4,8 +4,8 @@ from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn import preprocessing
 from sklearn.base import TransformerMixin
 from sklearn.gaussian_process.kernels import RBF, ConstantKernel as C, RationalQuadratic as RQ
-from sklearn.base import RegressorMixin, BaseEstimator
-from sklearn.model_selection import cross_val_score, cross_val_predict
+from sklearn.base import RegressorMixin, BaseEstimator, clone
+from sklearn.model_selection import cross_val_score, cross_val_predict, check_cv
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import r2_score
 
@@ -13,13 +13,25 @@ from sklearn.feature_selection import SelectKBest
 from sklearn.feature_selection import f_regression, mutual_info_regression
 
 from sklearn.exceptions import DataConversionWarning
+from sklearn.utils import check_random_state
 
 import numpy, pandas
 import scipy.stats
+import scipy.linalg
 import warnings
 import contextlib
+import time
 
 from pines.attribute_dict import dicta
+from .parallel import open_executor, is_serial, share
+from .sparse import SparseGaussianProcessRegressor
+from .crossval import cross_val_folds, fold_scores, fold_clone, warm_state, _take
+from .screening import get_screen
+from .export import freeze
+from .streaming import StreamingPredictMixin
+from .cache import PredictionCacheMixin
+from .scalers import PartialFitScalerMixin
+from . import profiling
 
 
 
@@ -39,6 +51,23 @@ def feature_concat(*args):
 
 class LinearRegression(_sklearn_LinearRegression):
 
+	def __init__(self, fit_intercept=True, copy_X=True, n_jobs=None, positive=False, compute_stats=True):
+		"""
+
+		Parameters
+		----------
+		compute_stats : bool, default True
+			Compute t statistics and p values for the coefficients, in `t_` and `p_`.
+			Turn this off in hot loops (e.g. cross validation folds) where nobody
+			reads them.  With `positive`, the least squares standard errors do
+			not apply, and `t_` and `p_` are set to None.
+
+		Other parameters are as for sklearn's LinearRegression.
+		"""
+		super().__init__(fit_intercept=fit_intercept, copy_X=copy_X, n_jobs=n_jobs, positive=positive)
+		self.compute_stats = compute_stats
+
+	@profiling.staged('lr.fit')
 	def fit(self, X, y, sample_weight=None):
 		# print(" LR FIT on",len(X))
 		super().fit(X, y, sample_weight=sample_weight)
@@ -46,55 +75,417 @@ class LinearRegression(_sklearn_LinearRegression):
 		if isinstance(X, pandas.DataFrame):
 			self.names_ = X.columns.copy()
 
-		sse = numpy.sum((self.predict(X) - y) ** 2, axis=0) / float(X.shape[0] - X.shape[1])
+		X_ = numpy.asarray(X, dtype=numpy.float64)
+		fitted = numpy.dot(X_, self.coef_.T) + self.intercept_
+		self.residual_ = y - fitted
+
+		if self.compute_stats and self.positive:
+			self.t_ = self.p_ = None
+		elif self.compute_stats:
+			self._compute_stats(X_, numpy.asarray(self.residual_, dtype=numpy.float64))
 
+		return self
+
+	def _compute_stats(self, X, residual):
+		"""
+		Standard errors, t statistics and p values for all targets at once.
+
+		The diagonal of inv(X'X) is taken from the QR decomposition of X instead
+		of by inverting X'X, which squares the condition number.
+		"""
+		dof = X.shape[0] - X.shape[1]
+		sse = numpy.sum(residual ** 2, axis=0) / float(dof)
 		if sse.shape == ():
 			sse = sse.reshape(1,)
 
-		inv_X_XT = numpy.linalg.inv(numpy.dot(X.T, X))
+		R = scipy.linalg.qr(X, mode='r')[0][:X.shape[1]]
+		try:
+			R_inv = scipy.linalg.solve_triangular(R, numpy.eye(R.shape[0]))
+		except numpy.linalg.LinAlgError:
+			R_inv = numpy.linalg.pinv(R)
+		diag_inv_XtX = numpy.sum(R_inv ** 2, axis=1)
 
 		with warnings.catch_warnings():
 			warnings.simplefilter("ignore", category=RuntimeWarning)
-
-			try:
-				se = numpy.array([
-					numpy.sqrt(numpy.diagonal(sse[i] * inv_X_XT))
-					for i in range(sse.shape[0])
-				])
-			except:
-				print("sse.shape",sse.shape)
-				print(sse)
-				raise
-
+			se = numpy.sqrt(sse[:, None] * diag_inv_XtX[None, :])
 			self.t_ = self.coef_ / se
-			self.p_ = 2 * (1 - scipy.stats.t.cdf(numpy.abs(self.t_), y.shape[0] - X.shape[1]))
-
-		# try:
-		# 	print(y.values[0])
-		# except AttributeError:
-		# 	print(y[0])
-		return self
+			self.p_ = 2 * scipy.stats.t.sf(numpy.abs(self.t_), dof)
 
 	def predict(self, X):
 		# print(" "*55,"LR PREDICT on", len(X))
 		return super().predict(X)
 
 
+class _OptimumFound(Exception):
+	pass
+
+
+def _optimize_from(gpr, X, y, theta):
+	"""
+	Run one marginal likelihood optimization starting from `theta`.
+
+	Returns the optimal theta and the negative log marginal likelihood there,
+	matching the entries sklearn collects for each optimizer restart.  The fit
+	is abandoned as soon as the optimizer finishes, so no Cholesky factor is
+	computed for restarts that are not the overall best.
+	"""
+	found = []
+
+	def optimizer(obj_func, initial_theta, bounds):
+		found.append(gpr._constrained_optimization(obj_func, initial_theta, bounds))
+		raise _OptimumFound()
+
+	g = clone(gpr)
+	g.set_params(
+		kernel=gpr.kernel.clone_with_theta(theta),
+		optimizer=optimizer,
+		n_restarts_optimizer=0,
+		n_jobs=None,
+		backend=None,
+	)
+	try:
+		g.fit(X, y)
+	except _OptimumFound:
+		pass
+	return found[0]
+
+
+# Jitter added to the diagonal of a float32 kernel matrix, relative to its
+# mean diagonal, on successive attempts at the Cholesky factorization.
+FLOAT32_JITTER = (0.0, 1e-6, 1e-5, 1e-4)
+
+# The largest relative difference between the float32 and float64 predicted
+# means, on a sample of the training inputs, for which the float32
+# factorization is kept.
+FLOAT32_TOLERANCE = 1e-2
+
+# The number of training inputs in that sample.
+_FLOAT32_CHECK_SIZE = 256
+
+# Kernel matrices are evaluated in row blocks of at most this many float64s.
+_KERNEL_BLOCK_SIZE = 2**22
+
+
+def _kernel_float32(kernel, X, Y=None):
+	"""
+	Evaluate a kernel matrix into a float32 array, a block of rows at a time.
+
+	sklearn kernels compute in float64, so evaluating in blocks keeps the
+	float64 intermediate small.  With Y None, the diagonal is taken from
+	`kernel.diag`, so that white noise is included.
+	"""
+	Y_ = X if Y is None else Y
+	K = numpy.empty([X.shape[0], Y_.shape[0]], dtype=numpy.float32)
+	rows = max(1, _KERNEL_BLOCK_SIZE // max(Y_.shape[0], 1))
+	for start in range(0, X.shape[0], rows):
+		K[start:start + rows] = kernel(X[start:start + rows], Y_)
+	if Y is None:
+		K[numpy.diag_indices_from(K)] = kernel.diag(X)
+	return K
+
+
 class GaussianProcessRegressor_(GaussianProcessRegressor):
 
+	def __init__(self, kernel=None, alpha=1e-10, optimizer="fmin_l_bfgs_b", n_restarts_optimizer=0,
+				 normalize_y=False, copy_X_train=True, random_state=None, n_jobs=None, backend=None,
+				 warm_start=False, warm_restarts=0, precision='float64'):
+		"""
+
+		Parameters
+		----------
+		n_jobs : int, optional
+			Run the optimizer restarts on this many workers.  The starting points
+			for all restarts are drawn up front from `random_state`, exactly as
+			the serial fit draws them, so the result does not depend on
+			the number of workers.
+		backend : {None, 'thread', 'process', 'dask'}, optional
+			Where to run the optimizer restarts, see `pines.gpr.parallel.open_executor`.
+		warm_start : bool, default False
+			Start the optimizer for a refit from the hyperparameters of the
+			previous fit.  Cross validation folds of a model with `warm_start`
+			are also seeded from the parent fit or a sibling fold.
+		warm_restarts : int, default 0
+			Number of optimizer restarts to use instead of `n_restarts_optimizer`
+			when the fit is warm started.
+		precision : {'float64', 'float32'}, default 'float64'
+			The precision of the fitted training kernel factor and of
+			predictions.  With 'float32', the hyperparameters are still found
+			in float64, but the final factorization is done in float32, adding
+			jitter to the diagonal if needed, which halves the memory held by
+			the fitted model and speeds up prediction.  If the factorization
+			fails, or its predicted means on a sample of the training inputs
+			differ from the float64 ones by more than `FLOAT32_TOLERANCE`, as
+			when the kernel is ill-conditioned (e.g. with no noise term), the
+			model stays in float64.  The outcome is recorded in `factorization_`.
+
+		Other parameters are as for sklearn's GaussianProcessRegressor.
+		"""
+		super().__init__(
+			kernel=kernel,
+			alpha=alpha,
+			optimizer=optimizer,
+			n_restarts_optimizer=n_restarts_optimizer,
+			normalize_y=normalize_y,
+			copy_X_train=copy_X_train,
+			random_state=random_state,
+		)
+		self.n_jobs = n_jobs
+		self.backend = backend
+		self.warm_start = warm_start
+		self.warm_restarts = warm_restarts
+		self.precision = precision
+
+	def set_warm_start(self, theta):
+		"""
+		Start the optimizer for the next fit from the given hyperparameters.
+
+		Parameters
+		----------
+		theta : array-like
+			Log-transformed kernel hyperparameters, as in `kernel_.theta`, for
+			example from the `warm_state` of a related fitted model.  They are
+			ignored if they do not match the dimensions of the kernel.
+
+		Returns
+		-------
+		self
+		"""
+		self._warm_theta = numpy.asarray(theta, dtype=numpy.float64)
+		return self
+
+	def warm_state(self):
+		"""
+		The fitted hyperparameters, for seeding the fit of a related model.
+		"""
+		return self.kernel_.theta
+
+	@profiling.staged('gpr.fit')
 	def fit(self, X, y):
+		profiling.count('rows', len(X))
+		theta = getattr(self, '_warm_theta', None)
+		if theta is None and self.warm_start and hasattr(self, 'kernel_'):
+			theta = self.kernel_.theta
+		self._warm_theta = None
+		if theta is None or self.kernel is None or numpy.shape(theta) != numpy.shape(self.kernel.theta):
+			return self._fit(X, y)
+
+		bounds = self.kernel.bounds
+		kernel, n_restarts_optimizer = self.kernel, self.n_restarts_optimizer
+		try:
+			self.kernel = kernel.clone_with_theta(numpy.clip(theta, bounds[:, 0], bounds[:, 1]))
+			self.n_restarts_optimizer = self.warm_restarts
+			return self._fit(X, y)
+		finally:
+			self.kernel, self.n_restarts_optimizer = kernel, n_restarts_optimizer
+
+	def _fit(self, X, y):
+		if self.precision not in ('float64', 'float32'):
+			raise ValueError(f"precision must be 'float64' or 'float32', not {self.precision!r}")
+		self._fit_float64(X, y)
+		self.factorization_ = dicta(precision='float64', jitter=0.0, error=0.0)
+		if self.precision == 'float32':
+			self._factor_float32()
+		return self
+
+	@profiling.staged('gpr.factor_float32')
+	def _factor_float32(self):
+		"""
+		Replace the float64 factor of the training kernel with a float32 one.
+
+		The factorization is retried with increasing jitter on the diagonal,
+		and the predicted means from its solution for `alpha_` are checked
+		against the float64 ones on a sample of the training inputs.
+		"""
+		if numpy.iterable(self.alpha):
+			alpha = numpy.asarray(self.alpha, dtype=numpy.float32)
+		else:
+			alpha = numpy.float32(self.alpha)
+		X = numpy.asarray(self.X_train_, dtype=numpy.float32)
+		K = _kernel_float32(self.kernel_, X)
+		diagonal = numpy.diag_indices_from(K)
+		K[diagonal] += alpha
+		scale = K[diagonal].mean()
+		y = self.y_train_.astype(numpy.float32)
+		sample = numpy.unique(numpy.linspace(0, X.shape[0] - 1, _FLOAT32_CHECK_SIZE).astype(int))
+		K_check = self.kernel_(self.X_train_[sample], self.X_train_)
+		mean = K_check @ self.alpha_
+		added = 0.0
+		for jitter in FLOAT32_JITTER:
+			K[diagonal] += numpy.float32(jitter * scale - added)
+			added = jitter * scale
+			try:
+				L = scipy.linalg.cholesky(K, lower=True, check_finite=False)
+			except numpy.linalg.LinAlgError:
+				continue
+			alpha_ = scipy.linalg.cho_solve((L, True), y, check_finite=False)
+			error = numpy.linalg.norm(K_check @ alpha_ - mean) / numpy.linalg.norm(mean)
+			if error <= FLOAT32_TOLERANCE:
+				self.X_train_, self.L_, self.alpha_ = X, L, alpha_
+				self.factorization_ = dicta(precision='float32', jitter=added, error=error)
+			else:
+				self.factorization_.error = error
+			return
+		self.factorization_.error = numpy.inf
+
+	def _fit_float64(self, X, y):
 		# print(" GPR FIT on",len(X))
-		q = super().fit(X,y)
-		# try:
-		# 	print(y.values[0])
-		# except AttributeError:
-		# 	print(y[0])
+		if (
+				self.kernel is None
+				or self.optimizer is None
+				or self.n_restarts_optimizer == 0
+				or self.kernel.n_dims == 0
+				or is_serial(self.backend, self.n_jobs)
+		):
+			return super().fit(X,y)
+
+		bounds = self.kernel.bounds
+		if not numpy.isfinite(bounds).all():
+			raise ValueError("Multiple optimizer restarts (n_restarts_optimizer>0) requires that all bounds are finite.")
+		rng = check_random_state(self.random_state)
+		starts = [self.kernel.theta] + [
+			rng.uniform(bounds[:, 0], bounds[:, 1])
+			for _ in range(self.n_restarts_optimizer)
+		]
+		with open_executor(self.backend, self.n_jobs) as executor:
+			X_ = share(executor, X)
+			y_ = share(executor, y)
+			futures = [profiling.submit(executor, _optimize_from, self, X_, y_, theta) for theta in starts]
+			optima = [f.result() for f in futures]
+		best_theta = optima[numpy.argmin([i[1] for i in optima])][0]
+
+		# Refit once at the best theta to set up the Cholesky factor and friends.
+		kernel, optimizer = self.kernel, self.optimizer
+		try:
+			self.kernel = kernel.clone_with_theta(best_theta)
+			self.optimizer = None
+			with profiling.stage('gpr.factor'):
+				q = super().fit(X,y)
+		finally:
+			self.kernel, self.optimizer = kernel, optimizer
 		return q
 
+	@profiling.staged('gpr.predict')
 	def predict(self, X, return_std=False, return_cov=False):
 		#print(" "*55,"GPR PREDICT on", len(X))
+		profiling.count('rows', len(X))
+		if getattr(self, 'L_', None) is not None and self.L_.dtype == numpy.float32:
+			return self._predict_float32(X, return_std=return_std, return_cov=return_cov)
 		return super().predict(X, return_std=return_std, return_cov=return_cov)
 
+	def _predict_float32(self, X, return_std=False, return_cov=False):
+		"""
+		As sklearn's predict for a fitted model, computing in float32.
+
+		Results are returned as float64.
+		"""
+		if return_std and return_cov:
+			raise RuntimeError("At most one of return_std or return_cov can be requested.")
+		X = numpy.asarray(X, dtype=numpy.float32)
+		K_trans = _kernel_float32(self.kernel_, X, self.X_train_)
+		y_mean = (K_trans @ self.alpha_).astype(numpy.float64)
+		y_mean = self._y_train_std * y_mean + self._y_train_mean
+		if y_mean.ndim > 1 and y_mean.shape[1] == 1:
+			y_mean = numpy.squeeze(y_mean, axis=1)
+		if not (return_std or return_cov):
+			return y_mean
+
+		V = scipy.linalg.solve_triangular(self.L_, K_trans.T, lower=True, check_finite=False)
+		del K_trans
+		if return_cov:
+			y_cov = self.kernel_(X) - (V.T @ V).astype(numpy.float64)
+			y_cov = numpy.outer(y_cov, self._y_train_std ** 2).reshape(*y_cov.shape, -1)
+			if y_cov.shape[2] == 1:
+				y_cov = numpy.squeeze(y_cov, axis=2)
+			return y_mean, y_cov
+
+		y_var = self.kernel_.diag(X) - numpy.einsum("ij,ij->j", V, V, dtype=numpy.float64)
+		y_var[y_var < 0] = 0.0
+		y_var = numpy.outer(y_var, self._y_train_std ** 2).reshape(*y_var.shape, -1)
+		if y_var.shape[1] == 1:
+			y_var = numpy.squeeze(y_var, axis=1)
+		return y_mean, numpy.sqrt(y_var)
+
+	def log_marginal_likelihood(self, theta=None, eval_gradient=False, clone_kernel=True):
+		# Each evaluation by the optimizer factors the training kernel once.
+		with profiling.stage('gpr.lml'):
+			return super().log_marginal_likelihood(theta, eval_gradient=eval_gradient, clone_kernel=clone_kernel)
+
+	@profiling.staged('gpr.update')
+	def update(self, X, y, drift_tolerance=None):
+		"""
+		Add training data, keeping the current kernel hyperparameters.
+
+		The Cholesky factor of the training kernel is extended with the new
+		rows by a block update, which costs O(n²k) for k new rows instead of
+		the O(n³) of a refit, and the optimizer is not run.  With `normalize_y`,
+		the new targets are normalized with the mean and scale of the original
+		training targets.
+
+		Parameters
+		----------
+		X : array-like of shape [n_new, n_features]
+		y : array-like of shape [n_new] or [n_new, n_targets]
+		drift_tolerance : float, optional
+			If the log marginal likelihood per training sample falls by more
+			than this, the current hyperparameters are taken to no longer suit
+			the data, and the model is refit on all the training data, optimizer
+			restarts and all.  By default the model is only refit if the
+			extended factor is not positive definite.
+
+		Returns
+		-------
+		self : returns an instance of self.
+		"""
+		if numpy.iterable(self.alpha):
+			raise ValueError("update requires a scalar alpha")
+		X = numpy.asarray(X, dtype=numpy.float64)
+		y = numpy.asarray(y, dtype=numpy.float64).reshape((X.shape[0],) + self.y_train_.shape[1:])
+		n_old = self.X_train_.shape[0]
+		lml_old = self.log_marginal_likelihood_value_
+		X_all = numpy.concatenate([self.X_train_, X])
+		y_all = numpy.concatenate([self.y_train_, (y - self._y_train_mean) / self._y_train_std])
+
+		K12 = self.kernel_(self.X_train_, X)
+		K22 = self.kernel_(X)
+		K22[numpy.diag_indices_from(K22)] += self.alpha
+		L21 = scipy.linalg.solve_triangular(self.L_, K12, lower=True).T
+		try:
+			L22 = scipy.linalg.cholesky(K22 - L21 @ L21.T, lower=True)
+		except numpy.linalg.LinAlgError:
+			drift = numpy.inf
+		else:
+			L = numpy.block([
+				[self.L_, numpy.zeros([n_old, X.shape[0]])],
+				[L21, L22],
+			])
+			alpha = scipy.linalg.cho_solve((L, True), y_all)
+			fit = numpy.einsum("i...,i...->...", y_all, alpha)
+			lml = numpy.sum(-0.5 * fit - numpy.log(numpy.diag(L)).sum() - X_all.shape[0] / 2 * numpy.log(2 * numpy.pi))
+			# A float32 model stays float32.
+			dtype = self.L_.dtype
+			self.X_train_ = X_all.astype(dtype, copy=False)
+			self.y_train_ = y_all
+			self.L_ = L.astype(dtype, copy=False)
+			self.alpha_ = alpha.astype(dtype, copy=False)
+			self.log_marginal_likelihood_value_ = lml
+			drift = lml_old / n_old - lml / X_all.shape[0]
+
+		refit = not numpy.isfinite(drift) or (drift_tolerance is not None and drift > drift_tolerance)
+		if refit:
+			self.fit(X_all, y_all * self._y_train_std + self._y_train_mean)
+		self.update_ = dicta(n_new=X.shape[0], drift=drift, refit=refit)
+		return self
+
+
+def _append_rows(a, b):
+	if isinstance(a, (pandas.DataFrame, pandas.Series)):
+		return pandas.concat([a, b])
+	return numpy.concatenate([a, b])
+
+def default_kernel_generator(dims):
+	return C() * RBF([1.0] * dims)
+
+
 def _make_as_vector(y):
 	# if isinstance(y, (pandas.DataFrame, pandas.Series)):
 	# 	y = y.values.ravel()
@@ -110,27 +501,77 @@ def ignore_warnings(category=Warning):
 class LinearAndGaussianProcessRegression(
 		BaseEstimator,
 		RegressorMixin,
+		StreamingPredictMixin,
+		PredictionCacheMixin,
 ):
 
-	def __init__(self, core_features=None, keep_other_features=3, use_linear=True):
+	def __init__(self, core_features=None, keep_other_features=3, use_linear=True, n_jobs=None, backend=None, n_inducing=None, screen=None, warm_start=False, prediction_cache=None, precision='float64'):
 		"""
 
 		Parameters
 		----------
 		core_features
 			feature columns to definitely keep for both LR and GPR
+		n_jobs : int, optional
+			Number of workers used to run the GPR optimizer restarts concurrently.
+		backend : {None, 'thread', 'process', 'dask'}, optional
+			Where to run the GPR optimizer restarts, see `pines.gpr.parallel.open_executor`.
+		n_inducing : int, optional
+			If given, use an approximate GPR with this many inducing points
+			instead of the exact GPR, see `pines.gpr.sparse.SparseGaussianProcessRegressor`.
+			This allows training on much larger data sets.
+		screen : str or callable, optional
+			The feature screen used to pick the best other features, see
+			`pines.gpr.screening.get_screen`.  Defaults to the cached histogram
+			mutual information screen; use 'mutual_info' for sklearn's kNN estimator.
+		prediction_cache : int or PredictionCache, optional
+			Remember predictions for this many input rows, keyed by the model's
+			fitted state and the values of the selected features in each row, so
+			that repeated queries only compute the new rows.  A
+			`pines.gpr.cache.PredictionCache` may be given to share one cache
+			among several models.  Predictions with `return_cov` are not cached.
+		warm_start : bool, default False
+			Start the GPR hyperparameter optimizer from the previous fit, or from
+			the parent model or a sibling fold in cross validation, and skip the
+			optimizer restarts when warm.  See `set_warm_start`.
+		precision : {'float64', 'float32'}, default 'float64'
+			The precision of the fitted exact GPR, see `GaussianProcessRegressor_`.
+			The approximate GPR used with `n_inducing` is always float64.
 
 		"""
 
 		self.core_features = core_features
 		self.keep_other_features = keep_other_features
 		self.lr = LinearRegression()
-		self.gpr = GaussianProcessRegressor_(n_restarts_optimizer=9)
+		if n_inducing is None:
+			self.gpr = GaussianProcessRegressor_(
+				n_restarts_optimizer=9,
+				n_jobs=n_jobs,
+				backend=backend,
+				warm_start=warm_start,
+				precision=precision,
+			)
+		else:
+			self.gpr = SparseGaussianProcessRegressor(
+				n_inducing=n_inducing,
+				n_restarts_optimizer=9,
+				n_jobs=n_jobs,
+				backend=backend,
+				warm_start=warm_start,
+			)
 		self.y_residual = None
-		self.kernel_generator = lambda dims: C() * RBF([1.0] * dims)
+		self.kernel_generator = default_kernel_generator
 		self.use_linear = use_linear
+		self.n_jobs = n_jobs
+		self.backend = backend
+		self.n_inducing = n_inducing
+		self.screen = screen
+		self.warm_start = warm_start
+		self.prediction_cache = prediction_cache
+		self.precision = precision
 
 
+	@profiling.staged('feature_selection')
 	def _feature_selection(self, X, y=None):
 		"""
 
@@ -164,7 +605,7 @@ class LinearAndGaussianProcessRegression(
 			return X_core
 
 		if y is not None:
-			self.feature_selector = SelectKBest(mutual_info_regression, k=self.keep_other_features).fit(X_other, y)
+			self.feature_selector = SelectKBest(get_screen(self.screen), k=self.keep_other_features).fit(X_other, y)
 
 		try:
 			X_other = pandas.DataFrame(
@@ -191,6 +632,7 @@ class LinearAndGaussianProcessRegression(
 			raise
 
 
+	@profiling.staged('fit')
 	def fit(self, X, y):
 		"""
 		Fit linear and gaussian model.
@@ -233,7 +675,9 @@ class LinearAndGaussianProcessRegression(
 				self.Y_columns = None
 
 			y = _make_as_vector(y)
+			self._reset_prediction_cache()
 			X_core_plus = self._feature_selection(X, y)
+			self.features_ = list(X_core_plus.columns)
 
 			if self.use_linear:
 				try:
@@ -244,7 +688,7 @@ class LinearAndGaussianProcessRegression(
 					print(X_core_plus)
 					print(y)
 					raise
-				self.y_residual = y - self.lr.predict(X_core_plus)
+				self.y_residual = self.lr.residual_
 			else:
 				self.y_residual = y
 			dims = X_core_plus.shape[1]
@@ -255,6 +699,7 @@ class LinearAndGaussianProcessRegression(
 		return self
 
 
+	@profiling.staged('predict')
 	def predict(self, X, return_std=False, return_cov=False):
 		"""Predict using the model
 
@@ -262,6 +707,9 @@ class LinearAndGaussianProcessRegression(
 		----------
 		X : {array-like, sparse matrix}, shape = (n_samples, n_features)
 			Samples.
+		return_std, return_cov : bool, default False
+			Also return the standard deviation or covariance of the gaussian
+			process part of the prediction.
 
 		Returns
 		-------
@@ -273,43 +721,123 @@ class LinearAndGaussianProcessRegression(
 			raise TypeError('must use pandas.DataFrame for X')
 		X_core_plus = self._feature_selection(X)
 
+		if self._use_prediction_cache() and not return_cov:
+			y_hat, y_hat_spread = self._cached_predict_arrays(X_core_plus, return_std=return_std)
+		else:
+			y_hat, y_hat_spread = self._predict_arrays(X_core_plus, return_std=return_std, return_cov=return_cov)
+
+		if self.Y_columns is not None:
+			y_result = pandas.DataFrame(
+				y_hat,
+				columns=self.Y_columns,
+				index=X.index,
+			)
+		else:
+			y_result = y_hat
+
+		if return_std or return_cov:
+			return y_result, y_hat_spread
+		return y_result
+
+	def _predict_arrays(self, X_core_plus, return_std=False, return_cov=False):
 		if self.use_linear:
 			y_hat_lr = self.lr.predict(X=X_core_plus)
 		else:
 			y_hat_lr = 0
 
-		if return_std:
-			y_hat_gpr, y_hat_std = self.gpr.predict(X_core_plus, return_std=True)
+		if return_std or return_cov:
+			y_hat_gpr, y_hat_spread = self.gpr.predict(X_core_plus, return_std=return_std, return_cov=return_cov)
+		else:
+			y_hat_gpr, y_hat_spread = self.gpr.predict(X_core_plus), None
+		if self.use_linear:
+			# Recent sklearn drops the target axis of a single target GPR prediction.
+			y_hat_gpr = numpy.reshape(y_hat_gpr, numpy.shape(y_hat_lr))
+		return y_hat_lr + y_hat_gpr, y_hat_spread
+
+	def _prediction_state(self):
+		state = [type(self).__name__, self.features_, self.gpr.kernel_.theta, self.gpr.alpha_]
+		if self.use_linear:
+			state += [self.lr.coef_, self.lr.intercept_]
+		return state
 
-			if self.Y_columns is not None:
-				y_result = pandas.DataFrame(
-					y_hat_lr + y_hat_gpr,
-					columns=self.Y_columns,
-					index=X.index,
-				)
-			else:
-				y_result = y_hat_lr + y_hat_gpr
+	def export_predictor(self):
+		"""
+		Freeze this fitted model into a lightweight numpy-only predictor.
 
-			return y_result, y_hat_std
-		else:
-			y_hat_gpr = self.gpr.predict(X_core_plus)
-
-			if self.Y_columns is not None:
-				y_result = pandas.DataFrame(
-					y_hat_lr + y_hat_gpr,
-					columns=self.Y_columns,
-					index=X.index,
-				)
-			else:
-				y_result = y_hat_lr + y_hat_gpr
+		The predictor holds the selected feature names, the linear
+		coefficients, the kernel hyperparameters and the arrays the gaussian
+		process needs to predict, and can be saved to an .npz file.  It does not
+		import sklearn or pandas.
 
-			return y_result
+		Returns
+		-------
+		pines.frozen_predictor.FrozenPredictor
+		"""
+		return freeze(self)
 
-	def cross_val_scores(self, X, Y, cv=3):
-		p = self.cross_val_predict(X, Y, cv=cv)
+	def set_warm_start(self, state):
+		"""
+		Start the GPR hyperparameter optimizer for the next fit from `state`.
+
+		Parameters
+		----------
+		state : array-like
+			As from the `warm_state` of a related fitted model, such as the same
+			model fit on other folds of the data.
+
+		Returns
+		-------
+		self
+		"""
+		self.gpr.set_warm_start(state)
+		return self
+
+	def warm_state(self):
+		"""
+		The fitted GPR hyperparameters, for seeding the fit of a related model.
+		"""
+		return self.gpr.warm_state()
+
+	@profiling.staged('update')
+	def update(self, X, y, drift_tolerance=None):
+		"""
+		Add training data without refitting from scratch.
+
+		The selected features and the linear coefficients are kept, and the
+		new residuals are added to the gaussian process with its `update`,
+		which keeps the kernel hyperparameters unless the likelihood drifts.
+
+		Parameters
+		----------
+		X : pandas.DataFrame
+			New training data.
+		y : array-like or pandas.Series
+			New target values.
+		drift_tolerance : float, optional
+			See `GaussianProcessRegressor_.update`.
+
+		Returns
+		-------
+		self : returns an instance of self.
+		"""
+		if not isinstance(X, pandas.DataFrame):
+			raise TypeError('must use pandas.DataFrame for X')
+		with ignore_warnings(DataConversionWarning):
+			X_core_plus = self._feature_selection(X)
+			if self.use_linear:
+				y_residual = y - self.lr.predict(X_core_plus)
+			else:
+				y_residual = y
+			self._reset_prediction_cache()
+			self.gpr.update(X_core_plus, y_residual, drift_tolerance=drift_tolerance)
+			self.y_residual = _append_rows(self.y_residual, y_residual)
+		return self
+
+	def cross_val_scores(self, X, Y, cv=3, backend=None, n_jobs=None):
+		p = self.cross_val_predict(X, Y, cv=cv, backend=backend, n_jobs=n_jobs)
 		return pandas.Series(
 			r2_score(Y, p, sample_weight=None, multioutput='raw_values'),
-			index=Y.columns
+			index=p.columns
 		)
 	#
 	# def cross_val_scores(self, X, y, cv=3):
@@ -319,39 +847,33 @@ class LinearAndGaussianProcessRegression(
 	# 		total = cross_val_score(self, X_core_plus, y, cv=cv)
 	# 	return total
 
-	def cross_val_scores_full(self, X, y, cv=3, alt_y=None):
+	def cross_val_decomposition(self, X, y, cv=3, backend=None, n_jobs=None):
+		"""
+		Cross validate this model and its linear and GPR parts in a single pass.
+
+		See `pines.gpr.cross_val_decomposition` for the details.  Both
+		`cross_val_scores_full` and `cross_val_predicts` are views on this.
 
+		Returns
+		-------
+		dicta
+			With keys 'predict', 'scores' and 'timing'.
+		"""
 		with ignore_warnings(DataConversionWarning):
 			y = _make_as_vector(y)
-
 			X_core_plus = self._feature_selection(X, y)
+			result = cross_val_decomposition(self, X_core_plus, y, cv=cv, backend=backend, n_jobs=n_jobs)
+		self.cv_timing_ = result.timing
+		return result
 
-			total = cross_val_score(self, X_core_plus, y, cv=cv)
-
-			if self.use_linear:
-				linear_cv_score = cross_val_score(self.lr, X_core_plus, y, cv=cv)
-				linear_cv_predict = cross_val_predict(self.lr, X_core_plus, y, cv=cv)
-				linear_cv_residual = y-linear_cv_predict
-				gpr_cv_score = cross_val_score(self.gpr, X_core_plus, linear_cv_residual, cv=cv)
+	def cross_val_scores_full(self, X, y, cv=3, alt_y=None, backend=None, n_jobs=None):
 
-				self.lr.fit(X_core_plus, y)
-				y_residual = y - self.lr.predict(X_core_plus)
-				gpr_cv_score2 = cross_val_score(self.gpr, X_core_plus, y_residual, cv=cv)
-
-				result = dicta(
-					total=total,
-					linear=linear_cv_score,
-					net_gpr=total-linear_cv_score,
-					gpr=gpr_cv_score,
-					gpr2=gpr_cv_score2,
-				)
-			else:
-				result = dicta(
-					total=total,
-				)
+		with ignore_warnings(DataConversionWarning):
+			result = dicta(self.cross_val_decomposition(X, y, cv=cv, backend=backend, n_jobs=n_jobs).scores)
 
 			if alt_y is not None:
-				result['gpr_alt'] = cross_val_score(self.gpr, X, alt_y, cv=cv)
+				cvf = cross_val_folds(self.gpr, X, alt_y, cv=cv, backend=backend, n_jobs=n_jobs)
+				result['gpr_alt'] = fold_scores(alt_y, cvf.predict, cvf.folds)
 				# print()
 				# print(numpy.concatenate([y_residual, alt_y, y_residual-alt_y], axis=1 ))
 				# print()
@@ -360,7 +882,13 @@ class LinearAndGaussianProcessRegression(
 				# print()
 		return result
 
-	def cross_val_predict(self, X, y, cv=3):
+	def cross_val_predict(self, X, y, cv=3, backend=None, n_jobs=None):
+		"""
+		Cross validated predictions.
+
+		The folds are run by `pines.gpr.crossval.cross_val_folds`, on the given
+		`backend` and `n_jobs`, and the timing of each fold is stored in `cv_timing_`.
+		"""
 
 		with ignore_warnings(DataConversionWarning):
 
@@ -373,101 +901,184 @@ class LinearAndGaussianProcessRegression(
 			else:
 				y_columns = ['Unnamed']
 
-			total = cross_val_predict(self, X_core_plus, y, cv=cv)
+			cvf = cross_val_folds(self, X_core_plus, y, cv=cv, backend=backend, n_jobs=n_jobs)
+			self.cv_timing_ = cvf.timing
 			return pandas.DataFrame(
-				total,
+				cvf.predict,
 				index=y.index,
 				columns=y_columns,
 			)
 
-	def cross_val_predicts(self, X, y, cv=3):
-
-		with ignore_warnings(DataConversionWarning):
-			y = _make_as_vector(y)
-
-			X_core_plus = self._feature_selection(X, y)
-
-			total = cross_val_predict(self, X_core_plus, y, cv=cv)
-			if self.use_linear:
-				linear_cv_predict = cross_val_predict(self.lr, X_core_plus, y, cv=cv)
-				linear_cv_residual = y-linear_cv_predict
-				gpr_cv_predict_over_cv_linear = cross_val_predict(self.gpr, X_core_plus, linear_cv_residual, cv=cv)
-
-				self.lr.fit(X_core_plus, y)
-				linear_full_predict = self.lr.predict(X_core_plus)
-				y_residual = y - linear_full_predict
-				gpr_cv_predict_over_full_linear = cross_val_predict(self.gpr, X_core_plus, y_residual, cv=cv)
-
-				return dicta(
-					total=total,
-					linear=linear_cv_predict,
-					net_gpr=total-linear_cv_predict,
-					gpr=gpr_cv_predict_over_cv_linear+linear_cv_predict,
-					gpr2=gpr_cv_predict_over_full_linear+linear_full_predict,
-				)
-			else:
-				return dicta(
-					total=total,
-				)
-
+	def cross_val_predicts(self, X, y, cv=3, backend=None, n_jobs=None):
+		return self.cross_val_decomposition(X, y, cv=cv, backend=backend, n_jobs=n_jobs).predict
+
+
+
+
+@profiling.staged('cv.fold')
+def _decomposition_fold(model, X, y, linear_cv_residual, y_residual, train, test, warm=None):
+	start = time.perf_counter()
+	X_train, X_test = _take(X, train), _take(X, test)
+	total = fold_clone(model, warm).fit(X_train, _take(y, train)).predict(X_test)
+	if linear_cv_residual is None:
+		return total, None, None, time.perf_counter() - start
+	gpr = fold_clone(model.gpr, warm).fit(X_train, _take(linear_cv_residual, train)).predict(X_test)
+	gpr2 = fold_clone(model.gpr, warm).fit(X_train, _take(y_residual, train)).predict(X_test)
+	return total, gpr, gpr2, time.perf_counter() - start
+
+
+def cross_val_decomposition(model, X, y, cv=3, backend=None, n_jobs=None):
+	"""
+	Cross validate a linear-plus-GPR model and its parts, fitting each fold once.
+
+	The decomposition has these parts:
+
+	- total: the whole model
+	- linear: the linear regression alone
+	- net_gpr: total less linear
+	- gpr: the GPR fit to the cross validated residuals of the linear regression
+	- gpr2: the GPR fit to the residuals of the linear regression on all the data
+
+	The linear fits are cheap and are done first, in-process.  Then each fold
+	is one task that fits the whole model and both residual GPRs, so every
+	part is derived from the same set of fold fits, and both the predictions
+	and the per-fold scores come out of this one pass.  If the model has
+	`warm_start` turned on and has been fit, every fold's GPR optimizer is
+	seeded from its fitted hyperparameters.
+
+	Parameters
+	----------
+	model : estimator
+		A model with `lr`, `gpr` and `use_linear` attributes, such as a
+		LinearAndGaussianProcessRegression.  As a side effect, `model.lr` is
+		refit on all the data.
+	X, y : array-like
+	cv : int or cross-validation generator
+	backend, n_jobs
+		Where to run the folds, see `pines.gpr.parallel.open_executor`.
+
+	Returns
+	-------
+	dicta
+		With keys 'predict' (a dicta of out-of-fold predictions for each part),
+		'scores' (a dicta of per-fold R^2 scores for each part), and 'timing'
+		(a DataFrame with one row per fold).
+	"""
+	cv = check_cv(cv, y, classifier=False)
+	folds = list(cv.split(X, y))
+	y_shape = numpy.shape(y)
+
+	def _empty():
+		return numpy.empty(y_shape, dtype=numpy.float64)
+
+	if model.use_linear:
+		linear_cv_predict = _empty()
+		for train, test in folds:
+			lr = fold_clone(model.lr).fit(_take(X, train), _take(y, train))
+			linear_cv_predict[test] = numpy.reshape(lr.predict(_take(X, test)), (len(test),) + y_shape[1:])
+		linear_cv_residual = y - linear_cv_predict
+		model.lr.fit(X, y)
+		linear_full_predict = numpy.reshape(model.lr.predict(X), y_shape)
+		y_residual = y - linear_full_predict
+	else:
+		linear_cv_residual = y_residual = None
+
+	warm = warm_state(model)
+	with open_executor(backend, n_jobs) as executor:
+		X_ = share(executor, X)
+		y_ = share(executor, y)
+		futures = [
+			profiling.submit(executor, _decomposition_fold, model, X_, y_, linear_cv_residual, y_residual, train, test, warm)
+			for train, test in folds
+		]
+		results = [f.result() for f in futures]
+
+	total = _empty()
+	gpr = _empty()
+	gpr2 = _empty()
+	for (train, test), (p_total, p_gpr, p_gpr2, _) in zip(folds, results):
+		fold_shape = (len(test),) + y_shape[1:]
+		total[test] = numpy.reshape(numpy.asarray(p_total), fold_shape)
+		if model.use_linear:
+			gpr[test] = numpy.reshape(numpy.asarray(p_gpr), fold_shape)
+			gpr2[test] = numpy.reshape(numpy.asarray(p_gpr2), fold_shape)
+
+	timing = pandas.DataFrame(
+		[(len(train), len(test), t) for (train, test), (_, _, _, t) in zip(folds, results)],
+		columns=['n_train', 'n_test', 'fit_predict'],
+	)
+	timing.index.name = 'fold'
+
+	if model.use_linear:
+		predict = dicta(
+			total=total,
+			linear=linear_cv_predict,
+			net_gpr=total-linear_cv_predict,
+			gpr=gpr+linear_cv_predict,
+			gpr2=gpr2+linear_full_predict,
+		)
+		total_scores = fold_scores(y, total, folds)
+		linear_scores = fold_scores(y, linear_cv_predict, folds)
+		scores = dicta(
+			total=total_scores,
+			linear=linear_scores,
+			net_gpr=total_scores-linear_scores,
+			gpr=fold_scores(linear_cv_residual, gpr, folds),
+			gpr2=fold_scores(y_residual, gpr2, folds),
+		)
+	else:
+		predict = dicta(
+			total=total,
+		)
+		scores = dicta(
+			total=fold_scores(y, total, folds),
+		)
 
+	return dicta(
+		predict=predict,
+		scores=scores,
+		timing=timing,
+	)
 
 
-def cross_val_scores(pipe, X, y, cv=3):
+def cross_val_scores(pipe, X, y, cv=3, backend=None, n_jobs=None):
 	# For pipelines
 
 	y = _make_as_vector(y)
 
 	self = pipe.steps[-1][1]
 
-	total = cross_val_score(self, X, y, cv=cv)
-	linear_cv_score = cross_val_score(self.lr, X, y, cv=cv)
-	linear_cv_predict = cross_val_predict(self.lr, X, y, cv=cv)
-	linear_cv_residual = y-linear_cv_predict
-	gpr_cv_score = cross_val_score(self.gpr, X, linear_cv_residual, cv=cv)
-
-	self.lr.fit(X, y)
-	y_residual = y - self.lr.predict(X)
-	gpr_cv_score2 = cross_val_score(self.gpr, X, y_residual, cv=cv)
-
-	return dicta(
-		total=total,
-		linear=linear_cv_score,
-		net_gpr=total-linear_cv_score,
-		gpr=gpr_cv_score,
-		gpr2=gpr_cv_score2,
-	)
+	return cross_val_decomposition(self, X, y, cv=cv, backend=backend, n_jobs=n_jobs).scores
 
 
-class PartialStandardScaler(StandardScaler):
+class PartialStandardScaler(PartialFitScalerMixin, StandardScaler):
 
 	def __init__(self, copy=True, with_mean=True, with_std=True, omit=()):
 		super().__init__(copy=copy, with_mean=with_mean, with_std=with_std)
-		self._omit = omit
+		self.omit = omit
 		self._names = None
 
-	def fit(self, X, y=None):
-		result = super().fit(X, y)
-		omit = [i for i in self._omit]
-		if isinstance(X, pandas.DataFrame):
-			self._names = X.columns.copy()
+	def _set_scale(self):
+		super()._set_scale()
+		omit = [i for i in self.omit]
+		if self.statistics_.columns is not None:
+			self._names = pandas.Index(self.statistics_.columns)
 			for n,k in enumerate(omit):
 				if isinstance(k, str):
-					omit[n] = X.columns.get_loc(k)
+					omit[n] = self._names.get_loc(k)
 		for k in omit:
 			if self.with_mean:
 				self.mean_[k] = 0
 			if self.with_std:
 				self.scale_[k] = 1
-		return result
 
-	def transform(self, X, y='deprecated', copy=None):
-		result = super().transform(X, y, copy)
+	def transform(self, X, copy=None):
+		result = super().transform(X, copy=copy)
 		if isinstance(X, pandas.DataFrame):
 			return pandas.DataFrame(
 				data=result,
 				index=X.index,
-				columns=[(f'{i}†' if i not in self._omit else i) for i in X.columns]
+				columns=[(f'{i}†' if i not in self.omit else i) for i in X.columns]
 			)
 		return result
 
@@ -487,16 +1098,16 @@ class PartialStandardScaler(StandardScaler):
 			X /= self.scale_[ix]
 		return X
 
-class Log1pStandardScaler(StandardScaler):
+class Log1pStandardScaler(PartialFitScalerMixin, StandardScaler):
 
 	def __init__(self, copy=True, with_mean=True, with_std=True):
 		super().__init__(copy=copy, with_mean=with_mean, with_std=with_std)
 
-	def fit(self, X, y=None):
-		return super().fit(numpy.log1p(X), y)
+	def _prepare(self, X):
+		return numpy.log1p(X)
 
-	def transform(self, X, y='deprecated', copy=None):
-		result = super().transform(numpy.log1p(X), y, copy)
+	def transform(self, X, copy=None):
+		result = super().transform(numpy.log1p(X), copy=copy)
 		if isinstance(X, pandas.DataFrame):
 			return pandas.DataFrame(
 				data=result,
@@ -517,14 +1128,48 @@ class Log1pStandardScaler(StandardScaler):
 		return result
 
 
+def _paired_correlations(A, B):
+	"""
+	Pearson correlation of each column of A with the same column of B.
+
+	Columns that are constant give NaN.
+	"""
+	A = A - A.mean(axis=0)
+	B = B - B.mean(axis=0)
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		return (A * B).sum(axis=0) / numpy.sqrt((A ** 2).sum(axis=0) * (B ** 2).sum(axis=0))
+
+
+def _cross_correlations(A, B):
+	"""
+	Pearson correlations between every column of A and every column of B.
+
+	Returns an array of shape (A.shape[1], B.shape[1]).  Columns that are
+	constant give NaN.
+	"""
+	A = A - A.mean(axis=0)
+	B = B - B.mean(axis=0)
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		return (A.T @ B) / numpy.outer(numpy.sqrt((A ** 2).sum(axis=0)), numpy.sqrt((B ** 2).sum(axis=0)))
+
+
 class ExponentialFeatures(BaseEstimator, TransformerMixin):
+	"""
+	Add the exponential of each feature, unless it is nearly collinear with the feature.
+
+	Which exponential features are kept is decided in `fit`, by the absolute
+	correlation of exp(x) with x, and is then applied unchanged by `transform`.
+	"""
 
 	def __init__(self):
 		pass
 
+	def _derived_mask(self, X, X_exp):
+		return numpy.fabs(_paired_correlations(X, X_exp)) < 0.99
+
 	def fit(self, X, y=None):
 		"""
-		Compute number of output features.
+		Decide which exponential features to keep.
 
 		Parameters
 		----------
@@ -535,6 +1180,11 @@ class ExponentialFeatures(BaseEstimator, TransformerMixin):
 		-------
 		self : instance
 		"""
+		from sklearn.utils import check_array
+		from sklearn.utils.validation import FLOAT_DTYPES
+
+		Xa = check_array(X, dtype=FLOAT_DTYPES)
+		self.derived_mask_ = self._derived_mask(Xa, numpy.exp(Xa))
 		return self
 
 	def transform(self, X):
@@ -552,46 +1202,70 @@ class ExponentialFeatures(BaseEstimator, TransformerMixin):
 			features generated from the combination of inputs.
 		"""
 		from sklearn.utils import check_array
-		from sklearn.utils.validation import check_is_fitted, check_random_state, FLOAT_DTYPES
+		from sklearn.utils.validation import FLOAT_DTYPES
 
-		from scipy.stats.stats import pearsonr
+		Xa = check_array(X, dtype=FLOAT_DTYPES)
+		n_samples, n_features = Xa.shape
 
-		X = check_array(X, dtype=FLOAT_DTYPES)
-		n_samples, n_features = X.shape
+		X_exp = numpy.exp(Xa)
+		derived_mask = getattr(self, 'derived_mask_', None)
+		if derived_mask is None:
+			derived_mask = self._derived_mask(Xa, X_exp)
+		elif derived_mask.shape[0] != n_features:
+			raise ValueError(f'X has {n_features} features, but {type(self).__name__} was fit with {derived_mask.shape[0]}')
 
-		# allocate output data
-		XP = numpy.empty((n_samples, n_features*2), dtype=X.dtype)
-		XP_use = numpy.ones((n_features*2,), dtype=bool)
+		return numpy.concatenate([Xa, X_exp[:, derived_mask]], axis=1)
 
-		for i in range(n_features):
-			XP[:, i] = X[:, i]
-			exp_x = numpy.exp(X[:, i])
-			correlation = pearsonr(X[:, i], exp_x)[0]
-			# print("correlation is",correlation)
-			if numpy.fabs(correlation) < 0.99:
-				XP[:, i+n_features] = exp_x
-			else:
-				XP_use[i+n_features] = 0
-
-		if isinstance(X, pandas.DataFrame):
-			result = pandas.DataFrame(
-				data=XP,
-				columns=list(X.columns) + [f'exp({c})' for c in X.columns],
-				index=X.index,
-			)
-			return result.iloc[:, XP_use]
 
-		return XP[:,XP_use]
+class InteractionFeatures(BaseEstimator, TransformerMixin):
+	"""
+	Add the product of each feature with one interaction feature.
 
+	An interaction is kept only when its absolute correlation with every
+	original feature, and with every interaction already kept, is below 0.99.
+	Which interactions are kept is decided in `fit`, and is then applied
+	unchanged by `transform`.
 
-class InteractionFeatures(BaseEstimator, TransformerMixin):
+	Parameters
+	----------
+	interaction_point : int or str
+		The position, or the column name for DataFrame input, of the feature
+		to interact with all the others.
+	"""
 
 	def __init__(self, interaction_point):
+		self.interaction_point = interaction_point
 		self._interaction_name = interaction_point
 
+	def _interact_point(self, X):
+		if isinstance(self._interaction_name, int):
+			return self._interaction_name
+		if isinstance(X, pandas.DataFrame):
+			return X.columns.get_loc(self._interaction_name)
+		raise TypeError("X must be DataFrame when interaction_name is string")
+
+	@staticmethod
+	def _derived_mask(Xa, X_int):
+		"""
+		Greedily accept interactions in column order.
+
+		All the correlations are computed in one pass; only the acceptance,
+		which depends on which earlier interactions were kept, is sequential.
+		"""
+		# A NaN correlation (from a constant column) propagates and rejects.
+		correlation1 = numpy.fabs(_cross_correlations(X_int, Xa)).max(axis=1)
+		correlation2 = numpy.fabs(_cross_correlations(X_int, X_int))
+		keep = numpy.zeros(Xa.shape[1], dtype=bool)
+		for i in range(Xa.shape[1]):
+			correlation = correlation1[i]
+			if keep.any():
+				correlation = max(correlation, correlation2[i, keep].max())
+			keep[i] = correlation < 0.99
+		return keep
+
 	def fit(self, X, y=None):
 		"""
-		Compute number of output features.
+		Decide which interaction features to keep.
 
 		Parameters
 		----------
@@ -602,10 +1276,16 @@ class InteractionFeatures(BaseEstimator, TransformerMixin):
 		-------
 		self : instance
 		"""
+		from sklearn.utils import check_array
+		from sklearn.utils.validation import FLOAT_DTYPES
+
+		interact_point = self._interact_point(X)
+		Xa = check_array(X, dtype=FLOAT_DTYPES)
+		self.derived_mask_ = self._derived_mask(Xa, Xa * Xa[:, [interact_point]])
 		return self
 
 	def transform(self, X):
-		"""Transform data to add exponential features
+		"""Transform data to add interaction features
 
 		Parameters
 		----------
@@ -619,56 +1299,29 @@ class InteractionFeatures(BaseEstimator, TransformerMixin):
 			features generated from the combination of inputs.
 		"""
 		from sklearn.utils import check_array
-		from sklearn.utils.validation import check_is_fitted, check_random_state, FLOAT_DTYPES
-
-		from scipy.stats.stats import pearsonr
-
-		interact_point = None
-
-		if isinstance(self._interaction_name, int):
-			interact_point = self._interaction_name
-		else:
-			if isinstance(X, pandas.DataFrame):
-				interact_point = X.columns.get_loc(self._interaction_name)
-			else:
-				raise TypeError("X must be DataFrame when interaction_name is string")
-
-		if interact_point is None:
-			raise TypeError('interact_point is None')
-
+		from sklearn.utils.validation import FLOAT_DTYPES
 
+		interact_point = self._interact_point(X)
 		Xa = check_array(X, dtype=FLOAT_DTYPES)
 		n_samples, n_features = Xa.shape
 
-		# allocate output data
-		XP = numpy.empty((n_samples, n_features*2), dtype=Xa.dtype)
-		XP_use = numpy.ones((n_features*2,), dtype=bool)
-		XP_fresh = numpy.zeros((n_features*2,), dtype=bool)
-
-		for i in range(n_features):
-			XP[:, i] = Xa[:, i]
-			exp_x = Xa[:, i] * Xa[:, interact_point]
-			#correlation = pearsonr(Xa[:, i], exp_x)[0]
-			correlation1 = numpy.corrcoef(Xa, exp_x, rowvar=False)[-1, :-1]
-			if XP_fresh.sum():
-				correlation2 = numpy.corrcoef(XP[:,XP_fresh], exp_x, rowvar=False)[-1, :-1]
-			else:
-				correlation2 = [0]
-			correlation = max( numpy.fabs(correlation1).max(), numpy.fabs(correlation2).max())
-			if numpy.fabs(correlation) < 0.99:
-				XP[:, i+n_features] = exp_x
-				XP_fresh[i+n_features] = True
-			else:
-				XP_use[i+n_features] = 0
+		X_int = Xa * Xa[:, [interact_point]]
+		derived_mask = getattr(self, 'derived_mask_', None)
+		if derived_mask is None:
+			derived_mask = self._derived_mask(Xa, X_int)
+		elif derived_mask.shape[0] != n_features:
+			raise ValueError(f'X has {n_features} features, but {type(self).__name__} was fit with {derived_mask.shape[0]}')
+
+		XP = numpy.concatenate([Xa, X_int[:, derived_mask]], axis=1)
 
 		if isinstance(X, pandas.DataFrame):
-			result = pandas.DataFrame(
+			return pandas.DataFrame(
 				data=XP,
-				columns=list(X.columns) + [f'{c} ~ {self._interaction_name}' for c in X.columns],
+				columns=list(X.columns) + [f'{c} ~ {self._interaction_name}' for c, use in zip(X.columns, derived_mask) if use],
 				index=X.index,
 			)
-			return result.iloc[:, XP_use]
 
-		return XP[:,XP_use]
+		return XP
+
 
 
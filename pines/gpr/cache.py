@@ -0,0 +1,154 @@
+"""
+Content-addressed caching of predictions.
+
+Interactive tools often ask a model to predict the same rows again and
+again.  A `PredictionCache` remembers predictions row by row, keyed by a
+fingerprint of the fitted model plus the bytes of each input row, so that a
+repeated query only computes the rows that have not been seen before, in a
+single batched call.
+"""
+
+import collections
+import threading
+import numpy
+
+from ..codex import fingerprint
+
+
+class PredictionCache:
+	"""
+	A least-recently-used cache of predictions for individual input rows.
+
+	Copies made by `sklearn.clone` share the cache, so one cache may serve
+	several models; entries are kept apart by a fingerprint of each model's
+	fitted state.  Pickled copies start with an empty cache.
+
+	Parameters
+	----------
+	maxsize : int
+		The number of rows to remember.
+	"""
+
+	def __init__(self, maxsize=100000):
+		self.maxsize = maxsize
+		self._cache = collections.OrderedDict()
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self._cache)
+
+	def __deepcopy__(self, memo):
+		return self
+
+	def __reduce__(self):
+		return (PredictionCache, (self.maxsize,))
+
+	def clear(self):
+		with self._lock:
+			self._cache.clear()
+
+	def predict(self, token, rows, compute, return_std=False):
+		"""
+		Get predictions for some rows, computing only the rows not cached.
+
+		Parameters
+		----------
+		token : str
+			A fingerprint of the fitted model.
+		rows : ndarray of shape (n_samples, n_features)
+			The input features that determine each prediction.
+		compute : callable
+			Called once with an array of the positions (in `rows`) of the rows
+			that are not cached, if there are any.  It returns the predicted
+			mean and standard deviation (or None) for those rows.
+		return_std : bool
+			Whether the standard deviation is needed.
+
+		Returns
+		-------
+		mean : ndarray
+		std : ndarray or None
+		"""
+		rows = numpy.ascontiguousarray(rows, dtype=numpy.float64)
+		prefix = token.encode()
+		keys = [prefix + row.tobytes() for row in rows]
+		found = [None] * len(keys)
+		with self._lock:
+			for i, key in enumerate(keys):
+				entry = self._cache.get(key)
+				if entry is not None and (entry[1] is not None or not return_std):
+					self._cache.move_to_end(key)
+					found[i] = entry
+					self.hits += 1
+		missing = {}
+		for i, entry in enumerate(found):
+			if entry is None:
+				missing.setdefault(keys[i], i)
+
+		if missing:
+			positions = numpy.fromiter(missing.values(), dtype=numpy.intp, count=len(missing))
+			mean, std = compute(positions)
+			computed = {}
+			for j, key in enumerate(missing):
+				computed[key] = (numpy.array(mean[j]), None if std is None else numpy.array(std[j]))
+			with self._lock:
+				self.misses += len(computed)
+				self._cache.update(computed)
+				for key in computed:
+					self._cache.move_to_end(key)
+				while len(self._cache) > self.maxsize:
+					self._cache.popitem(last=False)
+			found = [computed[keys[i]] if entry is None else entry for i, entry in enumerate(found)]
+
+		mean = numpy.stack([entry[0] for entry in found]) if found else numpy.empty(0)
+		std = numpy.stack([entry[1] for entry in found]) if (return_std and found) else None
+		return mean, std
+
+
+class PredictionCacheMixin:
+	"""
+	Optional prediction caching for estimators in `pines.gpr`.
+
+	The estimator has a `prediction_cache` parameter, which is None (or 0) to
+	turn caching off, a number of rows to cache, or a shared `PredictionCache`.
+	It implements `_predict_arrays(X, return_std=False, return_cov=False)`
+	returning a mean and a spread (or None), and `_prediction_state()`
+	returning the fitted state that determines the predictions, and calls
+	`_reset_prediction_cache` whenever that state changes.
+	"""
+
+	def _use_prediction_cache(self):
+		return isinstance(self.prediction_cache, PredictionCache) or bool(self.prediction_cache)
+
+	def _prediction_cache_store(self):
+		if isinstance(self.prediction_cache, PredictionCache):
+			return self.prediction_cache
+		store = getattr(self, '_prediction_cache', None)
+		if store is None or store.maxsize != self.prediction_cache:
+			store = self._prediction_cache = PredictionCache(self.prediction_cache)
+		return store
+
+	def _reset_prediction_cache(self):
+		self._prediction_token = None
+		store = getattr(self, '_prediction_cache', None)
+		if store is not None:
+			store.clear()
+
+	def _cached_predict_arrays(self, X, return_std=False):
+		"""
+		As `_predict_arrays`, through the prediction cache.
+
+		The cache is keyed by the values of X, so X should hold only the
+		features the model actually uses.
+		"""
+		token = getattr(self, '_prediction_token', None)
+		if token is None:
+			token = self._prediction_token = fingerprint(*self._prediction_state())
+
+		def compute(positions):
+			X_ = X.iloc[positions] if hasattr(X, 'iloc') else X[positions]
+			return self._predict_arrays(X_, return_std=return_std)
+
+		return self._prediction_cache_store().predict(token, numpy.asarray(X), compute, return_std=return_std)
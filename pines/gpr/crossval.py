@@ -0,0 +1,171 @@
+"""
+Cross validation engine with pluggable execution backends.
+
+Each fold refits a full model, so folds are run as independent tasks on a
+serial, thread, process or dask backend (see `pines.gpr.parallel`).
+"""
+
+import time
+import numpy, pandas
+from sklearn.base import clone
+from sklearn.model_selection import check_cv
+from sklearn.metrics import r2_score
+
+from pines.attribute_dict import dicta
+from .parallel import open_executor, share
+from . import profiling
+
+
+def _take(a, ix):
+	if isinstance(a, (pandas.DataFrame, pandas.Series)):
+		return a.iloc[ix]
+	return a[ix]
+
+
+def fold_clone(estimator, warm=None):
+	"""
+	Clone an estimator to fit on one fold.
+
+	Coefficient statistics from a linear regression (`compute_stats`) are
+	turned off, as nobody reads them from fold models.  A `kernel_generator`,
+	which is not a constructor parameter, is carried over.  If `warm` is
+	given, the clone's optimizer is seeded with it through `set_warm_start`.
+	"""
+	model = clone(estimator)
+	if hasattr(estimator, 'kernel_generator'):
+		model.kernel_generator = estimator.kernel_generator
+	for part in (model, getattr(model, 'lr', None)):
+		if hasattr(part, 'compute_stats'):
+			part.compute_stats = False
+	if warm is not None:
+		model.set_warm_start(warm)
+	return model
+
+
+def warm_state(estimator):
+	"""
+	The state to warm start related fits from, or None.
+
+	This is None unless the estimator has `warm_start` turned on and has
+	been fit.
+	"""
+	if not getattr(estimator, 'warm_start', False):
+		return None
+	try:
+		return estimator.warm_state()
+	except AttributeError:
+		return None
+
+
+@profiling.staged('cv.fold')
+def _fit_and_predict(estimator, X, y, train, test, keep_model=False, warm=None):
+	start = time.perf_counter()
+	model = fold_clone(estimator, warm).fit(_take(X, train), _take(y, train))
+	fit_time = time.perf_counter() - start
+	start = time.perf_counter()
+	prediction = numpy.asarray(model.predict(_take(X, test)), dtype=numpy.float64)
+	predict_time = time.perf_counter() - start
+	return prediction, fit_time, predict_time, (model if keep_model else None), warm_state(model)
+
+
+def cross_val_folds(estimator, X, y, cv=3, backend=None, n_jobs=None, keep_models=False, shared=None):
+	"""
+	Generate cross-validated estimates for each input data point.
+
+	This gives the same predictions as sklearn's `cross_val_predict`, but
+	the folds can be run concurrently and each fold is timed.
+
+	Parameters
+	----------
+	estimator : estimator
+		The model to fit.  It is cloned for each fold.
+	X : array-like or pandas.DataFrame
+	y : array-like, pandas.Series or pandas.DataFrame
+	cv : int or cross-validation generator
+		As for sklearn's `cross_val_predict`.
+	backend : {None, 'serial', 'thread', 'process', 'dask'} or executor
+		Where to run the folds, see `pines.gpr.parallel.open_executor`.
+	n_jobs : int, optional
+		Number of workers for thread and process pools.
+	keep_models : bool, default False
+		Return the fitted model for each fold.
+	shared : tuple, optional
+		X and y as already shared with the `backend` executor by
+		`pines.gpr.parallel.share`, to be passed to the fold tasks instead
+		of sharing them again.
+
+	If the estimator has `warm_start` turned on, each fold's optimizer is
+	seeded from the estimator's own fit, or if it is not fit, from the
+	first fold, which is then run before the others.
+
+	Returns
+	-------
+	dicta
+		With keys 'predict' (an ndarray of out-of-fold predictions, shaped
+		like the estimator's predictions), 'timing' (a DataFrame with one row
+		per fold), 'models' (a list of fitted fold models, or None), and
+		'folds' (the list of train and test indexes).
+	"""
+	cv = check_cv(cv, y, classifier=False)
+	folds = list(cv.split(X, y))
+
+	warm = warm_state(estimator)
+	results = []
+	with open_executor(backend, n_jobs) as executor:
+		if shared is None:
+			shared = share(executor, X), share(executor, y)
+		X_, y_ = shared
+		if warm is None and getattr(estimator, 'warm_start', False) and len(folds) > 1:
+			# Fit the first fold cold, and seed its siblings from it.
+			results.append(profiling.submit(executor, _fit_and_predict, estimator, X_, y_, *folds[0], keep_models).result())
+			warm = results[0][4]
+		futures = [
+			profiling.submit(executor, _fit_and_predict, estimator, X_, y_, train, test, keep_models, warm)
+			for train, test in folds[len(results):]
+		]
+		results.extend(f.result() for f in futures)
+
+	y_shape = numpy.shape(y)
+	predictions = None
+	for (train, test), (prediction, *_) in zip(folds, results):
+		if predictions is None:
+			predictions = numpy.empty((y_shape[0],) + prediction.shape[1:], dtype=numpy.float64)
+		predictions[test] = prediction
+
+	timing = pandas.DataFrame(
+		[
+			(len(train), len(test), fit_time, predict_time)
+			for (train, test), (_, fit_time, predict_time, *_) in zip(folds, results)
+		],
+		columns=['n_train', 'n_test', 'fit', 'predict'],
+	)
+	timing.index.name = 'fold'
+
+	return dicta(
+		predict=predictions,
+		timing=timing,
+		models=[r[3] for r in results] if keep_models else None,
+		folds=folds,
+	)
+
+
+def fold_scores(y, predictions, folds):
+	"""
+	The R^2 score on the test rows of each fold.
+
+	Parameters
+	----------
+	y : array-like
+		True values.
+	predictions : array-like
+		Out-of-fold predictions, as from `cross_val_folds`.
+	folds : list of (train, test) index arrays
+
+	Returns
+	-------
+	ndarray
+		One score per fold, as `cross_val_score` would give for a regressor.
+	"""
+	y = numpy.asarray(y)
+	predictions = numpy.asarray(predictions).reshape(y.shape)
+	return numpy.array([r2_score(y[test], predictions[test]) for train, test in folds])
@@ -0,0 +1,106 @@
+"""
+Freeze fitted models into numpy-only `pines.frozen_predictor.FrozenPredictor` objects.
+"""
+
+import numpy
+from sklearn.gaussian_process import kernels
+
+from ..frozen_predictor import FrozenPredictor
+
+
+def kernel_spec(kernel):
+	"""
+	Describe a fitted sklearn kernel with plain python values.
+
+	Parameters
+	----------
+	kernel : sklearn kernel
+		Sums and products of constant, white noise, RBF, rational quadratic
+		and Matern (nu of 0.5, 1.5, 2.5 or inf) kernels are supported.
+
+	Returns
+	-------
+	dict
+		JSON serializable, as read by `pines.frozen_predictor.kernel_cross`.
+	"""
+	if isinstance(kernel, kernels.Sum):
+		return dict(kind='sum', k1=kernel_spec(kernel.k1), k2=kernel_spec(kernel.k2))
+	if isinstance(kernel, kernels.Product):
+		return dict(kind='product', k1=kernel_spec(kernel.k1), k2=kernel_spec(kernel.k2))
+	if isinstance(kernel, kernels.ConstantKernel):
+		return dict(kind='constant', constant_value=float(kernel.constant_value))
+	if isinstance(kernel, kernels.WhiteKernel):
+		return dict(kind='white', noise_level=float(kernel.noise_level))
+	if isinstance(kernel, kernels.Matern):
+		if kernel.nu not in (0.5, 1.5, 2.5, numpy.inf):
+			raise NotImplementedError(f'cannot freeze Matern kernel with nu={kernel.nu}')
+		return dict(kind='matern', length_scale=numpy.atleast_1d(kernel.length_scale).tolist(), nu=float(kernel.nu))
+	if isinstance(kernel, kernels.RBF):
+		return dict(kind='rbf', length_scale=numpy.atleast_1d(kernel.length_scale).tolist())
+	if isinstance(kernel, kernels.RationalQuadratic):
+		return dict(
+			kind='rational_quadratic',
+			length_scale=numpy.atleast_1d(kernel.length_scale).tolist(),
+			alpha=float(kernel.alpha),
+		)
+	raise NotImplementedError(f'cannot freeze kernel {kernel!r}')
+
+
+def _gpr_parts(gpr):
+	"""
+	The frozen predictor arguments for the gaussian process part of a model.
+	"""
+	if hasattr(gpr, 'Z_'):
+		# SparseGaussianProcessRegressor
+		return dict(
+			kernel=kernel_spec(gpr.kernel_),
+			basis=gpr.Z_,
+			alpha=gpr.alpha_,
+			chol=gpr.L_mm_,
+			noise_chol=gpr.L_A_,
+			noise=gpr.noise_,
+			y_mean=gpr._y_train_mean,
+		)
+	return dict(
+		kernel=kernel_spec(gpr.kernel_),
+		basis=gpr.X_train_,
+		alpha=gpr.alpha_,
+		chol=gpr.L_,
+		y_mean=getattr(gpr, '_y_train_mean', 0.0),
+		y_std=getattr(gpr, '_y_train_std', 1.0),
+	)
+
+
+def _plain(values):
+	return [v.item() if hasattr(v, 'item') else v for v in values]
+
+
+def freeze(model):
+	"""
+	Freeze a fitted linear-plus-GPR model.
+
+	Parameters
+	----------
+	model : LinearAndGaussianProcessRegression or SingleTargetRegression
+
+	Returns
+	-------
+	pines.frozen_predictor.FrozenPredictor
+	"""
+	features = _plain(model.features_)
+	y_1d = numpy.ndim(model.y_residual) == 1
+	n_targets = 1 if y_1d else numpy.shape(model.y_residual)[1]
+	if model.use_linear:
+		coef = numpy.reshape(model.lr.coef_, (n_targets, len(features)))
+		intercept = numpy.broadcast_to(model.lr.intercept_, (n_targets,))
+	else:
+		coef = numpy.zeros((n_targets, len(features)))
+		intercept = numpy.zeros(n_targets)
+	return FrozenPredictor(
+		features=features,
+		coef=coef,
+		intercept=intercept,
+		targets=None if model.Y_columns is None else _plain(model.Y_columns),
+		y_1d=y_1d,
+		**_gpr_parts(model.gpr),
+	)
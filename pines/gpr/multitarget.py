@@ -5,7 +5,7 @@ from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn import preprocessing
 from sklearn.base import TransformerMixin
 from sklearn.gaussian_process.kernels import RBF, ConstantKernel as C, RationalQuadratic as RQ
-from sklearn.base import RegressorMixin, BaseEstimator
+from sklearn.base import RegressorMixin, BaseEstimator, clone
 from sklearn.model_selection import cross_val_score, cross_val_predict
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import r2_score
@@ -13,17 +13,27 @@ from sklearn.feature_selection import SelectKBest
 from sklearn.feature_selection import f_regression, mutual_info_regression
 from sklearn.exceptions import DataConversionWarning
 from sklearn.linear_model import LinearRegression
+from sklearn.utils import check_random_state
 
 from sklearn.pipeline import make_pipeline
 from .selectors import SelectNAndKBest
 from . import feature_concat
 
-from . import LinearAndGaussianProcessRegression, GaussianProcessRegressor_, ignore_warnings
+from . import LinearAndGaussianProcessRegression, GaussianProcessRegressor_, ignore_warnings, default_kernel_generator, _append_rows
+from .sparse import SparseGaussianProcessRegressor
+from .crossval import cross_val_folds
+from .parallel import open_executor, share
+from .screening import get_screen
+from .export import freeze
+from .streaming import StreamingPredictMixin
+from .cache import PredictionCacheMixin
+from . import profiling
 
 import numpy, pandas
 import scipy.stats
 import warnings
 import contextlib
+import time
 
 
 
@@ -34,14 +44,20 @@ from sklearn.multioutput import MultiOutputRegressor as MultiOutputRegressor_
 
 class CrossValMixin:
 
-	def cross_val_scores(self, X, Y, cv=3):
-		p = self.cross_val_predict(X, Y, cv=cv)
+	def cross_val_scores(self, X, Y, cv=3, backend=None, n_jobs=None):
+		p = self.cross_val_predict(X, Y, cv=cv, backend=backend, n_jobs=n_jobs)
 		return pandas.Series(
 			r2_score(Y, p, sample_weight=None, multioutput='raw_values'),
 			index=Y.columns
 		)
 
-	def cross_val_predict(self, X, Y, cv=3):
+	def cross_val_predict(self, X, Y, cv=3, backend=None, n_jobs=None):
+		"""
+		Cross validated predictions.
+
+		The folds are run by `pines.gpr.crossval.cross_val_folds`, on the given
+		`backend` and `n_jobs`, and the timing of each fold is stored in `cv_timing_`.
+		"""
 		if isinstance(Y, pandas.DataFrame):
 			self.Y_columns = Y.columns
 			Yix = Y.index
@@ -52,8 +68,9 @@ class CrossValMixin:
 			self.Y_columns = ["Untitled" * Y.shape[1]]
 			Yix = pandas.RangeIndex(Y.shape[0])
 		with ignore_warnings(DataConversionWarning):
-			p = cross_val_predict(self, X, Y, cv=cv)
-		return pandas.DataFrame(p, columns=self.Y_columns, index=Yix)
+			cvf = cross_val_folds(self, X, Y, cv=cv, backend=backend, n_jobs=n_jobs)
+		self.cv_timing_ = cvf.timing
+		return pandas.DataFrame(cvf.predict, columns=self.Y_columns, index=Yix)
 
 
 
@@ -69,28 +86,79 @@ class MultiOutputRegressor(
 class SingleTargetRegression(
 		BaseEstimator,
 		RegressorMixin,
+		StreamingPredictMixin,
+		PredictionCacheMixin,
 ):
 
-	def __init__(self, core_features=None, keep_other_features=3, detrend=True, expected_features=None):
+	def __init__(self, core_features=None, keep_other_features=3, detrend=True, expected_features=None, n_jobs=None, backend=None, n_inducing=None, screen=None, warm_start=False, prediction_cache=None, precision='float64'):
 		"""
 
 		Parameters
 		----------
 		core_features
 			feature columns to definitely keep for both LR and GPR
+		n_jobs : int, optional
+			Number of workers used to run the GPR optimizer restarts concurrently.
+		backend : {None, 'thread', 'process', 'dask'}, optional
+			Where to run the GPR optimizer restarts, see `pines.gpr.parallel.open_executor`.
+		n_inducing : int, optional
+			If given, use an approximate GPR with this many inducing points
+			instead of the exact GPR, see `pines.gpr.sparse.SparseGaussianProcessRegressor`.
+			This allows training on much larger data sets.
+		screen : str or callable, optional
+			The feature screen used to pick the best other features, see
+			`pines.gpr.screening.get_screen`.  Defaults to the cached histogram
+			mutual information screen; use 'mutual_info' for sklearn's kNN estimator.
+		prediction_cache : int or PredictionCache, optional
+			Remember predictions for this many input rows, keyed by the model's
+			fitted state and the values of the selected features in each row, so
+			that repeated queries only compute the new rows.  A
+			`pines.gpr.cache.PredictionCache` may be given to share one cache
+			among several models.  Predictions with `return_cov` are not cached.
+		warm_start : bool, default False
+			Start the GPR hyperparameter optimizer from the previous fit, or from
+			the parent model or a sibling fold in cross validation, and skip the
+			optimizer restarts when warm.  See `set_warm_start`.
+		precision : {'float64', 'float32'}, default 'float64'
+			The precision of the fitted exact GPR, see `GaussianProcessRegressor_`.
+			The approximate GPR used with `n_inducing` is always float64.
 
 		"""
 
 		self.core_features = core_features
 		self.keep_other_features = keep_other_features
 		self.lr = LinearRegression()
-		self.gpr = GaussianProcessRegressor_(n_restarts_optimizer=9)
+		if n_inducing is None:
+			self.gpr = GaussianProcessRegressor_(
+				n_restarts_optimizer=9,
+				n_jobs=n_jobs,
+				backend=backend,
+				warm_start=warm_start,
+				precision=precision,
+			)
+		else:
+			self.gpr = SparseGaussianProcessRegressor(
+				n_inducing=n_inducing,
+				n_restarts_optimizer=9,
+				n_jobs=n_jobs,
+				backend=backend,
+				warm_start=warm_start,
+			)
 		self.y_residual = None
-		self.kernel_generator = lambda dims: C() * RBF([1.0] * dims)
+		self.kernel_generator = default_kernel_generator
 		self.use_linear = detrend
+		self.detrend = detrend
 		self.expected_features = expected_features
+		self.n_jobs = n_jobs
+		self.backend = backend
+		self.n_inducing = n_inducing
+		self.screen = screen
+		self.warm_start = warm_start
+		self.prediction_cache = prediction_cache
+		self.precision = precision
 
 
+	@profiling.staged('feature_selection')
 	def _feature_selection(self, X, y=None):
 		"""
 
@@ -124,7 +192,7 @@ class SingleTargetRegression(
 			return X_core
 
 		if y is not None:
-			self.feature_selector = SelectKBest(mutual_info_regression, k=self.keep_other_features).fit(X_other, y)
+			self.feature_selector = SelectKBest(get_screen(self.screen), k=self.keep_other_features).fit(X_other, y)
 
 		X_other = pandas.DataFrame(
 			self.feature_selector.transform(X_other),
@@ -135,6 +203,7 @@ class SingleTargetRegression(
 		return pandas.concat([X_core, X_other], axis=1)
 
 
+	@profiling.staged('fit')
 	def fit(self, X, y):
 		"""
 		Fit linear and gaussian model.
@@ -165,10 +234,13 @@ class SingleTargetRegression(
 			else:
 				self.Y_columns = None
 
+			self._reset_prediction_cache()
 			X_core_plus = self._feature_selection(X, y)
+			self.features_ = list(X_core_plus.columns)
 
 			if self.use_linear:
-				self.lr.fit(X_core_plus, y)
+				with profiling.stage('lr.fit'):
+					self.lr.fit(X_core_plus, y)
 				self.y_residual = y - self.lr.predict(X_core_plus)
 			else:
 				self.y_residual = y
@@ -180,6 +252,7 @@ class SingleTargetRegression(
 		return self
 
 
+	@profiling.staged('predict')
 	def predict(self, X, return_std=False, return_cov=False):
 		"""Predict using the model
 
@@ -187,6 +260,9 @@ class SingleTargetRegression(
 		----------
 		X : {array-like, sparse matrix}, shape = (n_samples, n_features)
 			Samples.
+		return_std, return_cov : bool, default False
+			Also return the standard deviation or covariance of the gaussian
+			process part of the prediction.
 
 		Returns
 		-------
@@ -200,56 +276,142 @@ class SingleTargetRegression(
 
 		X_core_plus = self._feature_selection(X)
 
+		if self._use_prediction_cache() and not return_cov:
+			y_hat, y_hat_spread = self._cached_predict_arrays(X_core_plus, return_std=return_std)
+		else:
+			y_hat, y_hat_spread = self._predict_arrays(X_core_plus, return_std=return_std, return_cov=return_cov)
+
+		if self.Y_columns is not None:
+			y_result = pandas.DataFrame(
+				y_hat,
+				columns=self.Y_columns,
+				index=X.index,
+			)
+		else:
+			y_result = y_hat
+
+		if return_std or return_cov:
+			return y_result, y_hat_spread
+		return y_result
+
+	def _predict_arrays(self, X_core_plus, return_std=False, return_cov=False):
 		if self.use_linear:
 			y_hat_lr = self.lr.predict(X=X_core_plus)
 		else:
 			y_hat_lr = 0
 
-		if return_std:
-			y_hat_gpr, y_hat_std = self.gpr.predict(X_core_plus, return_std=True)
+		if return_std or return_cov:
+			y_hat_gpr, y_hat_spread = self.gpr.predict(X_core_plus, return_std=return_std, return_cov=return_cov)
+		else:
+			y_hat_gpr, y_hat_spread = self.gpr.predict(X_core_plus), None
+		if self.use_linear:
+			# Recent sklearn drops the target axis of a single target GPR prediction.
+			y_hat_gpr = numpy.reshape(y_hat_gpr, numpy.shape(y_hat_lr))
+		return y_hat_lr + y_hat_gpr, y_hat_spread
 
-			if self.Y_columns is not None:
-				y_result = pandas.DataFrame(
-					y_hat_lr + y_hat_gpr,
-					columns=self.Y_columns,
-					index=X.index,
-				)
-			else:
-				y_result = y_hat_lr + y_hat_gpr
+	def _prediction_state(self):
+		state = [type(self).__name__, self.features_, self.gpr.kernel_.theta, self.gpr.alpha_]
+		if self.use_linear:
+			state += [self.lr.coef_, self.lr.intercept_]
+		return state
 
-			return y_result, y_hat_std
-		else:
-			y_hat_gpr = self.gpr.predict(X_core_plus)
+	def export_predictor(self):
+		"""
+		Freeze this fitted model into a lightweight numpy-only predictor.
 
-			if self.Y_columns is not None:
-				y_result = pandas.DataFrame(
-					y_hat_lr + y_hat_gpr,
-					columns=self.Y_columns,
-					index=X.index,
-				)
-			else:
-				y_result = y_hat_lr + y_hat_gpr
+		The predictor holds the selected feature names, the linear
+		coefficients, the kernel hyperparameters and the arrays the gaussian
+		process needs to predict, and can be saved to an .npz file.  It does not
+		import sklearn or pandas.
+
+		Returns
+		-------
+		pines.frozen_predictor.FrozenPredictor
+		"""
+		return freeze(self)
 
-			return y_result
+	def set_warm_start(self, state):
+		"""
+		Start the GPR hyperparameter optimizer for the next fit from `state`.
+
+		Parameters
+		----------
+		state : array-like
+			As from the `warm_state` of a related fitted model, such as the same
+			model fit on other folds of the data.
 
-	def cross_val_scores(self, X, Y, cv=3):
-		p = self.cross_val_predict(X, Y, cv=cv)
+		Returns
+		-------
+		self
+		"""
+		self.gpr.set_warm_start(state)
+		return self
+
+	def warm_state(self):
+		"""
+		The fitted GPR hyperparameters, for seeding the fit of a related model.
+		"""
+		return self.gpr.warm_state()
+
+	@profiling.staged('update')
+	def update(self, X, y, drift_tolerance=None):
+		"""
+		Add training data without refitting from scratch.
+
+		The selected features and the linear coefficients are kept, and the
+		new residuals are added to the gaussian process with its `update`,
+		which keeps the kernel hyperparameters unless the likelihood drifts.
+
+		Parameters
+		----------
+		X : pandas.DataFrame or array-like
+			New training data.
+		y : array-like or pandas.Series
+			New target values.
+		drift_tolerance : float, optional
+			See `GaussianProcessRegressor_.update`.
+
+		Returns
+		-------
+		self : returns an instance of self.
+		"""
+		if not isinstance(X, pandas.DataFrame):
+			X = pandas.DataFrame(X, columns=self.expected_features)
+		with ignore_warnings(DataConversionWarning):
+			X_core_plus = self._feature_selection(X)
+			if self.use_linear:
+				y_residual = y - self.lr.predict(X_core_plus)
+			else:
+				y_residual = y
+			self._reset_prediction_cache()
+			self.gpr.update(X_core_plus, y_residual, drift_tolerance=drift_tolerance)
+			self.y_residual = _append_rows(self.y_residual, y_residual)
+		return self
+
+	def cross_val_scores(self, X, Y, cv=3, backend=None, n_jobs=None):
+		p = self.cross_val_predict(X, Y, cv=cv, backend=backend, n_jobs=n_jobs)
 		return pandas.Series(
 			r2_score(Y, p, sample_weight=None, multioutput='raw_values'),
-			index=Y.columns
+			index=p.columns
 		)
 
-	def cross_val_predict(self, X, y, cv=3):
+	def cross_val_predict(self, X, y, cv=3, backend=None, n_jobs=None):
 
 		with ignore_warnings(DataConversionWarning):
 
 			X_core_plus = self._feature_selection(X, y)
 
-			total = cross_val_predict(self, X_core_plus, y, cv=cv)
+			if isinstance(y, pandas.DataFrame):
+				y_columns = y.columns
+			else:
+				y_columns = [y.name]
+
+			cvf = cross_val_folds(self, X_core_plus, y, cv=cv, backend=backend, n_jobs=n_jobs)
+			self.cv_timing_ = cvf.timing
 			return pandas.DataFrame(
-				total,
+				cvf.predict,
 				index=y.index,
-				columns=y.columns,
+				columns=y_columns,
 			)
 
 
@@ -259,24 +421,292 @@ def SingleTargetRegressions(*args, **kwargs):
 
 
 
+class SharedKernelRegression(
+		BaseEstimator,
+		RegressorMixin,
+		CrossValMixin,
+):
+	"""
+	Gaussian process regression for many targets that share the same inputs.
+
+	Unlike `SingleTargetRegressions`, which builds and factorizes a separate
+	kernel matrix for every target column, this estimator fits all the target
+	columns against a single kernel.  The kernel hyperparameters are chosen
+	to maximize the total log marginal likelihood across the targets, the
+	kernel matrix is factorized once, and all the target columns are solved
+	together against that one Cholesky factor.
+	"""
+
+	def __init__(self, n_restarts_optimizer=9, per_target=False, normalize_y=False, random_state=None):
+		"""
 
+		Parameters
+		----------
+		n_restarts_optimizer : int
+			Number of restarts of the kernel hyperparameter optimizer.
+		per_target : bool, default False
+			If True, fall back to optimizing separate kernel hyperparameters for each
+			target column.  This costs one kernel factorization per target.
+		normalize_y : bool, default False
+			Passed through to the underlying GaussianProcessRegressor.
+		random_state : int or RandomState, optional
+			Used to draw the starting points for optimizer restarts.
 
+		"""
+		self.n_restarts_optimizer = n_restarts_optimizer
+		self.per_target = per_target
+		self.normalize_y = normalize_y
+		self.random_state = random_state
+		self.kernel_generator = default_kernel_generator
+
+	def _target_groups(self, n_targets):
+		if self.per_target:
+			return [[n] for n in range(n_targets)]
+		return [list(range(n_targets))]
+
+	@profiling.staged('fit')
+	def fit(self, X, Y):
+		"""
+		Fit the gaussian process models.
 
+		Parameters
+		----------
+		X : array-like of shape [n_samples, n_features]
+			Training data
+		Y : array-like of shape [n_samples, n_targets]
+			Target values.
+
+		Returns
+		-------
+		self : returns an instance of self.
+		"""
+
+		if isinstance(Y, pandas.DataFrame):
+			self.Y_columns = Y.columns
+			Y_ = Y.values
+		elif isinstance(Y, pandas.Series):
+			self.Y_columns = [Y.name]
+			Y_ = Y.values.reshape(-1, 1)
+		else:
+			self.Y_columns = None
+			Y_ = numpy.asarray(Y)
+			if Y_.ndim == 1:
+				Y_ = Y_.reshape(-1, 1)
+
+		X_ = X.values if isinstance(X, pandas.DataFrame) else numpy.asarray(X)
+		dims = X_.shape[1]
+
+		self.n_targets_ = Y_.shape[1]
+		self.groups_ = self._target_groups(self.n_targets_)
+		self.gprs_ = []
+		with ignore_warnings(DataConversionWarning):
+			for group in self.groups_:
+				gpr = GaussianProcessRegressor_(
+					kernel=self.kernel_generator(dims),
+					n_restarts_optimizer=self.n_restarts_optimizer,
+					normalize_y=self.normalize_y,
+					random_state=self.random_state,
+				)
+				gpr.fit(X_, Y_[:, group])
+				self.gprs_.append(gpr)
+		return self
+
+	@profiling.staged('predict')
+	def predict(self, X, return_std=False, return_cov=False):
+		"""Predict using the model
+
+		Parameters
+		----------
+		X : array-like, shape = (n_samples, n_features)
+			Samples.
+		return_std : bool, default False
+			If True, the standard deviation of the predictive distribution
+			is returned along with the mean.
+		return_cov : bool, default False
+			Not supported, as the targets do not share a covariance; a
+			ValueError is raised if True.
+
+		Returns
+		-------
+		Yhat : array or DataFrame, shape = (n_samples, n_targets)
+			Returns predicted values.
+		Ystd : array or DataFrame, shape = (n_samples, n_targets)
+			Standard deviation of predictive distribution, only returned
+			when `return_std` is True.
+		"""
+		if return_cov:
+			raise ValueError('SharedKernelRegression does not return a predictive covariance; use return_std')
+
+		if isinstance(X, pandas.DataFrame):
+			x_ix = X.index
+			X_ = X.values
+		else:
+			x_ix = None
+			X_ = numpy.asarray(X)
+
+		Yhat = numpy.empty([X_.shape[0], self.n_targets_], dtype=numpy.float64)
+		Ystd = numpy.empty([X_.shape[0], self.n_targets_], dtype=numpy.float64) if return_std else None
+
+		for group, gpr in zip(self.groups_, self.gprs_):
+			if return_std:
+				y1, y2 = gpr.predict(X_, return_std=True)
+				y2 = numpy.asarray(y2)
+				if y2.ndim == 1:
+					y2 = y2.reshape(-1, 1)
+				Ystd[:, group] = y2
+			else:
+				y1 = gpr.predict(X_)
+			Yhat[:, group] = numpy.asarray(y1).reshape(X_.shape[0], len(group))
+
+		if self.Y_columns is not None:
+			if x_ix is None:
+				x_ix = pandas.RangeIndex(X_.shape[0])
+			Yhat = pandas.DataFrame(Yhat, index=x_ix, columns=self.Y_columns)
+			if return_std:
+				Ystd = pandas.DataFrame(Ystd, index=x_ix, columns=self.Y_columns)
+
+		if return_std:
+			return Yhat, Ystd
+		return Yhat
+
+
+
+
+
+
+
+
+def _row_index(X):
+	if isinstance(X, (pandas.DataFrame, pandas.Series)):
+		return X.index
+	return pandas.RangeIndex(X.shape[0])
+
+
+def _step_columns(step, n_base, n_extra):
+	"""
+	Column positions in a [base | extra] feature buffer used by a step.
+
+	The step is a pipeline starting with a `SelectNAndKBest` that always
+	keeps the `n_base` leading columns and picks some of the `n_extra`
+	derived columns after them.
+	"""
+	selector = step.steps[0][1]
+	if selector._feature_selector is None:
+		extra = numpy.arange(n_extra)
+	else:
+		extra = numpy.flatnonzero(selector._feature_selector.get_support())
+	return numpy.concatenate([numpy.arange(n_base), n_base + extra])
+
+
+def _step_features(buffer, columns):
+	# A leading block of columns is a view; anything else is gathered.
+	if columns[-1] + 1 == len(columns):
+		return buffer[:, :len(columns)]
+	return buffer[:, columns]
+
+
+def _step_predict(step, features, return_std=False):
+	"""
+	Predict with the final estimator of a step on already selected features.
+
+	The estimator may have been fitted on a DataFrame, so sklearn's warning
+	about missing feature names is suppressed.
+	"""
+	estimator = step.steps[-1][1] if hasattr(step, 'steps') else step
+	with ignore_warnings(UserWarning):
+		if return_std:
+			return estimator.predict(features, return_std=True)
+		return estimator.predict(features)
+
+
+@profiling.staged('full_fit')
+def _timed_fit(estimator, X, y):
+	start = time.perf_counter()
+	model = clone(estimator).fit(X, y)
+	return model, time.perf_counter() - start
+
+
+def _fit_with_folds(estimator, X, y, cv, executor, keep_models=False):
+	"""
+	Fit an estimator on all the data, and across cross validation folds.
+
+	The full fit and the fold fits are submitted to the same executor, so
+	they all run concurrently when it has the workers.
+
+	Returns
+	-------
+	model
+		A clone of the estimator, fit on all the data.
+	dicta
+		As from `cross_val_folds`, with the added keys 'fit_time' (seconds
+		for the full fit) and 'folds_time' (wall clock seconds until all the
+		folds were done).
+	"""
+	X_ = share(executor, X)
+	y_ = share(executor, y)
+	start = time.perf_counter()
+	full = profiling.submit(executor, _timed_fit, estimator, X_, y_)
+	cvf = cross_val_folds(estimator, X, y, cv=cv, backend=executor, keep_models=keep_models, shared=(X_, y_))
+	cvf.folds_time = time.perf_counter() - start
+	model, cvf.fit_time = full.result()
+	return model, cvf
+
+
+def _fit_timing(stages):
+	"""
+	Summarize the timing of a staged fit.
+
+	Parameters
+	----------
+	stages : list of (str, float, dicta or None)
+		The name of each stage, the seconds for its full fit, and its fold
+		results from `_fit_with_folds`, if it had folds.
+
+	Returns
+	-------
+	summary : DataFrame
+		Seconds for the full 'fit' and the 'folds' of each stage.
+	folds : DataFrame
+		The timing of each fold, indexed by stage and fold.
+	"""
+	summary = pandas.DataFrame(
+		[(fit_time, numpy.nan if cvf is None else cvf.folds_time) for _, fit_time, cvf in stages],
+		index=pandas.Index([stage for stage, *_ in stages], name='stage'),
+		columns=['fit', 'folds'],
+	)
+	folds = pandas.concat(
+		{stage: cvf.timing for stage, _, cvf in stages if cvf is not None},
+		names=['stage'],
+	)
+	return summary, folds
 
 
 class ChainedTargetRegression(
 		BaseEstimator,
 		RegressorMixin,
 		CrossValMixin,
+		StreamingPredictMixin,
 ):
 
-	def __init__(self, keep_other_features=3, step2_cv_folds=5, randomize_chain=True):
+	def __init__(self, keep_other_features=3, step2_cv_folds=5, randomize_chain=True, n_jobs=None, backend=None, keep_fold_models=False):
 		"""
 
 		Parameters
 		----------
 		core_features
 			feature columns to definitely keep for both LR and GPR
+		randomize_chain : bool, int or RandomState
+			Shuffle the order of the targets in the chain.  True uses numpy's
+			global random state, so `numpy.random.seed` makes the order
+			reproducible.  An int seeds a private random stream for the
+			shuffle, so the global numpy random state is left alone.
+		n_jobs : int, optional
+			Number of concurrent fits for each link of the chain, which is fit
+			on all the data and across `step2_cv_folds` folds at once.
+		backend : {None, 'serial', 'thread', 'process', 'dask'} or executor
+			Where to run those fits, see `pines.gpr.parallel.open_executor`.
+		keep_fold_models : bool, default False
+			Keep the fitted fold models of each link in `fold_models_`.
 
 		"""
 
@@ -284,7 +714,11 @@ class ChainedTargetRegression(
 		self.step1 = GaussianProcessRegressor_()
 		self.step2_cv_folds = step2_cv_folds
 		self.randomize_chain = randomize_chain
+		self.n_jobs = n_jobs
+		self.backend = backend
+		self.keep_fold_models = keep_fold_models
 
+	@profiling.staged('fit')
 	def fit(self, X, Y):
 		"""
 		Fit linear and gaussian model.
@@ -299,6 +733,11 @@ class ChainedTargetRegression(
 		Returns
 		-------
 		self : returns an instance of self.
+
+		Each link of the chain is fit on all the data and, concurrently, across
+		`step2_cv_folds` folds, whose out-of-fold predictions feed the next
+		link.  These are kept in `oof_predict_`, and the time taken by each
+		link is in `fit_timing_` (with each fold in `fold_timing_`).
 		"""
 
 		with ignore_warnings(DataConversionWarning):
@@ -310,45 +749,58 @@ class ChainedTargetRegression(
 				self.Y_columns = [Y.name]
 				Y_ = Y.values.reshape(-1,1)
 			else:
-				self.Y_columns = ["Untitled" * Y.shape[1]]
+				self.Y_columns = [f"Untitled{n}" for n in range(Y.shape[1])]
 				Y_ = Y
 
-			Yhat = pandas.DataFrame(
-				index=X.index,
-				columns=self.Y_columns,
-			)
-
 			self.steps = []
 
 			self._chain_order = numpy.arange(Y.shape[1])
 			if self.randomize_chain is not None and self.randomize_chain is not False:
-				if self.randomize_chain is not True:
-					numpy.random.seed(self.randomize_chain)
-				numpy.random.shuffle(self._chain_order)
+				if self.randomize_chain is True:
+					# The global random state, so numpy.random.seed still applies.
+					rng = check_random_state(None)
+				else:
+					rng = check_random_state(self.randomize_chain)
+				rng.shuffle(self._chain_order)
+
+			chain_columns = [self.Y_columns[n] for n in self._chain_order]
+			Yhat = pandas.DataFrame(
+				index=X.index,
+				columns=chain_columns,
+				dtype=numpy.float64,
+			)
+			link = make_pipeline(
+				SelectNAndKBest(n=X.shape[1], k=self.keep_other_features),
+				GaussianProcessRegressor(),
+			)
+			fold_results = []
 
 			for meta_n in range(Y.shape[1]):
-
 				n = self._chain_order[meta_n]
-
-				self.steps.append(
-
-					make_pipeline(
-						SelectNAndKBest(n=X.shape[1], k=self.keep_other_features),
-						GaussianProcessRegressor(),
-					).fit(
+				# Each link's inputs are new, so a local process pool is opened
+				# per link, to send them to each worker only once.
+				with open_executor(self.backend, self.n_jobs) as executor, profiling.stage('chain.link'):
+					step, cvf = _fit_with_folds(
+						link,
 						feature_concat(X, Yhat.iloc[:,:meta_n]),
-						Y_[:,n]
+						Y_[:,n],
+						cv=self.step2_cv_folds,
+						executor=executor,
+						keep_models=self.keep_fold_models,
 					)
-				)
-				Yhat.iloc[:, meta_n] = cross_val_predict(
-					self.steps[-1],
-					feature_concat(X, Yhat.iloc[:,:meta_n]),
-					Y_[:,n],
-					cv=self.step2_cv_folds,
-				)
+				self.steps.append(step)
+				Yhat.iloc[:, meta_n] = cvf.predict
+				fold_results.append(cvf)
+
+			self.oof_predict_ = Yhat.iloc[:, numpy.argsort(self._chain_order)]
+			self.fold_models_ = [r.models for r in fold_results] if self.keep_fold_models else None
+			self.fit_timing_, self.fold_timing_ = _fit_timing(
+				[(c, r.fit_time, r) for c, r in zip(chain_columns, fold_results)]
+			)
 
 		return self
 
+	@profiling.staged('predict')
 	def predict(self, X, return_std=False, return_cov=False):
 		"""Predict using the model
 
@@ -363,50 +815,62 @@ class ChainedTargetRegression(
 			Returns predicted values.
 		"""
 
-		if isinstance(X, (pandas.DataFrame, pandas.Series)):
-			x_ix = X.index
-		else:
-			x_ix = pandas.RangeIndex(X.shape[0])
-
-		Yhat = pandas.DataFrame(
-			index=x_ix,
-			columns=self.Y_columns,
-		)
-
+		x_ix = _row_index(X)
 		if return_std:
-			Ystd = pandas.DataFrame(
-				index=x_ix,
-				columns=self.Y_columns,
+			Yhat, Ystd = self._predict_array(X, return_std=True)
+			return (
+				pandas.DataFrame(Yhat, index=x_ix, columns=self.Y_columns),
+				pandas.DataFrame(Ystd, index=x_ix, columns=self.Y_columns),
 			)
-			for n, col in enumerate(self.Y_columns):
-				y1, y2 = self.steps[n].predict(
-					feature_concat(X, Yhat.iloc[:, :n]),
-					return_std=True
-				)
-				Yhat.iloc[:, n] = y1
-				Ystd.iloc[:, n] = y2
-			return Yhat, Ystd
+		return pandas.DataFrame(self._predict_array(X), index=x_ix, columns=self.Y_columns)
 
-		else:
-			for n, col in enumerate(self.Y_columns):
-				y1 = self.steps[n].predict(
-					feature_concat(X, Yhat.iloc[:, :n]),
-				)
-				Yhat.iloc[:, n] = y1
-			return Yhat
+	def _predict_array(self, X, return_std=False):
+		"""
+		Predict into a preallocated float64 buffer.
 
+		The input features and each link's prediction share one buffer, with
+		the predictions in chain order after the input columns, so no link
+		needs to concatenate its inputs.
 
-	def cross_val_scores(self, X, Y, cv=3):
-		p = self.cross_val_predicts(X, Y, cv=cv)
+		Returns
+		-------
+		Yhat : ndarray, shape = (n_samples, n_targets)
+			Predictions, with columns in the order of the training targets.
+		Ystd : ndarray, shape = (n_samples, n_targets), optional
+		"""
+		X = numpy.asarray(X, dtype=numpy.float64)
+		n_samples, n_base = X.shape
+		n_targets = len(self.steps)
+		buffer = numpy.empty([n_samples, n_base + n_targets], dtype=numpy.float64)
+		buffer[:, :n_base] = X
+		Ystd = numpy.empty([n_samples, n_targets], dtype=numpy.float64) if return_std else None
+		for meta_n, step in enumerate(self.steps):
+			with profiling.stage('chain.link'):
+				features = _step_features(buffer, _step_columns(step, n_base, meta_n))
+				if return_std:
+					buffer[:, n_base + meta_n], Ystd[:, meta_n] = _step_predict(step, features, return_std=True)
+				else:
+					buffer[:, n_base + meta_n] = _step_predict(step, features)
+		# Link meta_n predicts target _chain_order[meta_n]; put targets back in order.
+		position = numpy.argsort(self._chain_order)
+		Yhat = buffer[:, n_base + position]
+		if return_std:
+			return Yhat, Ystd[:, position]
+		return Yhat
+
+
+	def cross_val_scores(self, X, Y, cv=3, backend=None, n_jobs=None):
+		p = self.cross_val_predicts(X, Y, cv=cv, backend=backend, n_jobs=n_jobs)
 		return pandas.Series(
 			r2_score(Y, p, sample_weight=None, multioutput='raw_values'),
 			index=Y.columns
 		)
 
-	def cross_val_predicts(self, X, Y, cv=3, alt_y=None):
+	def cross_val_predicts(self, X, Y, cv=3, alt_y=None, backend=None, n_jobs=None):
 		with ignore_warnings(DataConversionWarning):
-			p = cross_val_predict(self, X, Y, cv=cv)
-		return pandas.DataFrame(p, columns=Y.columns, index=Y.index)
+			cvf = cross_val_folds(self, X, Y, cv=cv, backend=backend, n_jobs=n_jobs)
+		self.cv_timing_ = cvf.timing
+		return pandas.DataFrame(cvf.predict, columns=Y.columns, index=Y.index)
 
 
 	def score(self, X, y, sample_weight=None):
@@ -445,12 +909,31 @@ class EnsembleRegressorChains(
 		BaseEstimator,
 		RegressorMixin,
 		CrossValMixin,
+		StreamingPredictMixin,
 ):
 
-	def __init__(self, keep_other_features=3, step2_cv_folds=5, replication=10):
+	def __init__(self, keep_other_features=3, step2_cv_folds=5, replication=10, n_jobs=None, backend=None):
+		"""
+
+		Parameters
+		----------
+		keep_other_features, step2_cv_folds
+			Passed to each `ChainedTargetRegression` in the ensemble.
+		replication : int
+			Number of chains in the ensemble.  Chain `n` shuffles its targets
+			with its own random stream seeded by `n`.
+		n_jobs : int, optional
+			Number of chains to fit or predict concurrently.
+		backend : {None, 'serial', 'thread', 'process', 'dask'} or executor
+			Where to run the chains, see `pines.gpr.parallel.open_executor`.
+			The training data is sent to each worker once, not once per chain.
+
+		"""
 		self.replication = replication
 		self.keep_other_features = keep_other_features
 		self.step2_cv_folds = step2_cv_folds
+		self.n_jobs = n_jobs
+		self.backend = backend
 		self.ensemble = [
 			ChainedTargetRegression(
 				keep_other_features=keep_other_features,
@@ -460,30 +943,59 @@ class EnsembleRegressorChains(
 			for n in range(self.replication)
 		]
 
+	@profiling.staged('fit')
 	def fit(self, X, Y):
-		for c in self.ensemble:
-			c.fit(X,Y)
+		with open_executor(self.backend, self.n_jobs) as executor:
+			X_ = share(executor, X)
+			Y_ = share(executor, Y)
+			futures = [profiling.submit(executor, _fit_chain, c, X_, Y_) for c in self.ensemble]
+			self.ensemble = [f.result() for f in futures]
 		return self
 
+	@profiling.staged('predict')
 	def predict(self, X):
-		result = self.ensemble[0].predict(X)
-		for c in self.ensemble[1:]:
-			result += c.predict(X)
+		return pandas.DataFrame(
+			self._predict_array(X),
+			index=_row_index(X),
+			columns=self.ensemble[0].Y_columns,
+		)
+
+	def _predict_array(self, X):
+		with open_executor(self.backend, self.n_jobs) as executor:
+			X_ = share(executor, numpy.asarray(X, dtype=numpy.float64))
+			futures = [profiling.submit(executor, _predict_chain, c, X_) for c in self.ensemble]
+			result = futures[0].result()
+			for f in futures[1:]:
+				result += f.result()
 		result /= len(self.ensemble)
 		return result
 
 
+@profiling.staged('chain')
+def _fit_chain(chain, X, Y):
+	return chain.fit(X, Y)
+
+
+@profiling.staged('chain')
+def _predict_chain(chain, X):
+	return chain._predict_array(X)
+
+
 
 class StackedSingleTargetRegression(
 		BaseEstimator,
 		RegressorMixin,
 		CrossValMixin,
+		StreamingPredictMixin,
 ):
 
 	def __init__(
 			self,
 			keep_other_features=3,
 			step2_cv_folds=5,
+			n_jobs=None,
+			backend=None,
+			keep_fold_models=False,
 	):
 		"""
 
@@ -496,12 +1008,23 @@ class StackedSingleTargetRegression(
 		step2_cv_folds : int
 			The step 1 cross validation predictions are used in step two.  How many
 			CV folds?
+		n_jobs : int, optional
+			Number of concurrent fits in step one, which is fit on all the data
+			and across `step2_cv_folds` folds at once.
+		backend : {None, 'serial', 'thread', 'process', 'dask'} or executor
+			Where to run those fits, see `pines.gpr.parallel.open_executor`.
+		keep_fold_models : bool, default False
+			Keep the fitted step one fold models in `fold_models_`.
 		"""
 
 		self.keep_other_features = keep_other_features
 		self.step2_cv_folds = step2_cv_folds
+		self.n_jobs = n_jobs
+		self.backend = backend
+		self.keep_fold_models = keep_fold_models
 
 
+	@profiling.staged('fit')
 	def fit(self, X, Y):
 		"""
 		Fit linear and gaussian model.
@@ -516,14 +1039,37 @@ class StackedSingleTargetRegression(
 		Returns
 		-------
 		self : returns an instance of self.
+
+		Step one is fit on all the data and, concurrently, across
+		`step2_cv_folds` folds, whose out-of-fold predictions are kept in
+		`oof_predict_` and feed step two.  The time taken by each step is in
+		`fit_timing_` (with each fold in `fold_timing_`).
 		"""
 
 		with ignore_warnings(DataConversionWarning):
 
-			self.step1 = MultiOutputRegressor(GaussianProcessRegressor())
-			Y_cv = cross_val_predict(self.step1, X, Y, cv=self.step2_cv_folds)
-			self.step1.fit(X, Y)
+			if isinstance(Y, pandas.DataFrame):
+				self.Y_columns = Y.columns
+			elif isinstance(Y, pandas.Series):
+				self.Y_columns = Y.name
+			else:
+				self.Y_columns = None
 
+			with open_executor(self.backend, self.n_jobs) as executor, profiling.stage('stack.step1'):
+				self.step1, cvf = _fit_with_folds(
+					MultiOutputRegressor(GaussianProcessRegressor()),
+					X,
+					Y,
+					cv=self.step2_cv_folds,
+					executor=executor,
+					keep_models=self.keep_fold_models,
+				)
+			Y_cv = cvf.predict
+			if isinstance(X, pandas.DataFrame) and isinstance(Y, pandas.DataFrame):
+				# Named columns, as sklearn rejects a mix of string and integer feature names.
+				Y_cv = pandas.DataFrame(Y_cv, index=X.index, columns=Y.columns)
+			self.oof_predict_ = Y_cv
+			self.fold_models_ = cvf.models
 
 			self.step2 = MultiOutputRegressor(
 				make_pipeline(
@@ -532,17 +1078,17 @@ class StackedSingleTargetRegression(
 				)
 			)
 
-			self.step2.fit(feature_concat(X, Y_cv), Y)
-
-			if isinstance(Y, pandas.DataFrame):
-				self.Y_columns = Y.columns
-			elif isinstance(Y, pandas.Series):
-				self.Y_columns = Y.name
-			else:
-				self.Y_columns = None
+			start = time.perf_counter()
+			with profiling.stage('stack.step2'):
+				self.step2.fit(feature_concat(X, Y_cv), Y)
+			self.fit_timing_, self.fold_timing_ = _fit_timing([
+				('step1', cvf.fit_time, cvf),
+				('step2', time.perf_counter() - start, None),
+			])
 
 		return self
 
+	@profiling.staged('predict')
 	def predict(self, X, return_std=False, return_cov=False):
 		"""Predict using the model
 
@@ -557,33 +1103,46 @@ class StackedSingleTargetRegression(
 			Returns predicted values.
 		"""
 
-		Yhat1 = self.step1.predict(X)
-		Yhat2 = self.step2.predict(feature_concat(X, Yhat1))
+		return self._predict_array(X)
 
-		# for n, col in enumerate(self.Y_columns):
-		# 	temp = self.step2[n].predict(
-		# 		pandas.concat([X, Yhat1], axis=1),
-		# 	)
-		# 	Yhat2.iloc[:, n] = temp
+	def _predict_array(self, X):
+		"""
+		Predict into a preallocated float64 buffer.
 
+		The step one predictions are written next to the input features in a
+		single buffer, which the step two models then read from directly.
+		"""
+		X = numpy.asarray(X, dtype=numpy.float64)
+		n_samples, n_base = X.shape
+		n_targets = len(self.step1.estimators_)
+		buffer = numpy.empty([n_samples, n_base + n_targets], dtype=numpy.float64)
+		buffer[:, :n_base] = X
+		with profiling.stage('stack.step1'):
+			for n, estimator in enumerate(self.step1.estimators_):
+				buffer[:, n_base + n] = _step_predict(estimator, X)
+		Yhat2 = numpy.empty([n_samples, n_targets], dtype=numpy.float64)
+		with profiling.stage('stack.step2'):
+			for n, step in enumerate(self.step2.estimators_):
+				Yhat2[:, n] = _step_predict(step, _step_features(buffer, _step_columns(step, n_base, n_targets)))
 		return Yhat2
 
 
-	def cross_val_scores(self, X, Y, cv=3):
-		p = self.cross_val_predicts(X, Y, cv=cv)
+	def cross_val_scores(self, X, Y, cv=3, backend=None, n_jobs=None):
+		p = self.cross_val_predicts(X, Y, cv=cv, backend=backend, n_jobs=n_jobs)
 		return pandas.Series(
 			r2_score(Y, p, sample_weight=None, multioutput='raw_values'),
 			index=Y.columns
 		)
 
-	def cross_val_predicts(self, X, Y, cv=3, alt_y=None):
+	def cross_val_predicts(self, X, Y, cv=3, alt_y=None, backend=None, n_jobs=None):
 		if not isinstance(X, pandas.DataFrame):
 			raise TypeError('must use pandas.DataFrame for X')
 		if not isinstance(Y, pandas.DataFrame):
 			raise TypeError('must use pandas.DataFrame for Y')
 		with ignore_warnings(DataConversionWarning):
-			p = cross_val_predict(self, X, Y, cv=cv)
-		return pandas.DataFrame(p, columns=Y.columns, index=Y.index)
+			cvf = cross_val_folds(self, X, Y, cv=cv, backend=backend, n_jobs=n_jobs)
+		self.cv_timing_ = cvf.timing
+		return pandas.DataFrame(cvf.predict, columns=Y.columns, index=Y.index)
 
 
 	def score(self, X, y, sample_weight=None):
@@ -629,7 +1188,7 @@ class DetrendMixin:
 		return residual
 
 	def detrend_predict(self, X):
-		Yhat1 = self._lr.predict(X)
+		Yhat1 = numpy.asarray(X, dtype=numpy.float64) @ self._lr.coef_.T + self._lr.intercept_
 		return Yhat1
 
 
@@ -642,7 +1201,7 @@ class DetrendedStackedSingleTargetRegression(
 		return super().fit(X, self.detrend_fit(X,Y))
 
 	def predict(self, X, return_std=False, return_cov=False):
-		return self.detrend_predict(X) + super().predict(X)
+		return self.detrend_predict(X) + self._predict_array(X)
 
 
 
@@ -655,7 +1214,11 @@ class DetrendedChainedTargetRegression(
 		return super().fit(X, self.detrend_fit(X,Y))
 
 	def predict(self, X, return_std=False, return_cov=False):
-		return self.detrend_predict(X) + super().predict(X)
+		return pandas.DataFrame(
+			self.detrend_predict(X) + self._predict_array(X),
+			index=_row_index(X),
+			columns=self.Y_columns,
+		)
 
 
 class DetrendedEnsembleRegressorChains(
@@ -667,4 +1230,8 @@ class DetrendedEnsembleRegressorChains(
 		return super().fit(X, self.detrend_fit(X,Y))
 
 	def predict(self, X, return_std=False, return_cov=False):
-		return self.detrend_predict(X) + super().predict(X)
+		return pandas.DataFrame(
+			self.detrend_predict(X) + self._predict_array(X),
+			index=_row_index(X),
+			columns=self.ensemble[0].Y_columns,
+		)
@@ -0,0 +1,185 @@
+"""
+Executors for running independent pieces of model fitting concurrently.
+
+Estimators in `pines.gpr` take simple `backend` and `n_jobs` parameters
+instead of live executor objects, so that they still clone and pickle
+cleanly.  The executor itself is only opened for the duration of the work.
+"""
+
+import os
+import contextlib
+import concurrent.futures as cf
+
+
+class SerialExecutor:
+	"""
+	An executor that runs each task immediately in the calling thread.
+	"""
+
+	def submit(self, fn, *args, **kwargs):
+		future = cf.Future()
+		try:
+			result = fn(*args, **kwargs)
+		except BaseException as err:
+			future.set_exception(err)
+		else:
+			future.set_result(result)
+		return future
+
+	def shutdown(self, wait=True):
+		pass
+
+
+# Objects shared with the workers of a `_ProcessPool`, installed in each
+# worker process by its initializer.
+_worker_shared = {}
+
+
+class SharedRef:
+	"""
+	A small placeholder for an object shared with process pool workers.
+	"""
+
+	def __init__(self, key):
+		self.key = key
+
+
+def _install_shared(shared):
+	_worker_shared.clear()
+	_worker_shared.update(shared)
+
+
+def _resolve(arg):
+	if isinstance(arg, SharedRef):
+		return _worker_shared[arg.key]
+	return arg
+
+
+def _call_with_shared(fn, args, kwargs):
+	args = [_resolve(a) for a in args]
+	kwargs = {k: _resolve(v) for k, v in kwargs.items()}
+	return fn(*args, **kwargs)
+
+
+class _ProcessPool:
+	"""
+	A process pool that sends shared objects to each worker only once.
+
+	The underlying `ProcessPoolExecutor` is started on the first `submit`,
+	with every object registered by `share` before then passed to the worker
+	initializer.  Tasks receive a `SharedRef` in place of each such object,
+	so large training data is not pickled again for every task.
+	"""
+
+	def __init__(self, max_workers):
+		self._max_workers = max_workers
+		self._shared = {}
+		self._pool = None
+
+	def share(self, obj):
+		for key, shared in self._shared.items():
+			if shared is obj:
+				return SharedRef(key)
+		if self._pool is not None:
+			return obj
+		key = len(self._shared)
+		self._shared[key] = obj
+		return SharedRef(key)
+
+	def submit(self, fn, *args, **kwargs):
+		if self._pool is None:
+			self._pool = cf.ProcessPoolExecutor(
+				max_workers=self._max_workers,
+				initializer=_install_shared,
+				initargs=(self._shared,),
+			)
+		return self._pool.submit(_call_with_shared, fn, args, kwargs)
+
+	def shutdown(self, wait=True):
+		if self._pool is not None:
+			self._pool.shutdown(wait=wait)
+
+
+def n_workers(n_jobs):
+	"""
+	Convert a joblib-style `n_jobs` into a number of workers.
+
+	None means 1, and negative values count back from the number of CPUs,
+	so that -1 means all of them.
+	"""
+	if n_jobs is None:
+		return 1
+	if n_jobs < 0:
+		return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+	return max(1, n_jobs)
+
+
+def is_serial(backend=None, n_jobs=None):
+	"""
+	Check whether `backend` and `n_jobs` describe plain serial execution.
+	"""
+	if backend == 'serial':
+		return True
+	return backend is None and n_workers(n_jobs) == 1
+
+
+@contextlib.contextmanager
+def open_executor(backend=None, n_jobs=None):
+	"""
+	Open an executor for the given backend.
+
+	Parameters
+	----------
+	backend : {None, 'serial', 'thread', 'process', 'dask'} or executor
+		Where to run tasks.  None gives a process pool if more than one job
+		is requested and serial execution otherwise.  'dask' uses the current
+		dask client, e.g. a `pines.cluster.Client`.  Any object with a
+		`submit` method, such as a `concurrent.futures` executor or a dask
+		client, is used as given.
+	n_jobs : int, optional
+		Number of workers for thread and process pools.
+
+	Yields
+	------
+	executor
+		An object with a `submit` method whose futures have a `result` method.
+		Executors created here are shut down on exit.
+	"""
+	if backend is not None and hasattr(backend, 'submit'):
+		yield backend
+		return
+	if backend == 'dask':
+		from distributed import get_client
+		yield get_client()
+		return
+	if is_serial(backend, n_jobs):
+		yield SerialExecutor()
+		return
+	if backend == 'thread':
+		pool = cf.ThreadPoolExecutor(max_workers=n_workers(n_jobs))
+	elif backend is None or backend == 'process':
+		pool = _ProcessPool(max_workers=n_workers(n_jobs))
+	else:
+		raise ValueError(f'unknown backend {backend!r}')
+	try:
+		yield pool
+	finally:
+		pool.shutdown(wait=True)
+
+
+def share(executor, obj):
+	"""
+	Prepare a large argument to be passed to many tasks on `executor`.
+
+	On a dask client the object is scattered to the workers once, and the
+	returned future can be passed to `submit` in place of the object.  On a
+	process pool from `open_executor` the object is sent to each worker
+	process once when the pool starts, so it should be shared before the
+	first task is submitted; sharing the same object again, even after that,
+	gives the same reference.  Other executors receive the object itself.
+	"""
+	if hasattr(executor, 'scatter'):
+		return executor.scatter(obj, broadcast=True)
+	if isinstance(executor, _ProcessPool):
+		return executor.share(obj)
+	return obj
@@ -0,0 +1,305 @@
+"""
+Opt-in timers and counters for the stages of fitting and predicting.
+
+The estimators in `pines.gpr` mark their stages (feature selection, the
+linear detrend, the gaussian process fit and its likelihood evaluations,
+predictions, cross validation folds, chain links, ...) with `stage`.  While
+no `profile` is active, `stage` returns a shared do-nothing context manager,
+so the marks cost next to nothing.  Inside a `profile`, each stage is timed
+under its nested path, such as 'cv.fold/fit/gpr.fit'::
+
+	from pines.gpr import profiling
+	with profiling.profile(log=True) as prof:
+		model.fit(X, y)
+	prof.to_frame()
+
+Tasks submitted with `submit` bring back what was recorded in worker
+processes and on dask workers, and records from separate runs can be
+combined with `Profile.merge`.
+"""
+
+import os
+import time
+import functools
+import logging
+import threading
+import contextlib
+import pandas
+
+from ..logger import getLogger
+
+# The active Profile objects.
+_recorders = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack():
+	try:
+		return _local.stack
+	except AttributeError:
+		_local.stack = []
+		return _local.stack
+
+
+class _NullStage:
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+
+	__slots__ = ('name', 'path', 'start')
+
+	def __init__(self, name):
+		self.name = name
+
+	def __enter__(self):
+		stack = _stack()
+		stack.append(self.name)
+		self.path = '/'.join(stack)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		elapsed = time.perf_counter() - self.start
+		_stack().pop()
+		for recorder in list(_recorders):
+			recorder.add_time(self.path, elapsed)
+		return False
+
+
+def stage(name):
+	"""
+	A context manager timing one stage, if a profile is active.
+
+	Parameters
+	----------
+	name : str
+		The stage name.  It is recorded under the names of the stages it is
+		nested in, joined with '/'.
+	"""
+	if not _recorders:
+		return _NULL_STAGE
+	return _Stage(name)
+
+
+def staged(name):
+	"""
+	Decorate a function so that each call is timed as a stage, see `stage`.
+	"""
+	def decorate(fn):
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			if not _recorders:
+				return fn(*args, **kwargs)
+			with _Stage(name):
+				return fn(*args, **kwargs)
+		return wrapper
+	return decorate
+
+
+def count(name, n=1):
+	"""
+	Add to a counter, if a profile is active.
+
+	Parameters
+	----------
+	name : str
+		The counter name.  Like stage names, it is recorded under the names
+		of the enclosing stages.
+	n : int
+	"""
+	if not _recorders:
+		return
+	path = '/'.join(_stack() + [name])
+	for recorder in list(_recorders):
+		recorder.add_count(path, n)
+
+
+def is_active():
+	"""
+	Whether any profile is recording.
+	"""
+	return bool(_recorders)
+
+
+class Profile:
+	"""
+	Timings and counts recorded by stage.
+
+	Attributes
+	----------
+	stages : dict
+		For each stage path, a list of the number of calls, the total seconds
+		and the longest call in seconds.
+	counters : dict
+		The total for each counter path.
+	"""
+
+	def __init__(self):
+		self.stages = {}
+		self.counters = {}
+		self._lock = threading.Lock()
+
+	def add_time(self, path, seconds, calls=1, longest=None):
+		with self._lock:
+			entry = self.stages.setdefault(path, [0, 0.0, 0.0])
+			entry[0] += calls
+			entry[1] += seconds
+			entry[2] = max(entry[2], seconds if longest is None else longest)
+
+	def add_count(self, path, n=1):
+		with self._lock:
+			self.counters[path] = self.counters.get(path, 0) + n
+
+	def record(self):
+		"""
+		The recorded values as plain python types, to be pickled or sent as json.
+
+		Returns
+		-------
+		dict
+			With keys 'stages' (a dict of dicts with 'calls', 'seconds' and
+			'max' for each stage path), 'counters', 'host' and 'pid'.
+		"""
+		with self._lock:
+			return dict(
+				stages={
+					path: dict(calls=calls, seconds=seconds, max=longest)
+					for path, (calls, seconds, longest) in self.stages.items()
+				},
+				counters=dict(self.counters),
+				host=os.uname().nodename if hasattr(os, 'uname') else None,
+				pid=os.getpid(),
+			)
+
+	def merge(self, other, prefix=None):
+		"""
+		Add the values of another profile or record to this one.
+
+		Parameters
+		----------
+		other : Profile or dict
+			A profile, or a record from `Profile.record`.
+		prefix : str, optional
+			Put the merged stages and counters under this stage path.
+
+		Returns
+		-------
+		self
+		"""
+		if isinstance(other, Profile):
+			other = other.record()
+		join = (lambda path: f'{prefix}/{path}') if prefix else (lambda path: path)
+		for path, entry in other['stages'].items():
+			self.add_time(join(path), entry['seconds'], calls=entry['calls'], longest=entry['max'])
+		for path, n in other['counters'].items():
+			self.add_count(join(path), n)
+		return self
+
+	def to_frame(self):
+		"""
+		The stage timings as a DataFrame, indexed by stage path.
+		"""
+		with self._lock:
+			frame = pandas.DataFrame(
+				[(path, calls, seconds, longest) for path, (calls, seconds, longest) in self.stages.items()],
+				columns=['stage', 'calls', 'seconds', 'max'],
+			)
+		frame['mean'] = frame['seconds'] / frame['calls']
+		return frame.set_index('stage').sort_index()
+
+	def log(self, logger=None, level=logging.INFO):
+		"""
+		Write the timings and counters to a logger, by default the pines logger.
+		"""
+		if logger is None:
+			logger = getLogger('π.gpr')
+		for path, (calls, seconds, longest) in sorted(self.stages.items()):
+			logger.log(level, '%s: %d calls, %.4fs total, %.4fs max', path, calls, seconds, longest)
+		for path, n in sorted(self.counters.items()):
+			logger.log(level, '%s: %s', path, n)
+
+
+@contextlib.contextmanager
+def profile(log=False, level=logging.INFO, logger=None):
+	"""
+	Record the stages run in this process until the context exits.
+
+	Parameters
+	----------
+	log : bool, default False
+		Write the results to the pines logger on exit, see `Profile.log`.
+	level : int
+		The logging level for that.
+	logger : logging.Logger, optional
+		Log here instead of to the pines logger.
+
+	Yields
+	------
+	Profile
+	"""
+	recorder = Profile()
+	with _lock:
+		_recorders.append(recorder)
+	try:
+		yield recorder
+	finally:
+		with _lock:
+			_recorders.remove(recorder)
+		if log:
+			recorder.log(logger=logger, level=level)
+
+
+def _run_profiled(pid, prefix, fn, /, *args, **kwargs):
+	"""
+	Run a task under the stage path it was submitted from.
+
+	In another process, the task is run under its own profile, whose record
+	is returned with the result.
+	"""
+	saved = _stack()[:]
+	_local.stack = list(prefix)
+	try:
+		if os.getpid() == pid:
+			return fn(*args, **kwargs), None
+		with profile() as recorder:
+			result = fn(*args, **kwargs)
+		return result, recorder.record()
+	finally:
+		_local.stack = saved
+
+
+class _ProfiledFuture:
+
+	def __init__(self, future):
+		self._future = future
+
+	def result(self, *args, **kwargs):
+		result, record = self._future.result(*args, **kwargs)
+		if record is not None:
+			for recorder in list(_recorders):
+				recorder.merge(record)
+		return result
+
+
+def submit(executor, fn, *args, **kwargs):
+	"""
+	Submit a task to an executor, keeping what it records while profiling.
+
+	When no profile is active, this is just `executor.submit`.  Otherwise the
+	task's stages are recorded under the stage it was submitted from, and
+	those recorded in another process are merged into the active profiles
+	when the future's result is taken.
+	"""
+	if not _recorders:
+		return executor.submit(fn, *args, **kwargs)
+	return _ProfiledFuture(executor.submit(_run_profiled, os.getpid(), tuple(_stack()), fn, *args, **kwargs))
@@ -2,18 +2,211 @@
 import numpy, pandas
 from sklearn.preprocessing import StandardScaler
 
+from pines.attribute_dict import dicta
+from ..smartread import SmartFileReader
+from .parallel import open_executor
 
 
-class StandardDataFrameScaler(StandardScaler):
+def chunk_statistics(X):
+	"""
+	The count, mean, and sum of squared deviations from the mean, by column.
 
-	def __init__(self, copy=True, with_mean=True, with_std=True):
-		super().__init__(copy=copy, with_mean=with_mean, with_std=with_std)
+	NaN values are ignored.  Statistics for separate chunks of rows can be
+	computed independently (e.g. in parallel) and combined with `merge_statistics`.
+
+	Parameters
+	----------
+	X : array-like or DataFrame, shape [n_samples, n_features]
+
+	Returns
+	-------
+	dicta
+		With keys 'n', 'mean' and 'm2' (arrays with one value per column) and
+		'columns' (the column names of a DataFrame, or None).
+	"""
+	columns = list(X.columns) if isinstance(X, pandas.DataFrame) else None
+	X = numpy.asarray(X, dtype=numpy.float64)
+	valid = ~numpy.isnan(X)
+	n = valid.sum(axis=0)
+	with numpy.errstate(invalid='ignore', divide='ignore'):
+		mean = numpy.where(valid, X, 0).sum(axis=0) / n
+	mean[n == 0] = 0
+	m2 = (numpy.where(valid, X - mean, 0) ** 2).sum(axis=0)
+	return dicta(n=n, mean=mean, m2=m2, columns=columns)
+
+
+def merge_statistics(a, b):
+	"""
+	Combine the statistics of two chunks of rows.
+
+	This uses the pairwise update of Chan, Golub and LeVeque, which remains
+	accurate when the chunks have very different sizes or means.
+
+	Parameters
+	----------
+	a, b : dicta or None
+		As from `chunk_statistics`.  None is treated as no rows.
+
+	Returns
+	-------
+	dicta
+	"""
+	if a is None:
+		return b
+	if b is None:
+		return a
+	if a.mean.shape != b.mean.shape:
+		raise ValueError(f'cannot merge statistics for {a.mean.shape[0]} and {b.mean.shape[0]} columns')
+	if a.columns is not None and b.columns is not None and list(a.columns) != list(b.columns):
+		raise ValueError('cannot merge statistics for different columns')
+	n = a.n + b.n
+	with numpy.errstate(invalid='ignore', divide='ignore'):
+		weight = numpy.where(n > 0, b.n / n, 0.0)
+	delta = b.mean - a.mean
+	return dicta(
+		n=n,
+		mean=a.mean + delta * weight,
+		m2=a.m2 + b.m2 + delta ** 2 * a.n * weight,
+		columns=a.columns if a.columns is not None else b.columns,
+	)
+
+
+def csv_statistics(filename, transform=None, chunksize=100000, **kwargs):
+	"""
+	Column statistics of a (possibly gzipped or zipped) csv file, read in chunks.
+
+	Parameters
+	----------
+	filename : str
+		Read with `pines.smartread.SmartFileReader`.
+	transform : callable, optional
+		Applied to each chunk (a DataFrame) before the statistics are taken.
+	chunksize : int
+		Rows to read at once.
+	**kwargs
+		Passed to `pandas.read_csv`, e.g. `usecols`.
+
+	Returns
+	-------
+	dicta
+		As from `chunk_statistics`.
+	"""
+	reader = SmartFileReader(filename)
+	try:
+		statistics = None
+		# pandas inspects the type and mode of the file, so give it the one wrapped.
+		for chunk in pandas.read_csv(reader.file, chunksize=chunksize, **kwargs):
+			if transform is not None:
+				chunk = transform(chunk)
+			statistics = merge_statistics(statistics, chunk_statistics(chunk))
+	finally:
+		reader.close()
+	return statistics
+
+
+class PartialFitScalerMixin:
+	"""
+	Out-of-core fitting for StandardScaler subclasses.
+
+	The mean and scale are derived from running column statistics in
+	`statistics_`, which `partial_fit` updates one chunk of rows at a time,
+	and which can be merged with statistics computed elsewhere.  Subclasses
+	may transform the data before the statistics are taken with `_prepare`,
+	and adjust the fitted values in `_set_scale`.
+	"""
+
+	def _prepare(self, X):
+		return X
 
 	def fit(self, X, y=None):
-		return super().fit(numpy.log1p(X), y)
+		"""
+		Compute the mean and scale to be used for later scaling.
+
+		Parameters
+		----------
+		X : array-like or DataFrame, shape [n_samples, n_features]
+		"""
+		self.statistics_ = None
+		return self.partial_fit(X, y)
+
+	def partial_fit(self, X, y=None):
+		"""
+		Update the mean and scale with another chunk of rows.
+
+		Parameters
+		----------
+		X : array-like or DataFrame, shape [n_samples, n_features]
+		"""
+		return self.merge_statistics(chunk_statistics(self._prepare(X)))
+
+	def merge_statistics(self, statistics):
+		"""
+		Update the mean and scale with statistics for more rows.
+
+		Parameters
+		----------
+		statistics : dicta
+			As from `chunk_statistics` or `csv_statistics` of prepared data, or
+			the `statistics_` of another scaler of the same kind.
+		"""
+		self.statistics_ = merge_statistics(getattr(self, 'statistics_', None), statistics)
+		self._set_scale()
+		return self
+
+	def partial_fit_csv(self, files, chunksize=100000, n_jobs=None, backend=None, **kwargs):
+		"""
+		Update the mean and scale with the rows of one or more csv files.
+
+		Parameters
+		----------
+		files : str or list of str
+			Files to read with `pines.smartread.SmartFileReader`, so they may be
+			gzipped or zipped.
+		chunksize : int
+			Rows to read at once.
+		n_jobs : int, optional
+			Number of files to read concurrently.
+		backend : {None, 'serial', 'thread', 'process', 'dask'} or executor
+			Where to read them, see `pines.gpr.parallel.open_executor`.
+		**kwargs
+			Passed to `pandas.read_csv`, e.g. `usecols`.
+		"""
+		if isinstance(files, str):
+			files = [files]
+		with open_executor(backend, n_jobs) as executor:
+			futures = [executor.submit(csv_statistics, f, self._prepare, chunksize, **kwargs) for f in files]
+			for future in futures:
+				self.merge_statistics(future.result())
+		return self
 
-	def transform(self, X, y='deprecated', copy=None):
-		result = super().transform(X, y, copy)
+	def _set_scale(self):
+		statistics = self.statistics_
+		n = statistics.n
+		self.n_samples_seen_ = int(n[0]) if (n == n[0]).all() else n.copy()
+		self.mean_ = statistics.mean.copy()
+		with numpy.errstate(invalid='ignore', divide='ignore'):
+			var = numpy.where(n > 0, statistics.m2 / n, 0.0)
+		if self.with_std:
+			self.var_ = var
+			self.scale_ = numpy.sqrt(var)
+			# As sklearn does, constant columns are not scaled.
+			self.scale_[self.scale_ < 10 * numpy.finfo(self.scale_.dtype).eps] = 1.0
+		else:
+			self.var_ = None
+			self.scale_ = None
+		self.n_features_in_ = self.mean_.shape[0]
+		columns = statistics.columns
+		if columns is not None and all(isinstance(c, str) for c in columns):
+			self.feature_names_in_ = numpy.asarray(columns, dtype=object)
+
+
+class StandardDataFrameScaler(PartialFitScalerMixin, StandardScaler):
+
+	def __init__(self, copy=True, with_mean=True, with_std=True):
+		super().__init__(copy=copy, with_mean=with_mean, with_std=with_std)
+
+	def transform(self, X, copy=None):
+		result = super().transform(X, copy=copy)
 		if isinstance(X, pandas.DataFrame):
 			return pandas.DataFrame(
 				data=result,
@@ -33,16 +226,16 @@ class StandardDataFrameScaler(StandardScaler):
 		return result
 
 
-class Log1pStandardScaler(StandardScaler):
+class Log1pStandardScaler(PartialFitScalerMixin, StandardScaler):
 
 	def __init__(self, copy=True, with_mean=True, with_std=True):
 		super().__init__(copy=copy, with_mean=with_mean, with_std=with_std)
 
-	def fit(self, X, y=None):
-		return super().fit(numpy.log1p(X), y)
+	def _prepare(self, X):
+		return numpy.log1p(X)
 
-	def transform(self, X, y='deprecated', copy=None):
-		result = super().transform(numpy.log1p(X), y, copy)
+	def transform(self, X, copy=None):
+		result = super().transform(numpy.log1p(X), copy=copy)
 		if isinstance(X, pandas.DataFrame):
 			return pandas.DataFrame(
 				data=result,
@@ -0,0 +1,208 @@
+"""
+Search over model configurations, remembering every result.
+
+Each candidate configuration is scored by the estimator's own
+`cross_val_scores`, with the candidates run concurrently on a local pool or a
+dask cluster (such as a `pines.cluster.Client`).  Results are recorded in a
+store, which can be any mapping, including the pines HashStores, keyed by a
+hash of the data and the configuration, so that running a search again only
+computes the configurations not already in the store.
+"""
+
+import time
+import types
+import numpy, pandas
+from sklearn.model_selection import ParameterGrid
+
+from pines.attribute_dict import dicta
+from ..codex import phash, fingerprint
+from .parallel import open_executor, share
+
+
+def _code_parts(code):
+	return (
+		code.co_code,
+		code.co_names,
+		tuple(_code_parts(c) if isinstance(c, types.CodeType) else _describe(c) for c in code.co_consts),
+	)
+
+
+def _cell_contents(cell):
+	try:
+		return _describe(cell.cell_contents)
+	except ValueError:
+		# An empty cell.
+		return None
+
+
+def _describe(value):
+	"""
+	A picklable, stable stand-in for a configuration value.
+
+	Functions are described by their qualified names plus a hash of their
+	code, constants, defaults and closure values, so that two lambdas, or two
+	closures from the same factory, are told apart.  Other callables, such as
+	classes, are described by their qualified names alone.
+	"""
+	if callable(value) and hasattr(value, '__qualname__'):
+		name = f'{getattr(value, "__module__", "")}.{value.__qualname__}'
+		code = getattr(value, '__code__', None)
+		if code is None:
+			return name
+		closure = tuple(_cell_contents(c) for c in (value.__closure__ or ()))
+		defaults = _describe(value.__defaults__ or ())
+		return f'{name}#{phash((_code_parts(code), closure, defaults))[:16]}'
+	if isinstance(value, dict):
+		return tuple(sorted((k, _describe(v)) for k, v in value.items()))
+	if isinstance(value, (list, tuple)):
+		return tuple(_describe(v) for v in value)
+	if isinstance(value, (str, int, float, bool, type(None), numpy.generic)):
+		return value
+	return repr(value)
+
+
+def configure(estimator, config):
+	"""
+	A new, unfitted copy of an estimator with a configuration applied.
+
+	Parameters
+	----------
+	estimator : estimator
+		The template.
+	config : dict
+		Constructor parameters (such as `keep_other_features` or `detrend`)
+		are passed to a fresh instance, so that anything the constructor
+		derives from them is derived again.  Other keys (such as
+		`kernel_generator`) are set as attributes.
+
+	Returns
+	-------
+	estimator
+	"""
+	params = estimator.get_params(deep=False)
+	model = type(estimator)(**{**params, **{k: v for k, v in config.items() if k in params}})
+	for k, v in config.items():
+		if k not in params:
+			setattr(model, k, v)
+	return model
+
+
+def config_key(estimator, config, data_key, cv):
+	"""
+	The store key for one configuration of an estimator on some data.
+
+	Parameters
+	----------
+	estimator : estimator
+		The template estimator, whose type and parameters are part of the key.
+	config : dict
+	data_key : str
+		A fingerprint of the data, see `pines.codex.fingerprint`.
+	cv : int or cross-validation generator
+
+	Returns
+	-------
+	str
+	"""
+	return phash((
+		data_key,
+		(
+			type(estimator).__module__,
+			type(estimator).__qualname__,
+			_describe(estimator.get_params(deep=False)),
+			_describe(config),
+			_describe(cv),
+		),
+	))
+
+
+def _score_config(model, X, y, cv):
+	start = time.perf_counter()
+	try:
+		scores = model.cross_val_scores(X, y, cv=cv)
+	except Exception as err:
+		return dicta(error=f'{type(err).__name__}: {err}', seconds=time.perf_counter() - start)
+	return dicta(scores=dict(scores), seconds=time.perf_counter() - start)
+
+
+def search(estimator, configs, X, y, store=None, cv=3, backend=None, n_jobs=None, refresh=False):
+	"""
+	Score configurations of an estimator by cross validation.
+
+	Parameters
+	----------
+	estimator : estimator
+		A template with a `cross_val_scores(X, y, cv)` method, such as a
+		`LinearAndGaussianProcessRegression` or `SingleTargetRegression`.
+	configs : dict of lists, or list of dict
+		The configurations to score.  A dict of lists is expanded into a grid
+		of every combination, as by sklearn's ParameterGrid.  See `configure`
+		for how each configuration is applied.
+	X, y
+		The data, passed to `cross_val_scores`.
+	store : mapping, optional
+		Where results are kept, such as a dict, a `pines.mysql.HashStore`, a
+		`pines.postgres.PostgresHashStore` or a `pines.egnyte.HashStore`.
+		Results are keyed by `config_key`, and configurations already in the
+		store are not run again.  Failed configurations are not stored.
+	cv : int or cross-validation generator
+	backend : {None, 'serial', 'thread', 'process', 'dask'} or executor
+		Where to run the configurations, see `pines.gpr.parallel.open_executor`.
+		A `pines.cluster.Client` may be given directly.  The data is sent to
+		each worker once.
+	n_jobs : int, optional
+		Number of workers for a local pool.
+	refresh : bool, default False
+		Run every configuration, replacing any stored results.
+
+	Returns
+	-------
+	pandas.DataFrame
+		One row per configuration, in order, with the configuration values,
+		the 'mean_score' and the score for each target, the 'seconds' taken,
+		whether the result was 'cached', and any 'error'.
+	"""
+	if isinstance(configs, dict):
+		configs = list(ParameterGrid(configs))
+	else:
+		configs = list(configs)
+	if store is None:
+		store = {}
+	data_key = fingerprint(X, y)
+	keys = [config_key(estimator, config, data_key, cv) for config in configs]
+
+	results = [None] * len(configs)
+	if not refresh:
+		for i, key in enumerate(keys):
+			try:
+				results[i] = store[key]
+			except KeyError:
+				pass
+	cached = [r is not None for r in results]
+
+	todo = [i for i, r in enumerate(results) if r is None]
+	if todo:
+		with open_executor(backend, n_jobs) as executor:
+			X_ = share(executor, X)
+			y_ = share(executor, y)
+			futures = [
+				(i, executor.submit(_score_config, configure(estimator, configs[i]), X_, y_, cv))
+				for i in todo
+			]
+			for i, future in futures:
+				results[i] = future.result()
+				if 'error' not in results[i]:
+					store[keys[i]] = results[i]
+
+	rows = []
+	for config, result, was_cached in zip(configs, results, cached):
+		row = {k: _describe(v) if callable(v) else v for k, v in config.items()}
+		scores = result.get('scores', {})
+		row['mean_score'] = numpy.mean(list(scores.values())) if scores else numpy.nan
+		for target, score in scores.items():
+			row[f'score:{target}'] = score
+		row['seconds'] = result.get('seconds')
+		row['cached'] = was_cached
+		row['error'] = result.get('error')
+		rows.append(row)
+	return pandas.DataFrame(rows)
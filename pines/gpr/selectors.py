@@ -2,6 +2,7 @@ import numpy, pandas
 from sklearn.base import TransformerMixin
 from sklearn.feature_selection import SelectKBest
 from sklearn.feature_selection import f_regression, mutual_info_regression
+from .screening import get_screen
 
 
 class SelectNAndKBest(
@@ -12,9 +13,21 @@ class SelectNAndKBest(
 	"""
 
 	def __init__(self, n, k, func=None):
+		"""
+
+		Parameters
+		----------
+		n : int
+			Number of leading feature columns to always keep.
+		k : int
+			Number of the other feature columns to keep.
+		func : str or callable, optional
+			The feature screen, see `pines.gpr.screening.get_screen`.  Defaults
+			to the cached histogram mutual information screen.
+		"""
 		self._n = n
 		self._k = k
-		self._func = mutual_info_regression if func is None else func
+		self._func = get_screen(func)
 
 	def fit(self, X, y):
 		if self._k > X.shape[1]-self._n:
@@ -0,0 +1,327 @@
+"""
+Approximate gaussian process regression for large training sets.
+
+The exact GPR costs O(n³) time and O(n²) memory in the number of training
+rows.  The `SparseGaussianProcessRegressor` here uses a small set of m
+inducing points instead (the "deterministic training conditional" of
+Quiñonero-Candela and Rasmussen, 2005), which costs O(n·m²) time and,
+because the training rows are visited in blocks, only O(m² + block·m) memory.
+"""
+
+import numpy
+import scipy.linalg
+from sklearn.base import RegressorMixin, BaseEstimator
+from sklearn.gaussian_process.kernels import RBF, ConstantKernel as C, WhiteKernel, Sum
+from sklearn.utils import check_random_state
+
+from . import profiling
+
+
+def _jittered_cholesky(A, jitter, max_tries=8):
+	"""
+	Lower Cholesky factor of A, adding increasing jitter to the diagonal as needed.
+	"""
+	scale = max(numpy.mean(numpy.diag(A)), 1e-300)
+	for attempt in range(max_tries):
+		try:
+			return scipy.linalg.cholesky(A + numpy.eye(A.shape[0]) * (jitter * scale), lower=True)
+		except numpy.linalg.LinAlgError:
+			jitter *= 10
+	raise numpy.linalg.LinAlgError('matrix is not positive definite even with jitter')
+
+
+def _split_white(kernel):
+	"""
+	Separate the additive white noise terms from a kernel.
+
+	Returns
+	-------
+	kernel or None
+		The kernel without its additive WhiteKernel terms, or None if it has
+		nothing else.
+	float
+		The total noise level of those terms.
+	"""
+	if isinstance(kernel, WhiteKernel):
+		return None, float(kernel.noise_level)
+	if isinstance(kernel, Sum):
+		k1, noise1 = _split_white(kernel.k1)
+		k2, noise2 = _split_white(kernel.k2)
+		if k1 is None or k2 is None:
+			return (k2 if k1 is None else k1), noise1 + noise2
+		if k1 is kernel.k1 and k2 is kernel.k2:
+			return kernel, 0.0
+		return Sum(k1, k2), noise1 + noise2
+	return kernel, 0.0
+
+
+class SparseGaussianProcessRegressor(
+		BaseEstimator,
+		RegressorMixin,
+):
+	"""
+	Gaussian process regression using a set of inducing points.
+
+	The kernel hyperparameters are optimized with an exact GPR on a random
+	subset of the training data.  The noise level is learned there too, by a
+	WhiteKernel term which is added to the kernel if it has none, and which
+	is then kept apart from the kernel between data and inducing points.
+	The inducing points are then chosen automatically from all the training
+	data, and the predictive mean and variance are computed from the full
+	training set through those inducing points.
+	"""
+
+	def __init__(
+			self,
+			kernel=None,
+			n_inducing=500,
+			inducing='kmeans',
+			n_optimize=1000,
+			alpha=1e-10,
+			n_restarts_optimizer=0,
+			normalize_y=False,
+			block_size=4096,
+			random_state=None,
+			n_jobs=None,
+			backend=None,
+			warm_start=False,
+			warm_restarts=0,
+	):
+		"""
+
+		Parameters
+		----------
+		kernel : sklearn kernel, optional
+			Defaults to `C() * RBF()`.  A `WhiteKernel` is added for the noise
+			level unless the kernel already has one as an additive term.
+		n_inducing : int
+			Number of inducing points.  Time scales with the square of this, and
+			memory with at least its square.
+		inducing : {'kmeans', 'random'} or array-like
+			How to choose the inducing points: the centers of a mini-batch
+			k-means clustering of the training inputs, a random subset of the
+			training inputs, or an explicit array of points.
+		n_optimize : int
+			Size of the random subset of training rows used to optimize the
+			kernel hyperparameters with an exact GPR.
+		alpha : float
+			Noise variance added to the diagonal of the kernel, as for the exact
+			GaussianProcessRegressor, in addition to the learned noise level.
+		n_restarts_optimizer : int
+			Number of restarts of the kernel hyperparameter optimizer.
+		normalize_y : bool
+			Subtract the mean of the training targets before fitting.
+		block_size : int
+			Number of rows processed at once when building the cross kernel
+			between data and inducing points.
+		random_state : int or RandomState, optional
+			Controls the subset, the inducing points and the optimizer restarts.
+		n_jobs, backend, warm_start, warm_restarts
+			Passed to the hyperparameter optimization, see `GaussianProcessRegressor_`.
+		"""
+		self.kernel = kernel
+		self.n_inducing = n_inducing
+		self.inducing = inducing
+		self.n_optimize = n_optimize
+		self.alpha = alpha
+		self.n_restarts_optimizer = n_restarts_optimizer
+		self.normalize_y = normalize_y
+		self.block_size = block_size
+		self.random_state = random_state
+		self.n_jobs = n_jobs
+		self.backend = backend
+		self.warm_start = warm_start
+		self.warm_restarts = warm_restarts
+
+	def set_warm_start(self, theta):
+		"""
+		Start the hyperparameter optimizer for the next fit from `theta`.
+		"""
+		self._warm_theta = numpy.asarray(theta, dtype=numpy.float64)
+		return self
+
+	def warm_state(self):
+		"""
+		The fitted hyperparameters, for seeding the fit of a related model.
+		"""
+		return self.fitted_kernel_.theta
+
+	def _inducing_points(self, X, rng):
+		m = min(self.n_inducing, X.shape[0])
+		if not isinstance(self.inducing, str):
+			return numpy.asarray(self.inducing, dtype=numpy.float64)
+		if self.inducing == 'random':
+			return X[numpy.sort(rng.choice(X.shape[0], m, replace=False))]
+		if self.inducing == 'kmeans':
+			from sklearn.cluster import MiniBatchKMeans
+			km = MiniBatchKMeans(n_clusters=m, random_state=rng, batch_size=max(1024, 3*m))
+			return km.fit(X).cluster_centers_
+		raise ValueError(f'unknown inducing point method {self.inducing!r}')
+
+	def _blocks(self, n):
+		for start in range(0, n, self.block_size):
+			yield slice(start, min(start + self.block_size, n))
+
+	@profiling.staged('sgpr.fit')
+	def fit(self, X, y):
+		"""
+		Fit the sparse gaussian process model.
+
+		Parameters
+		----------
+		X : array-like of shape [n_samples, n_features]
+			Training data
+		y : array-like of shape [n_samples] or [n_samples, n_targets]
+			Target values.
+
+		Returns
+		-------
+		self : returns an instance of self.
+		"""
+		from . import GaussianProcessRegressor_
+
+		X = numpy.asarray(X, dtype=numpy.float64)
+		y = numpy.asarray(y, dtype=numpy.float64)
+		self._y_1d = (y.ndim == 1)
+		if self._y_1d:
+			y = y.reshape(-1, 1)
+		if self.normalize_y:
+			self._y_train_mean = y.mean(axis=0)
+		else:
+			self._y_train_mean = numpy.zeros(y.shape[1])
+		y = y - self._y_train_mean
+
+		rng = check_random_state(self.random_state)
+		n = X.shape[0]
+
+		kernel = C() * RBF([1.0] * X.shape[1]) if self.kernel is None else self.kernel
+		if _split_white(kernel)[0] is kernel:
+			kernel = kernel + WhiteKernel(noise_level=1e-2, noise_level_bounds=(1e-10, 1e2))
+		subset = numpy.sort(rng.choice(n, min(n, self.n_optimize), replace=False))
+		gpr = GaussianProcessRegressor_(
+			kernel=kernel,
+			alpha=self.alpha,
+			n_restarts_optimizer=self.n_restarts_optimizer,
+			random_state=rng,
+			n_jobs=self.n_jobs,
+			backend=self.backend,
+			warm_restarts=self.warm_restarts,
+		)
+		theta = getattr(self, '_warm_theta', None)
+		if theta is None and self.warm_start and hasattr(self, 'fitted_kernel_'):
+			theta = self.fitted_kernel_.theta
+		self._warm_theta = None
+		if theta is not None:
+			gpr.set_warm_start(theta)
+		gpr.fit(X[subset], y[subset])
+		# The white noise enters the model as the noise variance only, not in
+		# the kernel between data and inducing points.
+		self.fitted_kernel_ = gpr.kernel_
+		self.kernel_, white_noise = _split_white(gpr.kernel_)
+		if self.kernel_ is None:
+			raise ValueError('the kernel must have a term other than white noise')
+
+		self.Z_ = self._inducing_points(X, rng)
+		m = self.Z_.shape[0]
+
+		Kmm = self.kernel_(self.Z_)
+		KmnKnm = numpy.zeros([m, m])
+		Kmny = numpy.zeros([m, y.shape[1]])
+		for b in self._blocks(n):
+			Knm = self.kernel_(X[b], self.Z_)
+			KmnKnm += Knm.T @ Knm
+			Kmny += Knm.T @ y[b]
+
+		self.noise_ = max(self.alpha + white_noise, 1e-12)
+		self.L_mm_ = _jittered_cholesky(Kmm, 1e-10)
+		self._Kmm, self._KmnKnm, self._Kmny = Kmm, KmnKnm, Kmny
+		self._solve()
+		return self
+
+	def _solve(self):
+		self.L_A_ = _jittered_cholesky(self.noise_ * self._Kmm + self._KmnKnm, 1e-12)
+		self.alpha_ = scipy.linalg.cho_solve((self.L_A_, True), self._Kmny)
+
+	@profiling.staged('sgpr.update')
+	def update(self, X, y, drift_tolerance=None):
+		"""
+		Add training data, keeping the kernel and the inducing points.
+
+		Only the sums over training rows are updated, at a cost of O(k·m²)
+		for k new rows, followed by one m×m factorization.
+
+		Parameters
+		----------
+		X : array-like of shape [n_new, n_features]
+		y : array-like of shape [n_new] or [n_new, n_targets]
+		drift_tolerance : float, optional
+			Accepted for compatibility with `GaussianProcessRegressor_.update`,
+			but not used, as the sparse model does not track its likelihood.
+
+		Returns
+		-------
+		self : returns an instance of self.
+		"""
+		X = numpy.asarray(X, dtype=numpy.float64)
+		y = numpy.asarray(y, dtype=numpy.float64).reshape(X.shape[0], -1) - self._y_train_mean
+		for b in self._blocks(X.shape[0]):
+			Knm = self.kernel_(X[b], self.Z_)
+			# Not in place, as the sums may be read-only, e.g. memory-mapped by `load_model`.
+			self._KmnKnm = self._KmnKnm + Knm.T @ Knm
+			self._Kmny = self._Kmny + Knm.T @ y[b]
+		self._solve()
+		return self
+
+	@profiling.staged('sgpr.predict')
+	def predict(self, X, return_std=False, return_cov=False):
+		"""
+		Predict using the sparse gaussian process model.
+
+		Parameters
+		----------
+		X : array-like of shape [n_samples, n_features]
+			Query points.
+		return_std : bool, default False
+			If True, the standard deviation of the predictive distribution is
+			returned along with the mean.
+		return_cov : bool, default False
+			If True, the covariance of the predictive distribution is returned
+			along with the mean.
+
+		Returns
+		-------
+		y_mean : array, shape = (n_samples, [n_targets])
+		y_std : array, shape = (n_samples,), optional
+		y_cov : array, shape = (n_samples, n_samples), optional
+		"""
+		if return_std and return_cov:
+			raise RuntimeError("Not returning standard deviation of predictions when returning full covariance.")
+
+		X = numpy.asarray(X, dtype=numpy.float64)
+		y_mean = numpy.empty([X.shape[0], self.alpha_.shape[1]])
+		y_var = numpy.empty(X.shape[0]) if return_std else None
+		for b in self._blocks(X.shape[0]):
+			Kxm = self.kernel_(X[b], self.Z_)
+			y_mean[b] = Kxm @ self.alpha_
+			if return_std:
+				v_mm = scipy.linalg.solve_triangular(self.L_mm_, Kxm.T, lower=True)
+				v_A = scipy.linalg.solve_triangular(self.L_A_, Kxm.T, lower=True)
+				y_var[b] = (
+					self.kernel_.diag(X[b])
+					- numpy.einsum("ij,ij->j", v_mm, v_mm)
+					+ self.noise_ * numpy.einsum("ij,ij->j", v_A, v_A)
+				)
+		y_mean += self._y_train_mean
+		if self._y_1d:
+			y_mean = y_mean[:, 0]
+
+		if return_cov:
+			Kxm = self.kernel_(X, self.Z_)
+			v_mm = scipy.linalg.solve_triangular(self.L_mm_, Kxm.T, lower=True)
+			v_A = scipy.linalg.solve_triangular(self.L_A_, Kxm.T, lower=True)
+			y_cov = self.kernel_(X) - v_mm.T @ v_mm + self.noise_ * (v_A.T @ v_A)
+			return y_mean, y_cov
+		if return_std:
+			y_var[y_var < 0] = 0.0
+			return y_mean, numpy.sqrt(y_var)
+		return y_mean
@@ -0,0 +1,139 @@
+"""
+Compact on-disk storage for fitted models.
+
+A fitted multi-target model holds many gaussian processes, and each one keeps
+its own copy of the training inputs, so a plain pickle repeats the same large
+arrays many times.  `save_model` pickles the model with every large numeric
+array replaced by a reference to an uncompressed .npy file, named by a hash of
+its contents, so identical arrays are stored once.  `load_model` memory-maps
+those files, so several processes on one machine loading the same model share
+one copy of the arrays through the page cache.
+
+The layout of a saved model directory is::
+
+	model.pkl          the pickled model, with references to the arrays
+	arrays/<hash>.npy  one file per distinct large array
+"""
+
+import os
+import pickle
+import numpy
+
+from ..codex import fingerprint
+
+MODEL_FILE = 'model.pkl'
+ARRAY_DIR = 'arrays'
+
+
+def _storable(obj, min_bytes):
+	return (
+		type(obj) in (numpy.ndarray, numpy.memmap)
+		and not obj.dtype.hasobject
+		and obj.nbytes >= min_bytes
+	)
+
+
+class _ArrayPickler(pickle.Pickler):
+
+	def __init__(self, file, array_dir, min_bytes):
+		super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+		self.array_dir = array_dir
+		self.min_bytes = min_bytes
+		self.keys = {}
+		self.n_written = 0
+
+	def persistent_id(self, obj):
+		if not _storable(obj, self.min_bytes):
+			return None
+		# The same array object is often reached many times; hash it only once.
+		# The array is kept alive so that its id is not reused by another.
+		known = self.keys.get(id(obj))
+		if known is not None:
+			key = known[1]
+		else:
+			key = fingerprint(obj)
+			self.keys[id(obj)] = (obj, key)
+			filename = os.path.join(self.array_dir, key + '.npy')
+			if not os.path.exists(filename):
+				temp = filename + '.tmp'
+				with open(temp, 'wb') as f:
+					numpy.save(f, obj, allow_pickle=False)
+				os.replace(temp, filename)
+				self.n_written += 1
+		return ('ndarray', key)
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+
+	def __init__(self, file, array_dir, mmap_mode):
+		super().__init__(file)
+		self.array_dir = array_dir
+		self.mmap_mode = mmap_mode
+		self.arrays = {}
+
+	def persistent_load(self, pid):
+		kind, key = pid
+		if kind != 'ndarray':
+			raise pickle.UnpicklingError(f'unknown persistent id {pid!r}')
+		if key not in self.arrays:
+			self.arrays[key] = numpy.load(
+				os.path.join(self.array_dir, key + '.npy'),
+				mmap_mode=self.mmap_mode,
+				allow_pickle=False,
+			)
+		return self.arrays[key]
+
+
+def save_model(model, path, min_bytes=65536):
+	"""
+	Save a fitted model to a directory, storing each distinct large array once.
+
+	Parameters
+	----------
+	model : object
+		Any picklable object, typically a fitted estimator from `pines.gpr`.
+	path : str
+		Directory to write.  It is created if needed.  Array files already in
+		it are reused, so several models saved to the same directory share
+		their common arrays.
+	min_bytes : int, default 65536
+		Numeric arrays at least this large are stored as .npy files; smaller
+		ones are left in the pickle.
+
+	Returns
+	-------
+	int
+		The number of new array files written.
+	"""
+	array_dir = os.path.join(path, ARRAY_DIR)
+	os.makedirs(array_dir, exist_ok=True)
+	temp = os.path.join(path, MODEL_FILE + '.tmp')
+	with open(temp, 'wb') as f:
+		pickler = _ArrayPickler(f, array_dir, min_bytes)
+		pickler.dump(model)
+	os.replace(temp, os.path.join(path, MODEL_FILE))
+	return pickler.n_written
+
+
+def load_model(path, mmap_mode='c'):
+	"""
+	Load a model saved with `save_model`.
+
+	Parameters
+	----------
+	path : str
+		Directory written by `save_model`.
+	mmap_mode : {'c', 'r', None}, default 'c'
+		How to open the stored arrays, as for `numpy.load`.  The default maps
+		them copy-on-write, so they are shared between processes and only read
+		from disk as needed, until a process changes them (for example with
+		`update`), when it gets a private copy of the changed pages.  'r' maps
+		them read-only, so that any change raises an error, and None reads
+		them fully into memory.
+
+	Returns
+	-------
+	object
+	"""
+	with open(os.path.join(path, MODEL_FILE), 'rb') as f:
+		return _ArrayUnpickler(f, os.path.join(path, ARRAY_DIR), mmap_mode).load()
@@ -0,0 +1,224 @@
+"""
+Memory-bounded prediction for large query sets.
+
+A gaussian process prediction for m query points against n training points
+builds an m×n cross kernel (and an m×m covariance for `return_cov`), so a
+very large query set is best predicted in blocks.  The block size here is
+chosen from a memory budget and the size of the fitted model.
+"""
+
+import collections
+import concurrent.futures as cf
+import numpy, pandas
+
+from .parallel import n_workers
+
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+
+
+def basis_size(model):
+	"""
+	The largest number of training (or inducing) points in any GPR within a model.
+
+	Exact and sparse GPRs, pipelines, and the containers used by the models in
+	`pines.gpr` (`gpr`, `steps`, `step1`, `step2`, `estimators_`, `ensemble`)
+	are searched.
+	"""
+	for attr in ('Z_', 'X_train_'):
+		if hasattr(model, attr):
+			return getattr(model, attr).shape[0]
+	if isinstance(model, tuple):
+		return basis_size(model[-1])
+	if isinstance(model, list):
+		return max([basis_size(m) for m in model] or [0])
+	found = [
+		basis_size(getattr(model, attr))
+		for attr in ('gpr', 'steps', 'step1', 'step2', 'estimators_', 'ensemble')
+		if hasattr(model, attr)
+	]
+	return max(found or [0])
+
+
+def block_rows(n_basis, memory_budget=None, return_std=False, return_cov=False, n_jobs=None):
+	"""
+	The number of query rows to predict at once.
+
+	Parameters
+	----------
+	n_basis : int
+		Number of training or inducing points in the model.
+	memory_budget : int, optional
+		Bytes available for prediction intermediates, shared by all workers.
+		Defaults to 256 MiB.
+	return_std, return_cov : bool
+		The kind of prediction being made.
+	n_jobs : int, optional
+		Number of blocks predicted at once.
+
+	Returns
+	-------
+	int
+	"""
+	if memory_budget is None:
+		memory_budget = DEFAULT_MEMORY_BUDGET
+	budget = memory_budget / n_workers(n_jobs)
+	# The cross kernel, the product with alpha, and a triangular solve for the variance.
+	per_row = 8 * max(n_basis, 1) * (3 if (return_std or return_cov) else 2)
+	rows = int(budget // per_row)
+	if return_cov:
+		# The block covariance and its intermediate are rows×rows.
+		rows = min(rows, int(numpy.sqrt(budget / 16)))
+	return max(rows, 1)
+
+
+def _blocks(X, rows):
+	"""
+	Split X into blocks of at most `rows` rows.
+
+	Anything with a `shape` (an array or DataFrame) is a single chunk of
+	rows, and anything else is iterated over as a sequence of such chunks.
+	"""
+	if not hasattr(X, 'shape'):
+		for chunk in X:
+			yield from _blocks(chunk, rows)
+		return
+	n = X.shape[0]
+	if n <= rows:
+		yield X
+		return
+	for start in range(0, n, rows):
+		if isinstance(X, (pandas.DataFrame, pandas.Series)):
+			yield X.iloc[start:start + rows]
+		else:
+			yield X[start:start + rows]
+
+
+def _ordered_map(fn, items, n_jobs=None):
+	"""
+	Map fn over items on a thread pool, in order, with a bounded number in flight.
+	"""
+	workers = n_workers(n_jobs)
+	if workers == 1:
+		for item in items:
+			yield fn(item)
+		return
+	with cf.ThreadPoolExecutor(max_workers=workers) as pool:
+		pending = collections.deque()
+		for item in items:
+			pending.append(pool.submit(fn, item))
+			if len(pending) >= workers:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
+
+
+def iter_predict(model, X, return_std=False, return_cov=False, memory_budget=None, block_size=None, n_jobs=None):
+	"""
+	Predict in memory-bounded blocks, yielding the prediction for each block.
+
+	Parameters
+	----------
+	model : fitted estimator
+	X : array-like, DataFrame, or iterable of them
+		Query points.  An iterable (such as a generator) is consumed lazily,
+		one chunk at a time, and large chunks are split further.
+	return_std, return_cov : bool
+		Passed to `model.predict`.  With `return_cov`, each block gives the
+		covariance among its own rows only.
+	memory_budget : int, optional
+		Bytes available for prediction intermediates, see `block_rows`.
+	block_size : int, optional
+		Rows per block, overriding the size found from `memory_budget`.
+	n_jobs : int, optional
+		Number of blocks to predict concurrently on threads.
+
+	Yields
+	------
+	The result of `model.predict` for each block, in order.
+	"""
+	if block_size is None:
+		block_size = block_rows(
+			basis_size(model),
+			memory_budget=memory_budget,
+			return_std=return_std,
+			return_cov=return_cov,
+			n_jobs=n_jobs,
+		)
+	kwargs = {}
+	if return_std:
+		kwargs['return_std'] = True
+	if return_cov:
+		kwargs['return_cov'] = True
+
+	def _predict(block):
+		return model.predict(block, **kwargs)
+
+	yield from _ordered_map(_predict, _blocks(X, block_size), n_jobs)
+
+
+def _concat(parts):
+	if isinstance(parts[0], (pandas.DataFrame, pandas.Series)):
+		return pandas.concat(parts)
+	return numpy.concatenate([numpy.asarray(p) for p in parts])
+
+
+def chunked_predict(model, X, return_std=False, return_cov=False, memory_budget=None, block_size=None, n_jobs=None):
+	"""
+	Predict in memory-bounded blocks and join the results.
+
+	Parameters are as for `iter_predict`.
+
+	Returns
+	-------
+	y_mean
+		Joined like the model's own predictions.
+	y_std : optional
+		Joined standard deviations, when `return_std` is True.
+	y_cov : list, optional
+		The covariance within each block, when `return_cov` is True.
+	"""
+	results = list(iter_predict(
+		model,
+		X,
+		return_std=return_std,
+		return_cov=return_cov,
+		memory_budget=memory_budget,
+		block_size=block_size,
+		n_jobs=n_jobs,
+	))
+	if return_std:
+		return _concat([r[0] for r in results]), _concat([r[1] for r in results])
+	if return_cov:
+		return _concat([r[0] for r in results]), [r[1] for r in results]
+	return _concat(results)
+
+
+class StreamingPredictMixin:
+
+	def iter_predict(self, X, return_std=False, return_cov=False, memory_budget=None, block_size=None, n_jobs=None):
+		"""
+		Predict in memory-bounded blocks, see `pines.gpr.streaming.iter_predict`.
+		"""
+		return iter_predict(
+			self,
+			X,
+			return_std=return_std,
+			return_cov=return_cov,
+			memory_budget=memory_budget,
+			block_size=block_size,
+			n_jobs=n_jobs,
+		)
+
+	def chunked_predict(self, X, return_std=False, return_cov=False, memory_budget=None, block_size=None, n_jobs=None):
+		"""
+		Predict in memory-bounded blocks, see `pines.gpr.streaming.chunked_predict`.
+		"""
+		return chunked_predict(
+			self,
+			X,
+			return_std=return_std,
+			return_cov=return_cov,
+			memory_budget=memory_budget,
+			block_size=block_size,
+			n_jobs=n_jobs,
+		)
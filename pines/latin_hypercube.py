@@ -1,10 +1,50 @@
 
+import time
+import concurrent.futures
 import numpy
-from scipy.optimize import minimize_scalar
+import scipy.linalg
 from scipy.stats import norm
 
-def lhs( n_factors, n_samples, genepool=10000, random_in_cell=True ):
+# Candidate permutations are generated and scored this many at a time.
+_BLOCK_SIZE = 1024
+
+# Candidate permutations are kept between passes, in the smallest integer
+# type that holds them, if they fit in this many bytes.
+_CACHE_BYTES = 64 * 2**20
+
+
+def _random_state(random_state=None):
+	"""
+	A RandomState from None (numpy's global one), an int seed, or a RandomState.
+	"""
+	if random_state is None:
+		return numpy.random.mtrand._rand
+	if isinstance(random_state, numpy.random.RandomState):
+		return random_state
+	return numpy.random.RandomState(random_state)
+
+
+def _permutations(n, n_samples, seed):
+	"""
+	A block of `n` random permutations of range(n_samples), one per row.
+	"""
+	rng = numpy.random.RandomState(seed)
+	return numpy.argsort(rng.random_sample([n, n_samples]), axis=1)
+
+
+def lhs( n_factors, n_samples, genepool=10000, random_in_cell=True, random_state=None, block_size=None ):
 	"""
+	A Latin hypercube sample with nearly uncorrelated columns.
+
+	The columns are chosen greedily from a pool of random permutations:
+	starting from the first, each new column is the candidate with the least
+	total absolute correlation with the columns already chosen.  The pool is
+	generated in blocks, each from its own seed, and each pass scores the
+	candidates against the latest column only, so no correlation matrix of
+	the pool is formed.  The blocks are kept as small integers between
+	passes if they fit in 64 MB (10000 × 500 takes 10 MB), and otherwise
+	are regenerated on each pass, so that memory scales with `n_factors` ×
+	`n_samples` (plus the block size) rather than with the size of the pool.
 
 	Parameters
 	----------
@@ -17,25 +57,65 @@ def lhs( n_factors, n_samples, genepool=10000, random_in_cell=True ):
 	random_in_cell : bool, default True
 		If true, a uniform random point in each hypercube cell is chosen, otherwise the
 		center point in each cell is chosen.
+	random_state : int or numpy.random.RandomState, optional
+		Seed for a reproducible design.  By default numpy's global random
+		state is used.
+	block_size : int, optional
+		The number of candidates generated at once, by default 1024.
 
 	Returns
 	-------
 	ndarray
+		Shape (n_factors, n_samples), with values in the unit interval.
 	"""
-	candidates = numpy.empty([genepool, n_samples], dtype=numpy.float64)
-	for i in range(genepool):
-		candidates[i,:] = numpy.random.permutation(n_samples)
-	corr = numpy.fabs(numpy.corrcoef(candidates))
-	keepers = [0]
-	keeper_gross_corr = 0
-	for j in range(n_factors-1):
-		keeper_gross_corr += corr[keepers[-1], :]
-		k = numpy.argmin(keeper_gross_corr)
-		keepers.append(k)
+	rng = _random_state(random_state)
+	genepool = max(genepool, n_factors)
+	block_size = block_size or _BLOCK_SIZE
+	starts = range(0, genepool, block_size)
+	seeds = rng.randint(numpy.iinfo(numpy.int32).max, size=len(starts))
+
+	# Every permutation of range(n_samples) has the same mean and variance, so
+	# a correlation is a dot product, rescaled.
+	mean = (n_samples - 1) / 2
+	scale = n_samples * (n_samples ** 2 - 1) / 12
+
+	dtype = numpy.min_scalar_type(max(n_samples - 1, 0))
+	cache = [] if genepool * n_samples * dtype.itemsize <= _CACHE_BYTES else None
+
+	def blocks():
+		for b, (start, seed) in enumerate(zip(starts, seeds)):
+			if cache is not None and b < len(cache):
+				yield start, cache[b]
+				continue
+			block = _permutations(min(block_size, genepool - start), n_samples, seed).astype(dtype)
+			if cache is not None:
+				cache.append(block)
+			yield start, block
 
-	lhs = candidates[keepers, :].copy()
+	keepers = [0]
+	keeper_rows = numpy.empty([n_factors, n_samples], dtype=numpy.float64)
+	# The first candidate, as the first row of the first block.
+	keeper_rows[0] = _permutations(1, n_samples, seeds[0])[0]
+	keeper_gross_corr = numpy.zeros(genepool, dtype=numpy.float64)
+	for j in range(1, n_factors):
+		latest = keeper_rows[j-1] - mean
+		best, best_corr = None, numpy.inf
+		for start, block in blocks():
+			gross = keeper_gross_corr[start:start+len(block)]
+			if scale > 0:
+				gross += numpy.fabs(block @ latest) / scale
+			for k in keepers:
+				if start <= k < start + len(block):
+					gross[k - start] = numpy.inf
+			i = numpy.argmin(gross)
+			if gross[i] < best_corr:
+				best, best_corr = start + i, gross[i]
+				keeper_rows[j] = block[i]
+		keepers.append(best)
+
+	lhs = keeper_rows
 	if random_in_cell:
-		lhs += numpy.random.rand(*(lhs.shape))
+		lhs += rng.random_sample(lhs.shape)
 	else:
 		lhs += 0.5
 	lhs /= n_samples
@@ -46,47 +126,291 @@ def lhs( n_factors, n_samples, genepool=10000, random_in_cell=True ):
 
 
 
-def _avg_off_diag(a):
-	upper = numpy.triu_indices(a.shape[0], 1)
-	lower = numpy.tril_indices(a.shape[0], -1)
-	return (a[upper].mean() + a[lower].mean()) / 2
+def phi_p(x, p=10):
+	"""
+	The φp space-filling criterion of a design; smaller is better.
 
+	This is (Σ d⁻ᵖ)^(1/p) over the distances d between all pairs of points,
+	which for large p approaches the inverse of the smallest distance, so
+	minimizing it is a smooth stand-in for maximin.
 
-def _stduniform_to_stdnormal(x):
-	return norm(0,1).ppf(x)
+	Parameters
+	----------
+	x : ndarray
+		The design, with shape (n_factors, n_samples) as from `lhs`.
+	p : int, default 10
 
+	Returns
+	-------
+	float
+	"""
+	d2 = _squared_distances(numpy.asarray(x, dtype=numpy.float64).T)
+	return _phi_sum(d2, p) ** (1 / p)
 
-def _stdnormal_to_stduniform(x):
-	return norm(0,1).cdf(x)
 
+def _squared_distances(points):
+	sq = (points ** 2).sum(1)
+	d2 = sq[:, None] + sq[None, :] - 2 * (points @ points.T)
+	numpy.fill_diagonal(d2, numpy.inf)
+	return numpy.maximum(d2, 0, out=d2)
 
-def _make_correlated(x, corr, dim=0):
-	d = x.shape[dim]
-	s = numpy.full([d,d], fill_value=corr) + numpy.eye(d)*(1-corr)
-	chol = numpy.linalg.cholesky(s)
-	return numpy.dot(chol, x)
 
+def _phi_sum(d2, p):
+	# Each pair appears twice in the symmetric matrix, and the diagonal is inf.
+	return (d2 ** (-p / 2)).sum() / 2
 
-def _induce_correlation(x, approx_corr, return_actual_corr=False):
-	x = _stduniform_to_stdnormal(x)
-	x = _make_correlated(x,approx_corr)
-	if return_actual_corr:
-		result = _stdnormal_to_stduniform(x)
-		return _avg_off_diag(numpy.corrcoef(result))
-	return _stdnormal_to_stduniform(x)
 
+def _ese_run(n_factors, n_samples, p, max_iterations, max_seconds, n_candidates, n_inner, seed):
+	"""
+	One run of the enhanced stochastic evolutionary algorithm.
 
+	Returns
+	-------
+	points : ndarray
+		Shape (n_samples, n_factors), integer cell indexes as floats.
+	float
+		The φp criterion of the design at cell centers.
+	"""
+	deadline = None if max_seconds is None else time.perf_counter() + max_seconds
+	rng = numpy.random.RandomState(seed)
+	points = numpy.argsort(rng.random_sample([n_factors, n_samples]), axis=1).T.astype(numpy.float64)
+	# Optimize on cell centers in the unit cube.
+	unit = 1 / n_samples
+	d2 = _squared_distances((points + 0.5) * unit)
+	total = _phi_sum(d2, p)
+	phi = total ** (1 / p)
+	best_points, best_phi = points.copy(), phi
+	threshold = 0.005 * phi
+	exploring = False
+	others = numpy.arange(n_samples)
+	column = 0
+
+	for iteration in range(max_iterations):
+		best_before = best_phi
+		n_accepted = n_improved = 0
+		for inner in range(n_inner):
+			if deadline is not None and time.perf_counter() > deadline:
+				break
+			# Try several swaps of two rows within one column.  A swap only
+			# changes the distances from those two rows, so each costs O(n).
+			i1 = rng.randint(n_samples, size=n_candidates)
+			i2 = (i1 + 1 + rng.randint(n_samples - 1, size=n_candidates)) % n_samples
+			x = points[:, column] * unit
+			step1 = (x[i2, None] - x[None, :]) ** 2 - (x[i1, None] - x[None, :]) ** 2
+			new1 = d2[i1] + step1
+			new2 = d2[i2] - step1
+			# The distance between the swapped rows is unchanged.
+			both = (others[None, :] == i1[:, None]) | (others[None, :] == i2[:, None])
+			new1[both] = numpy.inf
+			new2[both] = numpy.inf
+			old1 = numpy.where(both, numpy.inf, d2[i1])
+			old2 = numpy.where(both, numpy.inf, d2[i2])
+			delta = (
+				(numpy.maximum(new1, 0) ** (-p / 2)).sum(1) + (numpy.maximum(new2, 0) ** (-p / 2)).sum(1)
+				- (old1 ** (-p / 2)).sum(1) - (old2 ** (-p / 2)).sum(1)
+			)
+			c = numpy.argmin(delta)
+			try_total = max(total + delta[c], 0.0)
+			try_phi = try_total ** (1 / p)
+			if try_phi - phi <= threshold * rng.random_sample():
+				a, b = i1[c], i2[c]
+				points[[a, b], column] = points[[b, a], column]
+				row_a, row_b = new1[c], new2[c]
+				row_a[b] = row_b[a] = d2[a, b]
+				row_a[a] = row_b[b] = numpy.inf
+				d2[a], d2[:, a] = row_a, row_a
+				d2[b], d2[:, b] = row_b, row_b
+				total, phi = try_total, try_phi
+				n_accepted += 1
+				if phi < best_phi:
+					best_points, best_phi = points.copy(), phi
+					n_improved += 1
+			column = (column + 1) % n_factors
+		else:
+			inner = n_inner
+		if inner == 0:
+			break
+		# Recompute the distances now and then, against rounding drift.
+		d2 = _squared_distances((points + 0.5) * unit)
+		total = _phi_sum(d2, p)
+		phi = total ** (1 / p)
+
+		accepted, improved = n_accepted / inner, n_improved / inner
+		if best_phi < best_before - 1e-12 * best_before:
+			# Improving: settle down while the search is still finding better designs.
+			if accepted >= 0.1 and improved < accepted:
+				threshold *= 0.8
+			elif accepted < 0.1:
+				threshold /= 0.8
+		else:
+			# Exploring: warm up quickly to escape, then cool slowly.
+			if accepted <= 0.1:
+				exploring = True
+			elif accepted >= 0.8:
+				exploring = False
+			threshold = threshold / 0.7 if exploring else threshold * 0.9
+		if inner < n_inner:
+			break
+
+	return best_points, best_phi
+
+
+def lhs_ese(
+		n_factors,
+		n_samples,
+		p=10,
+		max_iterations=100,
+		max_seconds=None,
+		n_restarts=0,
+		n_jobs=None,
+		random_in_cell=True,
+		random_state=None,
+):
+	"""
+	A space-filling Latin hypercube sample.
+
+	The design is optimized for the φp criterion (see `phi_p`) by the
+	enhanced stochastic evolutionary algorithm of Jin, Chen and Sudjianto
+	(2005).  Each step swaps two rows within one column, accepting the swap
+	if it does not worsen the criterion by more than a random fraction of a
+	threshold, which is adjusted as the search alternates between improving
+	and exploring.  A swap changes only the distances from the two swapped
+	points, so it is scored in O(n_samples) time.
 
+	Parameters
+	----------
+	n_factors : int
+		The number of columns to sample
+	n_samples : int
+		The number of Latin hypercube samples (rows)
+	p : int, default 10
+		The exponent of the φp criterion.
+	max_iterations : int, default 100
+		The most outer iterations of each run, each of up to 100 swaps.
+	max_seconds : float, optional
+		Stop each run after this many seconds.
+	n_restarts : int, default 0
+		The number of additional runs from other random starting designs.  The
+		best design of all the runs is returned.
+	n_jobs : int, optional
+		The number of processes to run restarts in; by default they run in
+		turn in this process.
+	random_in_cell : bool, default True
+		If true, a uniform random point in each hypercube cell is chosen, otherwise the
+		center point in each cell is chosen.  The design is optimized on the
+		center points.
+	random_state : int or numpy.random.RandomState, optional
+		Seed for a reproducible design, whatever the `n_jobs`.
+
+	Returns
+	-------
+	ndarray
+		Shape (n_factors, n_samples), with values in the unit interval.
+	"""
+	rng = _random_state(random_state)
+	seeds = rng.randint(numpy.iinfo(numpy.int32).max, size=n_restarts + 1)
+	if n_samples < 2:
+		return lhs(n_factors, n_samples, genepool=n_factors, random_in_cell=random_in_cell, random_state=rng)
+
+	n_pairs = n_samples * (n_samples - 1) // 2
+	n_candidates = int(min(50, max(1, n_pairs // 5)))
+	n_inner = int(min(100, max(1, 2 * n_pairs * n_factors // n_candidates)))
+	args = (n_factors, n_samples, p, max_iterations, max_seconds, n_candidates, n_inner)
+
+	if n_jobs is not None and n_jobs > 1 and n_restarts > 0:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=min(n_jobs, len(seeds))) as pool:
+			runs = list(pool.map(_ese_run, *zip(*[args + (seed,) for seed in seeds])))
+	else:
+		runs = [_ese_run(*args, seed) for seed in seeds]
+	points = min(runs, key=lambda run: run[1])[0]
+
+	design = points.T.copy()
+	if random_in_cell:
+		design += rng.random_sample(design.shape)
+	else:
+		design += 0.5
+	design /= n_samples
+	return design
+
+
+
+def induce_rank_correlation(h, sigma, inplace=False):
+	"""
+	Reorder a sample so that its rank correlation approximates a target.
+
+	This is the method of Iman and Conover (1982).  Normal scores are laid
+	out in the current rank order of each factor, transformed by Cholesky
+	factors so that their correlation becomes `sigma`, and each factor of
+	`h` is then rearranged to follow the ranks of its transformed scores.
+	Only the order of values within each factor changes, so the marginal
+	distributions, and with them the strata of a Latin hypercube, are kept
+	exactly.  The cost is O(n·k²) for k factors and n samples, plus sorting.
+
+	Parameters
+	----------
+	h : ndarray
+		The sample, with shape (n_factors, n_samples) as from `lhs`.
+	sigma : array-like
+		The target correlation matrix, shape (n_factors, n_factors), which
+		must be positive definite.
+	inplace : bool, default False
+		Rearrange `h` itself, instead of returning a new array.
+
+	Returns
+	-------
+	ndarray or None
+	"""
+	h = numpy.asarray(h)
+	sigma = numpy.asarray(sigma, dtype=numpy.float64)
+	k, n = h.shape
+	if sigma.shape != (k, k):
+		raise ValueError(f'sigma has shape {sigma.shape}, expected {(k, k)}')
+	if n < 3:
+		result = h.copy()
+	else:
+		order = numpy.argsort(h, axis=1, kind='stable')
+		ranks = numpy.argsort(order, axis=1)
+		scores = norm.ppf(numpy.arange(1, n + 1) / (n + 1))[ranks]
+		try:
+			target = numpy.linalg.cholesky(sigma)
+			current = numpy.linalg.cholesky(numpy.corrcoef(scores))
+		except numpy.linalg.LinAlgError:
+			raise ValueError('sigma must be a positive definite correlation matrix') from None
+		scores = target @ scipy.linalg.solve_triangular(current, scores, lower=True)
+		new_ranks = numpy.argsort(numpy.argsort(scores, axis=1), axis=1)
+		result = numpy.take_along_axis(numpy.take_along_axis(h, order, axis=1), new_ranks, axis=1)
+	if inplace:
+		h[:] = result
+	else:
+		return result
 
 
 def induce_correlation(h, corr, rows=None, inplace=False):
+	"""
+	Give some factors of a sample a common rank correlation.
+
+	Parameters
+	----------
+	h : ndarray
+		The sample, with shape (n_factors, n_samples) as from `lhs`.
+	corr : float
+		The target correlation between each pair of the selected factors.
+	rows : list of int, optional
+		The factors to correlate, by default all of them.
+	inplace : bool, default False
+		Rearrange `h` itself, instead of returning the correlated factors.
+
+	Returns
+	-------
+	ndarray or None
+		The selected factors, rearranged, see `induce_rank_correlation`.
+	"""
 	h_full = h
 	if rows:
 		h = h[rows,:]
-
-	_target_corr = lambda m: (_induce_correlation(h, m, return_actual_corr=True) - corr) ** 2
-	result = minimize_scalar(_target_corr, bounds=(0, 1), method='Bounded')
-	h_result = _induce_correlation(h,result.x)
+	d = h.shape[0]
+	sigma = numpy.full([d,d], fill_value=corr) + numpy.eye(d)*(1-corr)
+	h_result = induce_rank_correlation(h, sigma)
 
 	if inplace:
 		if rows:
@@ -97,9 +421,12 @@ def induce_correlation(h, corr, rows=None, inplace=False):
 		return h_result
 
 
-def lhs_corr(n_factors, n_samples, genepool=10, sigma=None, random_in_cell=True):
+def lhs_corr(n_factors, n_samples, genepool=10000, sigma=None, random_in_cell=True, random_state=None):
 	"""
-	Correlated LHS.  Works only in theory, or for low correllation / small sample sizes
+	Correlated LHS.
+
+	A nearly uncorrelated sample from `lhs` is rearranged to the target rank
+	correlation by `induce_rank_correlation`, keeping its strata.
 
 	Parameters
 	----------
@@ -110,63 +437,18 @@ def lhs_corr(n_factors, n_samples, genepool=10, sigma=None, random_in_cell=True)
 	genepool : int
 		The nubmer of random permutation from which to find good (uncorrelated) columns
 	sigma : array
-		The desired correlation matrix
+		The desired correlation matrix, by default the identity.
 	random_in_cell : bool, default True
 		If true, a uniform random point in each hypercube cell is chosen, otherwise the
 		center point in each cell is chosen.
+	random_state : int or numpy.random.RandomState, optional
+		Seed for a reproducible design.
 
 	Returns
 	-------
 	ndarray
 	"""
-	keepers = []
-	candidates = numpy.empty([genepool, n_samples], dtype=numpy.float64)
-	keeper_corr = numpy.zeros([n_factors, genepool])
-	corr = None
-
-	def _reroll():
-		nonlocal candidates, keepers, corr
-		for i in range(genepool):
-			if i not in keepers:
-				candidates[i, :] = numpy.random.permutation(n_samples)
-		corr = numpy.corrcoef(candidates)
-		o_corr = corr[corr < 0.999]
-		# print("max_o_corr",numpy.max(o_corr))
-		for j in range(len(keepers)):
-			keeper_corr[j, :] = corr[keepers[j], :]
-
-	_reroll()
-
 	if sigma is None:
 		sigma = numpy.eye(n_factors)
-
-	# initially keep the first column
-	keepers.append(0)
-	for j in range(n_factors - 1):
-		# load in the previously determined correlation row
-		keeper_corr[j, :] = corr[keepers[-1], :]
-		# ident the relevant part of sigma for comparing
-		sig_part = sigma[j + 1, :j + 1]
-		print("sig_part", sig_part)
-		for repeat in range(50000):
-			# find the closest match in the gene pool for target correlation
-			kc = keeper_corr[:j + 1, :]
-			kc = kc[kc < 0.999]
-			if repeat % 1000 == 0:
-				print(repeat, "max_corr", numpy.max(kc))
-			sq_diff_from_target = ((keeper_corr[:j + 1, :] - sig_part[:, None]) ** 2).sum(0)
-			k = numpy.argmin(sq_diff_from_target)
-			if sq_diff_from_target[k] < 0.001:
-				break
-			else:
-				_reroll()
-		keepers.append(k)
-		print(keepers)
-
-	lhs = candidates[keepers, :].copy()
-	if random_in_cell:
-		lhs += numpy.random.rand(*(lhs.shape))
-	else:
-		lhs += 0.5
-	lhs /= n_samples
-	return lhs
+	h = lhs(n_factors, n_samples, genepool=genepool, random_in_cell=random_in_cell, random_state=random_state)
+	return induce_rank_correlation(h, sigma)
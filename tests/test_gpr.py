@@ -0,0 +1,102 @@
+import numpy, pandas
+from sklearn.metrics import r2_score
+
+from pines.gpr import LinearAndGaussianProcessRegression
+from pines.gpr.sparse import SparseGaussianProcessRegressor
+
+
+def _noisy_data(n, seed=0):
+	rng = numpy.random.RandomState(seed)
+	X = pandas.DataFrame(rng.uniform(size=[n, 3]), columns=['a', 'b', 'c'])
+	truth = numpy.sin(3 * X.a) + X.b ** 2
+	return X, truth, truth + 0.3 * rng.standard_normal(n)
+
+
+def test_sparse_learns_noise_with_default_kernel():
+	X, _, y = _noisy_data(1500)
+	X_test, truth, _ = _noisy_data(500, seed=1)
+	model = SparseGaussianProcessRegressor(n_inducing=100, n_optimize=300, random_state=0)
+	model.fit(X[['a', 'b']].values, y.values)
+	assert 0.01 < model.noise_ < 1.0
+	assert r2_score(truth, model.predict(X_test[['a', 'b']].values)) > 0.8
+
+
+def test_linear_and_sparse_gpr_on_noisy_data():
+	X, _, y = _noisy_data(1500)
+	X_test, truth, _ = _noisy_data(500, seed=1)
+	model = LinearAndGaussianProcessRegression(core_features=['a', 'b'], keep_other_features=0, n_inducing=100)
+	model.gpr.n_optimize = 300
+	model.gpr.n_restarts_optimizer = 0
+	model.fit(X, y)
+	assert r2_score(truth, model.predict(X_test)) > 0.8
+
+
+def test_partial_fit_then_transform_dataframe():
+	from pines.gpr import PartialStandardScaler, Log1pStandardScaler
+	from pines.gpr.scalers import StandardDataFrameScaler
+	rng = numpy.random.RandomState(0)
+	X = pandas.DataFrame(rng.uniform(1, 5, size=[300, 3]), columns=['a', 'b', 'c'])
+	for scaler, full in [
+		(PartialStandardScaler(omit=['c']), PartialStandardScaler(omit=['c'])),
+		(Log1pStandardScaler(), Log1pStandardScaler()),
+		(StandardDataFrameScaler(), StandardDataFrameScaler()),
+	]:
+		for chunk in (X.iloc[:100], X.iloc[100:250], X.iloc[250:]):
+			scaler.partial_fit(chunk)
+		result = scaler.transform(X)
+		expected = full.fit(X).transform(X)
+		assert isinstance(result, pandas.DataFrame)
+		assert list(result.columns) == list(expected.columns)
+		numpy.testing.assert_allclose(result.values, expected.values, atol=1e-12)
+	assert list(result.columns) != list(X.columns)
+	omitted = PartialStandardScaler(omit=['c']).partial_fit(X).transform(X)
+	assert list(omitted.columns) == ['a†', 'b†', 'c']
+	numpy.testing.assert_allclose(omitted['c'], X['c'])
+
+
+def test_feature_transformer_output_types():
+	from pines.gpr import ExponentialFeatures, InteractionFeatures
+	rng = numpy.random.RandomState(0)
+	X = pandas.DataFrame(rng.uniform(size=[50, 3]), columns=['a', 'b', 'c'])
+	exponential = ExponentialFeatures().fit(X)
+	assert isinstance(exponential.transform(X), numpy.ndarray)
+	assert isinstance(exponential.transform(X.values), numpy.ndarray)
+	interaction = InteractionFeatures('a').fit(X)
+	result = interaction.transform(X)
+	assert isinstance(result, pandas.DataFrame)
+	assert list(result.columns[:3]) == ['a', 'b', 'c']
+	assert isinstance(InteractionFeatures(0).fit(X.values).transform(X.values), numpy.ndarray)
+
+
+def test_shared_kernel_regression_rejects_return_cov():
+	import pytest
+	from pines.gpr.multitarget import SharedKernelRegression
+	rng = numpy.random.RandomState(0)
+	X = pandas.DataFrame(rng.uniform(size=[40, 2]), columns=['a', 'b'])
+	Y = pandas.DataFrame({'y0': numpy.sin(3 * X.a), 'y1': X.a * X.b})
+	model = SharedKernelRegression().fit(X, Y)
+	Yhat, Ystd = model.predict(X, return_std=True)
+	assert Yhat.shape == Ystd.shape == (40, 2)
+	with pytest.raises(ValueError):
+		model.predict(X, return_cov=True)
+
+
+def test_frozen_predictor_std_matches_ill_conditioned_model(tmp_path):
+	from pines.frozen_predictor import FrozenPredictor
+	rng = numpy.random.RandomState(0)
+	X = pandas.DataFrame(rng.uniform(size=[300, 2]), columns=['a', 'b'])
+	y = numpy.sin(3 * X.a) + X.b ** 2
+	model = LinearAndGaussianProcessRegression(core_features=['a', 'b'], keep_other_features=0)
+	model.gpr.n_restarts_optimizer = 0
+	model.fit(X, y)
+	assert numpy.linalg.cond(model.gpr.L_) > 1e6
+
+	X_test = pandas.DataFrame(rng.uniform(size=[200, 2]), columns=['a', 'b'])
+	mean, std = model.predict(X_test, return_std=True)
+	frozen = model.export_predictor()
+	frozen_mean, frozen_std = frozen.predict(X_test, return_std=True)
+	numpy.testing.assert_allclose(frozen_mean, numpy.ravel(mean), rtol=1e-9, atol=1e-9)
+	numpy.testing.assert_allclose(frozen_std, numpy.ravel(std), rtol=0, atol=1e-8)
+
+	frozen.save(str(tmp_path / 'frozen.npz'))
+	numpy.testing.assert_array_equal(FrozenPredictor.load(str(tmp_path / 'frozen.npz')).predict_std(X_test), frozen_std)
@@ -0,0 +1,87 @@
+import numpy
+import pytest
+import scipy.stats
+
+from pines.latin_hypercube import lhs, lhs_ese, phi_p, induce_rank_correlation, _permutations, _ese_run
+
+
+def _is_latin(design):
+	n_samples = design.shape[1]
+	return all(
+		(numpy.sort(numpy.floor(row * n_samples)) == numpy.arange(n_samples)).all()
+		for row in design
+	)
+
+
+def test_lhs_reproducible_under_seed():
+	a = lhs(5, 40, genepool=200, random_state=3)
+	b = lhs(5, 40, genepool=200, random_state=3)
+	assert a.shape == (5, 40)
+	assert _is_latin(a)
+	numpy.testing.assert_array_equal(a, b)
+	assert not numpy.array_equal(a, lhs(5, 40, genepool=200, random_state=4))
+
+
+def test_lhs_matches_full_matrix_greedy():
+	n_factors, n_samples, genepool, block_size, seed = 6, 40, 300, 64, 7
+	rng = numpy.random.RandomState(seed)
+	starts = range(0, genepool, block_size)
+	seeds = rng.randint(numpy.iinfo(numpy.int32).max, size=len(starts))
+	candidates = numpy.vstack([
+		_permutations(min(block_size, genepool - start), n_samples, s)
+		for start, s in zip(starts, seeds)
+	]).astype(numpy.float64)
+	corr = numpy.fabs(numpy.corrcoef(candidates))
+	keepers = [0]
+	gross = numpy.zeros(genepool)
+	for _ in range(n_factors - 1):
+		gross += corr[keepers[-1]]
+		masked = gross.copy()
+		masked[keepers] = numpy.inf
+		keepers.append(numpy.argmin(masked))
+	expected = (candidates[keepers] + 0.5) / n_samples
+
+	design = lhs(n_factors, n_samples, genepool=genepool, block_size=block_size, random_state=seed, random_in_cell=False)
+	numpy.testing.assert_array_equal(design, expected)
+
+
+def test_lhs_ese_keeps_strata_and_improves_phi():
+	n_factors, n_samples, seed = 4, 30, 5
+	design = lhs_ese(n_factors, n_samples, max_iterations=20, random_state=0)
+	assert design.shape == (n_factors, n_samples)
+	assert _is_latin(design)
+
+	points, best_phi = _ese_run(n_factors, n_samples, 10, 20, None, 20, 50, seed)
+	start = numpy.argsort(numpy.random.RandomState(seed).random_sample([n_factors, n_samples]), axis=1)
+	assert (numpy.sort(points, axis=0) == numpy.arange(n_samples)[:, None]).all()
+	assert best_phi < phi_p((start + 0.5) / n_samples)
+	assert numpy.isclose(best_phi, phi_p((points.T + 0.5) / n_samples))
+
+
+def test_lhs_ese_reproducible_across_n_jobs():
+	serial = lhs_ese(3, 20, max_iterations=10, n_restarts=2, random_state=11)
+	parallel = lhs_ese(3, 20, max_iterations=10, n_restarts=2, n_jobs=2, random_state=11)
+	numpy.testing.assert_array_equal(serial, parallel)
+
+
+def test_induce_rank_correlation_keeps_strata_and_hits_target():
+	sigma = numpy.array([
+		[1.0, 0.6, -0.3, 0.2],
+		[0.6, 1.0, 0.0, 0.4],
+		[-0.3, 0.0, 1.0, -0.5],
+		[0.2, 0.4, -0.5, 1.0],
+	])
+	design = lhs(4, 3000, genepool=100, random_state=2)
+	result = induce_rank_correlation(design, sigma)
+	numpy.testing.assert_array_equal(numpy.sort(result, axis=1), numpy.sort(design, axis=1))
+	assert _is_latin(result)
+	spearman = scipy.stats.spearmanr(result.T)[0]
+	assert numpy.abs(spearman - sigma).max() < 0.05
+
+
+def test_induce_rank_correlation_rejects_bad_sigma():
+	design = lhs(3, 50, genepool=20, random_state=0)
+	with pytest.raises(ValueError):
+		induce_rank_correlation(design, numpy.full([3, 3], 2.0))
+	with pytest.raises(ValueError):
+		induce_rank_correlation(design, numpy.eye(2))
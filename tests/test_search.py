@@ -0,0 +1,39 @@
+import numpy, pandas
+from sklearn.gaussian_process.kernels import RBF, Matern, ConstantKernel as C
+
+from pines.gpr import LinearAndGaussianProcessRegression
+from pines.gpr.search import search, config_key
+
+
+def _kernel_factory(nu):
+	def kernel_generator(dims):
+		return C() * Matern([1.0] * dims, nu=nu)
+	return kernel_generator
+
+
+def test_config_keys_tell_functions_apart():
+	template = LinearAndGaussianProcessRegression(core_features=['a'])
+	key = lambda generator: config_key(template, dict(kernel_generator=generator), 'data', 3)
+	rbf = lambda dims: C() * RBF([1.0] * dims)
+	matern = lambda dims: C() * Matern([1.0] * dims)
+	assert key(rbf) != key(matern)
+	assert key(_kernel_factory(1.5)) != key(_kernel_factory(2.5))
+	# The same code with the same closure values gives the same key.
+	assert key(_kernel_factory(1.5)) == key(_kernel_factory(1.5))
+	assert key(rbf) == key(lambda dims: C() * RBF([1.0] * dims))
+
+
+def test_search_stores_each_lambda_config():
+	rng = numpy.random.RandomState(0)
+	X = pandas.DataFrame(rng.uniform(size=[40, 3]), columns=['a', 'b', 'c'])
+	y = numpy.sin(3 * X.a) + X.b
+	configs = dict(
+		kernel_generator=[lambda dims: C() * RBF([1.0] * dims), lambda dims: C() * Matern([1.0] * dims)],
+		keep_other_features=[1, 2],
+	)
+	store = {}
+	result = search(LinearAndGaussianProcessRegression(core_features=['a']), configs, X, y, store=store, cv=2)
+	assert len(result) == 4
+	assert len(store) == 4
+	assert not result.cached.any()
+	assert search(LinearAndGaussianProcessRegression(core_features=['a']), configs, X, y, store=store, cv=2).cached.all()
@@ -0,0 +1,44 @@
+import numpy, pandas
+import pytest
+
+from pines.gpr import LinearAndGaussianProcessRegression
+from pines.gpr.sparse import SparseGaussianProcessRegressor
+from pines.gpr.storage import save_model, load_model
+
+
+def _data(n, seed=0):
+	rng = numpy.random.RandomState(seed)
+	X = pandas.DataFrame(rng.uniform(size=[n, 3]), columns=['a', 'b', 'c'])
+	return X, numpy.sin(3 * X.a) + X.b ** 2 + 0.1 * rng.standard_normal(n)
+
+
+@pytest.mark.parametrize('mmap_mode', ['c', 'r', None])
+def test_sparse_round_trip_then_update(tmp_path, mmap_mode):
+	X, y = _data(400)
+	X_new, y_new = _data(100, seed=1)
+	model = SparseGaussianProcessRegressor(n_inducing=30, n_optimize=150, random_state=0)
+	model.fit(X.values, y.values)
+	assert save_model(model, str(tmp_path), min_bytes=1024) > 0
+
+	loaded = load_model(str(tmp_path), mmap_mode=mmap_mode)
+	numpy.testing.assert_allclose(loaded.predict(X_new.values), model.predict(X_new.values))
+
+	loaded.update(X_new.values, y_new.values)
+	model.update(X_new.values, y_new.values)
+	numpy.testing.assert_allclose(loaded.predict(X.values), model.predict(X.values))
+
+
+def test_exact_round_trip_then_update(tmp_path):
+	X, y = _data(200)
+	X_new, y_new = _data(50, seed=1)
+	model = LinearAndGaussianProcessRegression(core_features=['a', 'b'], keep_other_features=0)
+	model.gpr.n_restarts_optimizer = 0
+	model.fit(X, y)
+	save_model(model, str(tmp_path), min_bytes=1024)
+
+	loaded = load_model(str(tmp_path))
+	numpy.testing.assert_allclose(loaded.predict(X_new), model.predict(X_new))
+
+	loaded.update(X_new, y_new)
+	model.update(X_new, y_new)
+	numpy.testing.assert_allclose(loaded.predict(X), model.predict(X), rtol=1e-7, atol=1e-9)